@@ -0,0 +1,67 @@
+"""Tiempo de búsqueda en el catálogo: str.contains sobre el DataFrame (como
+antes) contra IndiceBusqueda, completa y con el límite que usan las
+pantallas (LIMITE_BUSQUEDA).
+
+Uso: python -m benchmarks.busqueda [productos...]
+"""
+import random
+import sys
+import time
+
+import pandas as pd
+
+from utils.busqueda import IndiceBusqueda
+
+CAMPOS = ["Clave", "Nombre", "Marca_Tipo", "Modelo", "Color", "Talla"]
+CONSULTAS = ["PRD-0004", "bota", "rojo 26", "nike piel", "zz-no-existe", "ca"]
+LIMITE = 200  # LIMITE_BUSQUEDA por defecto en utils/db.py
+
+
+def catalogo(n):
+    azar = random.Random(7)
+    marcas = ["Nike", "Adidas", "Flexi", "Andrea", "Puma", "Coqueta", "Pirma"]
+    tipos = ["Tenis", "Bota", "Sandalia", "Zapato", "Huarache", "Pantufla"]
+    colores = ["Negro", "Blanco", "Rojo", "Café", "Azul", "Miel"]
+    materiales = ["Piel", "Sintético", "Gamuza", "Lona"]
+    return pd.DataFrame({
+        "Clave": [f"PRD-{i:06d}" for i in range(n)],
+        "Nombre": [f"{azar.choice(tipos)} {azar.choice(materiales)} {i % 997}" for i in range(n)],
+        "Marca_Tipo": [azar.choice(marcas) for _ in range(n)],
+        "Modelo": [f"M{azar.randrange(5000)}" for _ in range(n)],
+        "Color": [azar.choice(colores) for _ in range(n)],
+        "Talla": [str(azar.randrange(22, 31)) for _ in range(n)],
+    })
+
+
+def anterior(df, consulta):
+    # Todas las palabras en alguno de los campos, con str.contains por campo
+    mascara = pd.Series(True, index=df.index)
+    for palabra in consulta.split():
+        coincide = pd.Series(False, index=df.index)
+        for campo in CAMPOS:
+            coincide |= df[campo].str.contains(palabra, case=False, na=False, regex=False)
+        mascara &= coincide
+    return df.loc[mascara, "Clave"].tolist()
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) / repeticiones, resultado
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    for n in tamanos:
+        df = catalogo(n)
+        inicio = time.perf_counter()
+        indice = IndiceBusqueda.desde_df(df, "Clave", CAMPOS)
+        print(f"{n:>8} productos: índice armado en {time.perf_counter() - inicio:.2f} s")
+        for consulta in CONSULTAS:
+            t_antes, _ = medir(lambda: anterior(df, consulta), 3)
+            t_indice, claves = medir(lambda: indice.buscar(consulta), 20)
+            t_limite, _ = medir(lambda: indice.buscar(consulta, LIMITE), 200)
+            print(f"  {consulta!r:<16} {len(claves):>7} resultados  "
+                  f"str.contains {t_antes * 1000:9.2f} ms  índice {t_indice * 1000:8.3f} ms  "
+                  f"primeros {LIMITE} {t_limite * 1000:7.3f} ms")
@@ -0,0 +1,62 @@
+"""Carga en frío de las colecciones de una página: leer_* una tras otra
+contra cargar_colecciones(), sobre el cliente en memoria con latencia.
+
+Uso: python -m benchmarks.carga_concurrente [documentos_por_coleccion] [latencia_pagina_ms]
+"""
+import sys
+import time
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+from utils.snapshots import AlmacenSnapshots
+
+UID = "benchmark"
+PAGINAS = {
+    "dashboard": ("ventas", "clientes", "productos"),
+    "ventas": ("ventas", "clientes", "productos"),
+    "cobranza": ("transacciones", "clientes"),
+}
+
+
+def sembrar(backend, n):
+    documentos = {
+        "ventas": lambda i: {"Fecha": f"2024-01-{i % 28 + 1:02d}", "Cliente": f"Cliente {i % 300}",
+                             "Producto": f"Producto {i % 80}", "Total": 100.0, "Tipo de venta": "Contado"},
+        "transacciones": lambda i: {"Fecha": f"2024-01-{i % 28 + 1:02d}", "Categoría": "Ventas",
+                                    "Tipo": "Ingreso", "Monto": 10.0, "Cliente": f"Cliente {i % 300}"},
+        "clientes": lambda i: {"Nombre": f"Cliente {i}", "Empresa": f"Empresa {i % 40}"},
+        "productos": lambda i: {"Clave": f"P{i:05d}", "Nombre": f"Producto {i}", "Cantidad": 10},
+    }
+    for coleccion, documento in documentos.items():
+        backend.ejecutar_lote(UID, [("agregar", coleccion, documento(i)) for i in range(n)])
+
+
+def medir(backend, nombre, cargar):
+    db.usar_backend(backend)  # En frío: sin caché ni copia sincronizada
+    inicio = time.perf_counter()
+    cargar()
+    transcurrido = time.perf_counter() - inicio
+    print(f"  {nombre:<24} {transcurrido:6.2f} s")
+    return transcurrido
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    latencia = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    cliente = ClienteMemoria(latencia_segundos=0.02)
+    backend = FirestoreBackend(cliente)
+    sembrar(backend, n)
+    cliente.latencia_pagina_segundos = latencia
+    print(f"{n} documentos por colección, {latencia * 1000:.0f} ms por página de {cliente.tamano_pagina}")
+
+    with mock.patch.object(db.st, "session_state", {"uid": UID}), \
+            mock.patch.object(db, "_snapshots", AlmacenSnapshots("")):
+        for pagina, colecciones in PAGINAS.items():
+            print(pagina)
+            serie = medir(backend, "una tras otra", lambda: [db.LECTORES[c]() for c in colecciones])
+            paralelo = medir(backend, "cargar_colecciones", lambda: db.cargar_colecciones(*colecciones))
+            print(f"  {'por colección':<24} " + ", ".join(f"{c} {s:.2f} s" for c, s in db.tiempos_carga().items()
+                                                       if c in colecciones))
+            print(f"  {'ahorro':<24} {1 - paralelo / serie:6.0%}")
@@ -0,0 +1,51 @@
+"""Costo de armar el DataFrame de ventas: constructor anterior contra _construir_df.
+
+Uso: python -m benchmarks.construccion_df [documentos...]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from utils import db
+from utils.esquema import aplicar_esquema
+
+EXTRA = {f"Campo extra {i}": "x" * 20 for i in range(10)}  # Campos que los lectores no usan
+
+
+def documentos(n):
+    return {
+        f"v{i}": {
+            "Fecha": "2024-01-01", "Cliente": f"Cliente {i % 50}", "Producto": "Producto 1",
+            "Cantidad": "2", "Precio Unitario": 10, "Total": 20.0, "Monto Crédito": None,
+            "Monto Contado": 20.0, "Anticipo Aplicado": 0, "Método de pago": "Efectivo",
+            "Tipo de venta": "Contado", **EXTRA,
+        }
+        for i in range(n)
+    }
+
+
+def construir_anterior(docs):
+    columnas = db.COLUMNAS["ventas"]
+    df = pd.DataFrame([{col: data.get(col, None) for col in columnas} for data in docs.values()])
+    for col in db.COLUMNAS_NUMERICAS["ventas"]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+    return df[columnas]
+
+
+def medir(nombre, funcion, docs):
+    inicio = time.perf_counter()
+    df = funcion(docs)
+    transcurrido = time.perf_counter() - inicio
+    print(f"{nombre:<16} {len(docs):>8} docs  {transcurrido * 1000:9.1f} ms  {transcurrido / len(docs) * 1e6:6.2f} µs/doc")
+    return df
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    for n in tamanos:
+        docs = documentos(n)
+        anterior = medir("anterior", construir_anterior, docs)
+        nuevo = medir("_construir_df", lambda d: db._construir_df("ventas", d), docs)
+        # El constructor anterior no tipaba; se compara ya con el esquema aplicado
+        pd.testing.assert_frame_equal(aplicar_esquema("ventas", anterior), nuevo, check_dtype=False)
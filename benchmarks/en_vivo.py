@@ -0,0 +1,77 @@
+"""Con ERP_MODO_LECTURA=en_vivo, los cambios hechos desde otro dispositivo
+deben verse en leer_clientes() sin volver a consultar la colección.
+
+Escribe directo en el backend (como otra sesión) sobre el Firestore en
+memoria: agrega, modifica y borra clientes, y después de cada paso revisa que
+la suscripción on_snapshot (eventos ADDED, MODIFIED y REMOVED) haya dejado
+leer_clientes() igual a la base. Al final revisa que una suscripción sin uso
+se cierre (RegistroEnVivo.cerrar_inactivas) y que la siguiente lectura abra
+otra al día. Si algo falla, sale con error.
+
+Uso: python -m benchmarks.en_vivo [clientes]
+"""
+import sys
+import time
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+
+
+def cliente(i, limite=1000.0):
+    return {"Nombre": f"Cliente {i}", "Correo": f"cliente{i}@correo.mx", "Teléfono": f"55{i:08d}",
+            "Límite de crédito": limite}
+
+
+def revisar(paso, esperados):
+    df = db.leer_clientes()
+    vistos = dict(zip(df["Nombre"], df["Límite de crédito"]))
+    correcto = vistos == esperados
+    print(f"  {paso:<12} {len(vistos):>6} clientes  {'ok' if correcto else 'DISTINTO'}")
+    return correcto
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    correctos = True
+    with mock.patch.object(db, "MODO_LECTURA", "en_vivo"), \
+            mock.patch.object(db.st, "session_state", {"uid": UID}):
+        cliente_memoria = ClienteMemoria()
+        db.usar_backend(FirestoreBackend(cliente_memoria))
+        ids = [db.backend.agregar(UID, "clientes", cliente(i)) for i in range(n)]
+        esperados = {f"Cliente {i}": 1000.0 for i in range(n)}
+        correctos &= revisar("inicial", esperados)
+
+        # Desde aquí la base cambia por fuera de db: solo la suscripción se entera
+        inicio = time.perf_counter()
+        for i in range(n, n + 10):
+            db.backend.agregar(UID, "clientes", cliente(i))
+            esperados[f"Cliente {i}"] = 1000.0
+        correctos &= revisar("ADDED", esperados)
+
+        for i in range(0, n, 10):
+            db.backend.actualizar(UID, "clientes", ids[i], {"Límite de crédito": 2500.0})
+            esperados[f"Cliente {i}"] = 2500.0
+        correctos &= revisar("MODIFIED", esperados)
+
+        for i in range(1, n, 10):
+            db.backend.eliminar(UID, "clientes", ids[i])
+            del esperados[f"Cliente {i}"]
+        correctos &= revisar("REMOVED", esperados)
+        print(f"  {(time.perf_counter() - inicio) * 1000:.1f} ms en escribir y releer los tres pasos")
+
+        with mock.patch.object(db._registro_en_vivo, "inactividad_segundos", 0):
+            cerradas = db._registro_en_vivo.cerrar_inactivas()
+        oyentes = sum(len(o) for o in cliente_memoria._oyentes.values())
+        print(f"  {'inactiva':<12} {cerradas} suscripciones cerradas, {oyentes} oyentes en la base")
+        correctos &= cerradas == 1 and oyentes == 0
+        db.backend.agregar(UID, "clientes", cliente(n + 10))
+        esperados[f"Cliente {n + 10}"] = 1000.0
+        db._cache_lecturas.limpiar()  # Como al vencer el TTL: la lectura vuelve a pedir la suscripción
+        correctos &= revisar("reabierta", esperados)
+        db.detener_en_vivo(UID)
+    if not correctos:
+        sys.exit("leer_clientes() no refleja los cambios recibidos por la suscripción.")
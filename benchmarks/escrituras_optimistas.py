@@ -0,0 +1,69 @@
+"""Guardar una transacción y volver a leer la colección, como en cada rerun
+después de un formulario: descartar la lectura en caché (como antes) contra
+parcharla con lo escrito.
+
+Usa el Firestore en memoria con latencia. Al final espera las
+reconciliaciones en segundo plano; si alguna encontró la copia parchada
+distinta a la base, sale con error.
+
+Uso: python -m benchmarks.escrituras_optimistas [transacciones...]
+"""
+import sys
+import time
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+ESCRITURAS = 20
+
+
+def transaccion(i):
+    return {"Fecha": f"2024-05-{i % 28 + 1:02d}", "Descripción": f"Gasto {i}", "Categoría": "Servicios",
+            "Tipo": "Egreso", "Monto": float(i % 500), "Cliente": "N/A", "Método de pago": "Efectivo"}
+
+
+def sembrar(uid, n):
+    operaciones = [("agregar", "transacciones", transaccion(i)) for i in range(n)]
+    for inicio in range(0, n, 5000):
+        db.backend.ejecutar_lote(uid, operaciones[inicio:inicio + 5000])
+
+
+def anterior(i):
+    db.guardar_transaccion(transaccion(i))
+    # Lo que hacía _invalidar() después de escribir
+    db._cache_lecturas.invalidar(db.st.session_state["uid"], "transacciones")
+    return db.leer_transacciones()
+
+
+def parchado(i):
+    db.guardar_transaccion(transaccion(i))
+    return db.leer_transacciones()
+
+
+def medir(nombre, funcion):
+    inicio = time.perf_counter()
+    for i in range(ESCRITURAS):
+        funcion(i)
+    print(f"  {nombre:<10} {(time.perf_counter() - inicio) / ESCRITURAS * 1000:9.2f} ms por escritura y relectura")
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 50_000]
+    for n in tamanos:
+        # Un uid por tamaño: la copia local guardada en disco no se mezcla entre corridas
+        uid = f"{UID}-{n}"
+        with mock.patch.object(db.st, "session_state", {"uid": uid}):
+            db.usar_backend(FirestoreBackend(ClienteMemoria(latencia_segundos=0.005)))
+            sembrar(uid, n)
+            db.leer_transacciones()
+            print(f"{n:>8} transacciones")
+            medir("descartar", anterior)
+            medir("parchar", parchado)
+            db.esperar_reconciliaciones()
+            if len(db.leer_transacciones()) != n + 2 * ESCRITURAS:
+                sys.exit("La copia en caché no tiene todas las transacciones escritas.")
+    if db.divergencias():
+        sys.exit(f"Reconciliaciones con diferencias: {db.divergencias()}")
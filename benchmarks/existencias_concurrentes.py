@@ -0,0 +1,107 @@
+"""Varias cajas venden y reabastecen el mismo producto a la vez.
+
+Compara leer la existencia y escribir el resultado (como antes) contra los
+incrementos atómicos de registrar_venta y registrar_entrada_inventario, en el
+Firestore en memoria (con latencia, para que las operaciones se encimen) y en
+SQLite. Con los incrementos la existencia final debe cuadrar exactamente con
+las operaciones aceptadas y nunca quedar bajo cero; si no, sale con error.
+
+Uso: python -m benchmarks.existencias_concurrentes [cajas] [operaciones por caja]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend, SqliteBackend, ValorInsuficiente
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+CLAVE = "P1"
+EXISTENCIA_INICIAL = 20
+ENTRADA = 5
+
+
+def existencia():
+    return sum(datos.get("Cantidad", 0) for _, datos in db.backend.buscar(UID, "productos", "Clave", CLAVE))
+
+
+def venta():
+    return {
+        "Fecha": "2024-05-01", "Cliente": "Mostrador", "Producto": "Gorra", "Cantidad": 1.0,
+        "Precio Unitario": 10.0, "Total": 10.0, "Monto Crédito": 0.0, "Monto Contado": 10.0,
+        "Anticipo Aplicado": 0.0, "Método de pago": "Efectivo", "Tipo de venta": "Contado",
+    }
+
+
+def anterior(delta):
+    # Leer, calcular y escribir: dos cajas pueden leer el mismo valor
+    doc_id, datos = db.backend.buscar(UID, "productos", "Clave", CLAVE)[0]
+    if datos["Cantidad"] + delta < 0:
+        return False
+    db.backend.actualizar(UID, "productos", doc_id, {"Cantidad": datos["Cantidad"] + delta})
+    return True
+
+
+def atomico(delta):
+    try:
+        if delta < 0:
+            db.registrar_venta(venta(), clave_producto=CLAVE, cantidad=-delta)
+        else:
+            db.registrar_entrada_inventario(CLAVE, delta, 6.0)
+    except ValorInsuficiente:
+        return False
+    return True
+
+
+def caja(operar, operaciones, semilla):
+    azar = random.Random(semilla)
+    vendidas = rechazadas = entradas = 0
+    for _ in range(operaciones):
+        delta = ENTRADA if azar.random() < 0.15 else -1
+        if operar(delta):
+            vendidas += delta < 0
+            entradas += delta > 0
+        else:
+            rechazadas += 1
+    return vendidas, rechazadas, entradas
+
+
+def correr(nombre, nuevo_backend, operar, cajas, operaciones):
+    db.usar_backend(nuevo_backend)
+    db.guardar_producto({"Clave": CLAVE, "Nombre": "Gorra", "Precio Unitario": 10.0,
+                         "Costo Unitario": 6.0, "Cantidad": EXISTENCIA_INICIAL})
+    inicio = threading.Barrier(cajas)
+
+    def trabajar(semilla):
+        inicio.wait()
+        return caja(operar, operaciones, semilla)
+
+    with ThreadPoolExecutor(cajas) as pool:
+        resultados = list(pool.map(trabajar, range(cajas)))
+    vendidas, rechazadas, entradas = (sum(r[i] for r in resultados) for i in range(3))
+    esperada = EXISTENCIA_INICIAL + entradas * ENTRADA - vendidas
+    final = existencia()
+    print(f"{nombre:<28} vendidas {vendidas:>4}  rechazadas {rechazadas:>4}  entradas {entradas:>3}  "
+          f"esperada {esperada:>4}  final {final:>6.0f}  diferencia {final - esperada:>+4.0f}")
+    return final == esperada and final >= 0
+
+
+if __name__ == "__main__":
+    cajas = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operaciones = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    correctos = True
+    with tempfile.TemporaryDirectory() as directorio, mock.patch.object(db.st, "session_state", {"uid": UID}):
+        backends = {
+            "memoria": lambda: FirestoreBackend(ClienteMemoria(latencia_segundos=0.002)),
+            "sqlite": lambda: SqliteBackend(os.path.join(directorio, f"existencias_{random.random()}.sqlite3")),
+        }
+        for nombre, crear in backends.items():
+            correr(f"{nombre}: leer y escribir", crear(), anterior, cajas, operaciones)
+            correctos &= correr(f"{nombre}: incremento atómico", crear(), atomico, cajas, operaciones)
+    if not correctos:
+        sys.exit("La existencia final no cuadra con las operaciones aceptadas.")
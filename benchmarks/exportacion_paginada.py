@@ -0,0 +1,62 @@
+"""Memoria pico al exportar el historial de ventas: todo en un DataFrame
+(como antes) contra exportar_por_paginas sobre leer_por_paginas.
+
+Usa una base SQLite temporal para que los documentos no vivan en memoria.
+
+Uso: python -m benchmarks.exportacion_paginada [ventas...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from utils import db
+from utils.backends import SqliteBackend
+from utils.exportar import a_csv, exportar_por_paginas
+
+UID = "benchmark"
+
+
+def sembrar(n):
+    operaciones = [
+        ("agregar", "ventas", {
+            "Fecha": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "Cliente": f"Cliente {i % 300}",
+            "Producto": f"Producto {i % 80}", "Cantidad": 1, "Precio Unitario": 100.0, "Total": 100.0,
+            "Monto Crédito": 0.0, "Monto Contado": 100.0, "Anticipo Aplicado": 0.0,
+            "Método de pago": "Efectivo", "Tipo de venta": "Contado",
+        })
+        for i in range(n)
+    ]
+    for inicio in range(0, n, 5000):
+        db.backend.ejecutar_lote(UID, operaciones[inicio:inicio + 5000])
+
+
+def medir(nombre, n, funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion()
+    transcurrido = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{nombre:<22} {n:>8} ventas  pico {pico / 2**20:8.2f} MB  {transcurrido:7.2f} s")
+
+
+def anterior(destino):
+    df = db._construir_df("ventas", dict(db.backend.leer_todo(UID, "ventas")))
+    with open(destino, "wb") as archivo:
+        archivo.write(a_csv(df))
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 50_000]
+    with tempfile.TemporaryDirectory() as directorio, mock.patch.object(db.st, "session_state", {"uid": UID}):
+        for n in tamanos:
+            db.usar_backend(SqliteBackend(os.path.join(directorio, f"ventas_{n}.sqlite3")))
+            sembrar(n)
+            destino = os.path.join(directorio, "historial")
+            medir("todo en memoria (csv)", n, lambda: anterior(destino + ".csv"))
+            for formato in ["csv", "parquet", "xlsx"]:
+                medir(f"por páginas ({formato})", n, lambda: exportar_por_paginas(
+                    db.leer_por_paginas("ventas"), db.COLUMNAS["ventas"], f"{destino}.{formato}", formato))
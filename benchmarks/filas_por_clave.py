@@ -0,0 +1,50 @@
+"""Buscar la fila de un producto: máscara booleana sobre el catálogo (como
+antes) contra fila_por.
+
+Uso: python -m benchmarks.filas_por_clave [productos...]
+"""
+import sys
+import time
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+BUSQUEDAS = 200
+
+
+def sembrar(n):
+    operaciones = [
+        ("agregar", "productos", {
+            "Clave": f"PRD-{i:06d}", "Nombre": f"Producto {i}", "Precio Unitario": 100.0,
+            "Costo Unitario": 60.0, "Cantidad": 10,
+        })
+        for i in range(n)
+    ]
+    for inicio in range(0, n, 5000):
+        db.backend.ejecutar_lote(UID, operaciones[inicio:inicio + 5000])
+
+
+def medir(nombre, funcion, claves):
+    inicio = time.perf_counter()
+    for clave in claves:
+        funcion(clave)
+    print(f"  {nombre:<16} {(time.perf_counter() - inicio) / len(claves) * 1e6:10.1f} µs por búsqueda")
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    with mock.patch.object(db.st, "session_state", {"uid": UID}):
+        for n in tamanos:
+            db.usar_backend(FirestoreBackend(ClienteMemoria()))
+            sembrar(n)
+            productos = db.leer_productos()
+            claves = [f"PRD-{i * 7919 % n:06d}" for i in range(BUSQUEDAS)]
+            print(f"{n:>8} productos")
+            medir("máscara", lambda c: productos[productos["Clave"] == c].iloc[0], claves)
+            inicio = time.perf_counter()
+            db.fila_por("productos", "Clave", claves[0])
+            print(f"  {'índice armado':<16} {(time.perf_counter() - inicio) * 1000:10.1f} ms (una vez por lectura en caché)")
+            medir("fila_por", lambda c: db.fila_por("productos", "Clave", c), claves)
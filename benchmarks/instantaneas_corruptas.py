@@ -0,0 +1,90 @@
+"""Arranque en frío desde la instantánea local (utils/snapshots.py): con una
+instantánea válida solo se piden los cambios; con una dañada (checksum que no
+cuadra o archivo truncado) se descarta, se lee la colección completa y se
+vuelve a guardar.
+
+Usa el Firestore en memoria con latencia. Sale con error si una instantánea
+dañada se llega a usar, si los datos leídos no cuadran con la base o si la
+instantánea no queda reparada después del arranque.
+
+Uso: python -m benchmarks.instantaneas_corruptas [transacciones]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+
+
+def transaccion(i):
+    return {"Fecha": f"2024-05-{i % 28 + 1:02d}", "Descripción": f"Gasto {i}", "Categoría": "Servicios",
+            "Tipo": "Egreso", "Monto": float(i % 500), "Cliente": "N/A", "Método de pago": "Efectivo"}
+
+
+def sembrar(n):
+    operaciones = [("agregar", "transacciones", transaccion(i)) for i in range(n)]
+    for inicio in range(0, n, 5000):
+        db.backend.ejecutar_lote(UID, operaciones[inicio:inicio + 5000])
+
+
+def ruta_datos():
+    return db._snapshots._rutas(db._clave_snapshot(UID), "transacciones")[0]
+
+
+def voltear_bytes(ruta):
+    with open(ruta, "r+b") as f:
+        f.seek(os.path.getsize(ruta) // 2)
+        f.write(b"\xff" * 16)
+
+
+def truncar(ruta):
+    with open(ruta, "r+b") as f:
+        f.truncate(os.path.getsize(ruta) // 2)
+
+
+def arrancar(nombre, danar=None):
+    """Simula reiniciar el proceso: sin copia en memoria, solo lo que hay en disco."""
+    if danar:
+        danar(ruta_datos())
+    db._sincronizador.descartar_todo()
+    db._cache_lecturas.limpiar()
+    with mock.patch.object(db, "_leer_todo_particionado", wraps=db._leer_todo_particionado) as leer_todo:
+        inicio = time.perf_counter()
+        df = db.leer_transacciones()
+        duracion = time.perf_counter() - inicio
+    completa = leer_todo.called
+    print(f"  {nombre:<22} {duracion * 1000:9.1f} ms  {'lectura completa' if completa else 'solo cambios':<16} "
+          f"{len(df):>8} filas")
+    return df, completa
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    errores = []
+    # Sin margen: todo se sembró hace segundos y con él "solo cambios" traería todo
+    with tempfile.TemporaryDirectory() as directorio, \
+            mock.patch.object(db._snapshots, "directorio", directorio), \
+            mock.patch.object(db._sincronizador, "margen", datetime.timedelta(0)), \
+            mock.patch.object(db.st, "session_state", {"uid": UID}):
+        db.usar_backend(FirestoreBackend(ClienteMemoria(latencia_segundos=0.005, latencia_pagina_segundos=0.002)))
+        sembrar(n)
+        print(f"{n:>8} transacciones")
+        esperado = float(db.leer_transacciones()["Monto"].sum())  # Primera lectura: guarda la instantánea
+
+        casos = [("instantánea válida", None, False), ("checksum distinto", voltear_bytes, True),
+                 ("archivo truncado", truncar, True), ("después de reparar", None, False)]
+        for nombre, danar, debe_leer_todo in casos:
+            df, completa = arrancar(nombre, danar)
+            if completa != debe_leer_todo:
+                errores.append(f"{nombre}: {'se leyó' if completa else 'no se leyó'} la colección completa")
+            if len(df) != n or float(df["Monto"].sum()) != esperado:
+                errores.append(f"{nombre}: los datos no cuadran con la base")
+    if errores:
+        sys.exit("Arranque desde instantánea incorrecto: " + "; ".join(errores))
@@ -0,0 +1,54 @@
+"""Lectura completa de transacciones: un solo stream contra intervalos de id
+leídos en paralelo, sobre el cliente en memoria con latencia por página.
+
+Comprueba que ambas lecturas traen los mismos documentos.
+
+Uso: python -m benchmarks.lectura_particionada [transacciones] [latencia_pagina_ms]
+"""
+import sys
+import time
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+UID = "benchmark"
+CAMPOS = db.COLUMNAS["transacciones"]
+
+
+def sembrar(backend, n):
+    operaciones = [
+        ("agregar", "transacciones", {
+            "Fecha": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "Descripción": f"Movimiento {i}",
+            "Categoría": "Ventas", "Tipo": "Ingreso", "Monto": 10.0, "Cliente": f"Cliente {i % 300}",
+            "Método de pago": "Efectivo",
+        })
+        for i in range(n)
+    ]
+    for inicio in range(0, n, 5000):
+        backend.ejecutar_lote(UID, operaciones[inicio:inicio + 5000])
+
+
+def medir(nombre, funcion):
+    inicio = time.perf_counter()
+    documentos = dict(funcion())
+    transcurrido = time.perf_counter() - inicio
+    print(f"{nombre:<16} {len(documentos):>8} docs  {transcurrido:7.2f} s")
+    return documentos
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    latencia = (float(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+    cliente = ClienteMemoria()
+    backend = FirestoreBackend(cliente)
+    db.usar_backend(backend)
+    sembrar(backend, n)
+    cliente.latencia_pagina_segundos = latencia
+    print(f"{n} transacciones, {latencia * 1000:.0f} ms por página de {cliente.tamano_pagina} documentos")
+
+    esperado = medir("un stream", lambda: backend.leer_todo(UID, "transacciones", CAMPOS))
+    for hilos in [2, 4, 8]:
+        db.configurar_paralelismo(hilos, umbral=0)
+        obtenido = medir(f"{hilos} intervalos", lambda: db._leer_todo_particionado(UID, "transacciones", CAMPOS))
+        assert obtenido == esperado
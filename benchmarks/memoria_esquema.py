@@ -0,0 +1,84 @@
+"""Memoria por sesión de los DataFrames sin tipar contra los del esquema tipado.
+
+Arma ventas, transacciones, clientes y productos sintéticos con
+_construir_df (tipado, utils/esquema.py) y con el constructor sin esquema
+(object para todo lo que no es numérico), y reporta los bytes de cada uno.
+
+Uso: python -m benchmarks.memoria_esquema [ventas...]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from utils import db
+from utils.esquema import bytes_en_memoria
+
+METODOS = ["Efectivo", "Transferencia", "Tarjeta", "Crédito"]
+TIPOS_VENTA = ["Contado", "Crédito", "Mixta", "Gratuita"]
+CATEGORIAS = [("Ingreso", "Ventas"), ("Ingreso", "Cobranza"), ("Ingreso", "Anticipo Cliente"),
+              ("Egreso", "Sueldos"), ("Egreso", "Proveedores"), ("Egreso", "Anticipo Aplicado")]
+
+
+def colecciones(ventas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    n_clientes, n_productos = max(10, ventas // 200), max(10, ventas // 500)
+    fechas = pd.date_range("2022-01-01", periods=1000).strftime("%Y-%m-%d").to_numpy()
+    clientes = {
+        f"C{i:05d}": {"Nombre": f"Cliente {i}", "Correo": f"cliente{i}@correo.mx", "Teléfono": f"55{i:08d}",
+                      "Empresa": f"Empresa {i % 40}", "RFC": f"XAXX{i:09d}", "Límite de crédito": 5000}
+        for i in range(n_clientes)
+    }
+    productos = {
+        f"P{i:05d}": {"Clave": f"P{i:05d}", "Nombre": f"Producto {i}", "Marca_Tipo": f"Marca {i % 12}",
+                      "Modelo": f"M-{i}", "Color": ["Negro", "Blanco", "Rojo"][i % 3], "Talla": ["CH", "M", "G"][i % 3],
+                      "Categoría": f"Línea {i % 8}", "Precio Unitario": 100.0, "Costo Unitario": 60.0,
+                      "Cantidad": 20, "Descripción": f"Descripción del producto {i}"}
+        for i in range(n_productos)
+    }
+    ventas_docs = {
+        f"v{i}": {"Fecha": rng.choice(fechas), "Cliente": f"Cliente {rng.integers(n_clientes)}",
+                  "Producto": f"Producto {rng.integers(n_productos)}", "Cantidad": 1, "Precio Unitario": 100.0,
+                  "Total": 100.0, "Monto Crédito": 0.0, "Monto Contado": 100.0, "Anticipo Aplicado": 0.0,
+                  "Método de pago": rng.choice(METODOS), "Tipo de venta": rng.choice(TIPOS_VENTA)}
+        for i in range(ventas)
+    }
+    transacciones_docs = {}
+    for i in range(ventas * 2):
+        tipo, categoria = CATEGORIAS[rng.integers(len(CATEGORIAS))]
+        transacciones_docs[f"t{i}"] = {
+            "Fecha": rng.choice(fechas), "Descripción": f"Movimiento {i} de {categoria.lower()}",
+            "Categoría": categoria, "Tipo": tipo, "Monto": 50.0,
+            "Cliente": f"Cliente {rng.integers(n_clientes)}", "Método de pago": rng.choice(METODOS),
+        }
+    return {"ventas": ventas_docs, "transacciones": transacciones_docs, "clientes": clientes, "productos": productos}
+
+
+def construir_sin_esquema(nombre_coleccion, documentos, columna_id=None):
+    """_construir_df antes de utils/esquema.py."""
+    df = pd.DataFrame.from_records(list(documentos.values()), columns=db.COLUMNAS[nombre_coleccion])
+    if columna_id:
+        df[columna_id] = list(documentos.keys())
+    return df.assign(**{
+        col: pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype("float64")
+        for col in db.COLUMNAS_NUMERICAS[nombre_coleccion]
+    })
+
+
+def _mb(n):
+    return n / 2**20
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    for n in tamanos:
+        total_antes = total_despues = 0
+        print(f"--- {n} ventas ---")
+        for nombre_coleccion, documentos in colecciones(n).items():
+            columna_id = "ID" if nombre_coleccion == "clientes" else None
+            antes = bytes_en_memoria(construir_sin_esquema(nombre_coleccion, documentos, columna_id))
+            despues = bytes_en_memoria(db._construir_df(nombre_coleccion, documentos, columna_id))
+            total_antes, total_despues = total_antes + antes, total_despues + despues
+            print(f"{nombre_coleccion:<14} {len(documentos):>8} filas  {_mb(antes):8.2f} MB -> {_mb(despues):8.2f} MB")
+        print(f"{'sesión':<14} {'':>8}        {_mb(total_antes):8.2f} MB -> {_mb(total_despues):8.2f} MB"
+              f"  ({1 - total_despues / total_antes:.0%} menos)")
@@ -0,0 +1,65 @@
+"""Latencia por venta: ruta anterior (cinco viajes) contra registrar_venta (un lote).
+
+Uso: python -m benchmarks.registro_venta [ventas] [latencia_ms]
+"""
+import sys
+import time
+
+import streamlit as st
+
+from utils import db
+from utils.backends import FirestoreBackend
+from utils.firestore_memoria import ClienteMemoria
+
+VENTA = {
+    "Fecha": "2024-01-01", "Cliente": "Cliente 1", "Producto": "Producto 1", "Cantidad": 1.0,
+    "Precio Unitario": 100.0, "Total": 100.0, "Monto Crédito": 40.0, "Monto Contado": 50.0,
+    "Anticipo Aplicado": 10.0, "Método de pago": "Efectivo", "Tipo de venta": "Mixta",
+}
+MOVIMIENTOS = [
+    {"Fecha": "2024-01-01", "Categoría": "Ventas", "Tipo": "Ingreso", "Monto": 50.0, "Cliente": "Cliente 1"},
+    {"Fecha": "2024-01-01", "Categoría": "Anticipo Aplicado", "Tipo": "Gasto", "Monto": 10.0, "Cliente": "Cliente 1"},
+]
+
+
+def _coleccion_usuario(nombre):
+    return db.backend.cliente.collection("usuarios").document(st.session_state["uid"]).collection(nombre)
+
+
+def ruta_anterior():
+    """Copia de lo que hacía el formulario de ventas antes de registrar_venta:
+    cada escritura por separado y el producto buscado por clave antes de
+    actualizarlo. Las funciones de utils/db.py ya no viajan igual, por eso no
+    se usan aquí.
+    """
+    _coleccion_usuario("ventas").add(dict(VENTA))
+    for movimiento in MOVIMIENTOS:
+        _coleccion_usuario("transacciones").add(dict(movimiento))
+    ref = _coleccion_usuario("productos")
+    query = ref.where("Clave", "==", "P1").get()
+    if query:
+        ref.document(query[0].id).update({"Cantidad": 0, "Marca_Tipo": "", "Modelo": "", "Color": "", "Talla": ""})
+
+
+def ruta_lote():
+    db.registrar_venta(VENTA, MOVIMIENTOS, "P1", 1)
+
+
+def medir(nombre, funcion, ventas, latencia):
+    cliente = ClienteMemoria(latencia_segundos=latencia)
+    db.usar_backend(FirestoreBackend(cliente))
+    db.guardar_producto({"Clave": "P1", "Nombre": "Producto 1", "Cantidad": ventas})
+    cliente.llamadas = 0
+    inicio = time.perf_counter()
+    for _ in range(ventas):
+        funcion()
+    transcurrido = time.perf_counter() - inicio
+    print(f"{nombre:<16} {transcurrido / ventas * 1000:8.2f} ms/venta  {cliente.llamadas / ventas:4.1f} viajes/venta")
+
+
+if __name__ == "__main__":
+    ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latencia = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    st.session_state["uid"] = "benchmark"
+    medir("ruta anterior", ruta_anterior, ventas, latencia)
+    medir("registrar_venta", ruta_lote, ventas, latencia)
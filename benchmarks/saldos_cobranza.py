@@ -0,0 +1,128 @@
+"""Saldos por cliente de Cobranza: cálculo anterior contra calcular_saldos + tabla_cobranza.
+
+Antes de medir comprueba con datos aleatorios que ambas tablas coinciden.
+
+Uso: python -m benchmarks.saldos_cobranza [transacciones...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.saldos import calcular_saldos, tabla_cobranza
+
+CATEGORIAS = ["Cobranza", "Anticipo Cliente", "Anticipo Aplicado", "Ventas", "Gastos", None]
+TIPOS_VENTA = ["Crédito", "Mixta", "Contado", "Gratuita", None]
+COLUMNAS = ["Cliente", "Crédito Otorgado", "Total Pagos y Aplicaciones", "Saldo Pendiente Display", "Saldo Anticipos"]
+
+
+def datos_aleatorios(transacciones, semilla=0):
+    rng = np.random.default_rng(semilla)
+    clientes = np.array([f"Cliente {i}" for i in range(max(10, transacciones // 100))], dtype=object)
+    ventas = transacciones // 2
+    tipos = rng.choice(np.array(TIPOS_VENTA, dtype=object), ventas)
+    # Como en modules/ventas.py: solo las ventas a crédito o mixtas llevan monto a crédito
+    credito = np.where(np.isin(tipos, ["Crédito", "Mixta"]), rng.uniform(1, 500, ventas).round(2), 0.0)
+    ventas_df = pd.DataFrame({
+        "Cliente": rng.choice(clientes, ventas),
+        "Tipo de venta": tipos,
+        "Monto Crédito": credito,
+        "Total": rng.uniform(1, 1000, ventas).round(2),
+    })
+    transacciones_df = pd.DataFrame({
+        "Cliente": rng.choice(clientes, transacciones),
+        "Categoría": rng.choice(np.array(CATEGORIAS, dtype=object), transacciones),
+        "Monto": rng.uniform(1, 300, transacciones).round(2),
+    })
+    return ventas_df, transacciones_df
+
+
+def saldos_anterior(ventas_df, transacciones_df):
+    """Copia del cálculo que hacía cobranza.render() antes del motor vectorizado."""
+    ventas_df = ventas_df.copy()
+    transacciones_df = transacciones_df.copy()
+    for col in ["Monto Crédito", "Monto Contado", "Anticipo Aplicado", "Total"]:
+        if col not in ventas_df.columns:
+            ventas_df[col] = 0.0
+        ventas_df[col] = pd.to_numeric(ventas_df[col], errors='coerce').fillna(0.0)
+    transacciones_df["Monto"] = pd.to_numeric(transacciones_df["Monto"], errors='coerce').fillna(0.0)
+
+    ventas_df["Tipo de venta"] = ventas_df["Tipo de venta"].astype(str)
+    credito_otorgado = ventas_df[
+        ventas_df["Tipo de venta"].isin(["Crédito", "Mixta"])
+    ].groupby("Cliente")["Monto Crédito"].sum().reset_index()
+    credito_otorgado.rename(columns={"Monto Crédito": "Crédito Otorgado"}, inplace=True)
+
+    pagos_cobranza = transacciones_df[
+        transacciones_df["Categoría"].astype(str) == "Cobranza"
+        ].groupby("Cliente")["Monto"].sum().reset_index()
+    pagos_cobranza.rename(columns={"Monto": "Pagos Cobranza"}, inplace=True)
+
+    anticipos_cliente_recibidos = transacciones_df[
+        transacciones_df["Categoría"].astype(str) == "Anticipo Cliente"
+        ].groupby("Cliente")["Monto"].sum().reset_index()
+    anticipos_cliente_recibidos.rename(columns={"Monto": "Anticipos Recibidos"}, inplace=True)
+
+    anticipos_aplicados = transacciones_df[
+        transacciones_df["Categoría"].astype(str) == "Anticipo Aplicado"
+        ].groupby("Cliente")["Monto"].sum().reset_index()
+    anticipos_aplicados.rename(columns={"Monto": "Anticipos Aplicados"}, inplace=True)
+
+    saldo_anticipos = anticipos_cliente_recibidos.merge(anticipos_aplicados, on="Cliente", how="left").fillna(0)
+    saldo_anticipos["Saldo Anticipos"] = saldo_anticipos["Anticipos Recibidos"] - saldo_anticipos["Anticipos Aplicados"]
+    saldo_anticipos = saldo_anticipos[saldo_anticipos["Saldo Anticipos"] > 0]
+
+    saldos_final = pd.merge(credito_otorgado, pagos_cobranza, on="Cliente", how="left").fillna(0)
+    saldos_final["Total Pagos y Aplicaciones"] = saldos_final["Pagos Cobranza"]
+    saldos_final["Saldo Pendiente"] = saldos_final["Crédito Otorgado"] - saldos_final["Total Pagos y Aplicaciones"]
+
+    clientes_solo_anticipos = saldo_anticipos[~saldo_anticipos['Cliente'].isin(saldos_final['Cliente'])]
+    if not clientes_solo_anticipos.empty:
+        df_solo_anticipos = pd.DataFrame({
+            "Cliente": clientes_solo_anticipos["Cliente"],
+            "Crédito Otorgado": 0.0,
+            "Pagos Cobranza": 0.0,
+            "Anticipos Aplicados": 0.0,
+            "Total Pagos y Aplicaciones": 0.0,
+            "Saldo Pendiente": 0.0,
+        })
+        saldos_final = pd.concat([saldos_final, df_solo_anticipos], ignore_index=True)
+
+    saldos_completos = pd.merge(saldos_final, saldo_anticipos[['Cliente', 'Saldo Anticipos']], on="Cliente",
+                                how="left").fillna(0)
+    saldos_completos["Saldo Pendiente Display"] = saldos_completos.apply(
+        lambda row: 0.0 if row["Total Pagos y Aplicaciones"] >= row["Crédito Otorgado"] else row["Saldo Pendiente"],
+        axis=1
+    )
+    return saldos_completos
+
+
+def saldos_nuevo(ventas_df, transacciones_df):
+    return tabla_cobranza(calcular_saldos(ventas_df, transacciones_df))
+
+
+def comparar(anterior, nuevo):
+    anterior = anterior[COLUMNAS].sort_values("Cliente").reset_index(drop=True)
+    nuevo = nuevo[COLUMNAS].sort_values("Cliente").reset_index(drop=True)
+    pd.testing.assert_frame_equal(anterior, nuevo, check_dtype=False, atol=1e-6)
+
+
+def medir(nombre, funcion, ventas_df, transacciones_df):
+    inicio = time.perf_counter()
+    funcion(ventas_df, transacciones_df)
+    transcurrido = time.perf_counter() - inicio
+    print(f"{nombre:<10} {len(transacciones_df):>9} transacciones  {transcurrido * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    for semilla in range(20):
+        ventas_df, transacciones_df = datos_aleatorios(2_000, semilla)
+        comparar(saldos_anterior(ventas_df, transacciones_df), saldos_nuevo(ventas_df, transacciones_df))
+    print("Equivalencia comprobada en 20 conjuntos aleatorios.")
+
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in tamanos:
+        ventas_df, transacciones_df = datos_aleatorios(n)
+        medir("anterior", saldos_anterior, ventas_df, transacciones_df)
+        medir("nuevo", saldos_nuevo, ventas_df, transacciones_df)
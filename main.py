@@ -6,8 +6,8 @@ from utils import db
 # Cargar variables de entorno desde .env
 load_dotenv()
 
-# Inicializar Firebase con las variables ya cargadas
-db.inicializar_firebase()
+# Inicializar el almacenamiento (Firestore o SQLite) con las variables ya cargadas
+db.inicializar_backend()
 
 # 👉 Importar módulos funcionales
 from modules.clientes import render as render_clientes
@@ -43,15 +43,18 @@ with st.sidebar:
     )
 
 # 🧭 Navegación modular
-if selected == "📊 Dashboard":
-    render_dashboard()
-elif selected == "💸 Ventas":
-    render_ventas()
-elif selected == "🧾 Contabilidad":
-    render_contabilidad()
-elif selected == "👥 Clientes":
-    render_clientes()
-elif selected == "💳 Cobranza":
-    render_cobranza()
-elif selected == "📦 Productos":
-    render_productos()
+# Cada rerun es una unidad de trabajo: una colección se lee a lo más una vez por
+# versión y al final se registra cuántas lecturas hizo (ver utils/db.py)
+with db.unidad_de_trabajo():
+    if selected == "📊 Dashboard":
+        render_dashboard()
+    elif selected == "💸 Ventas":
+        render_ventas()
+    elif selected == "🧾 Contabilidad":
+        render_contabilidad()
+    elif selected == "👥 Clientes":
+        render_clientes()
+    elif selected == "💳 Cobranza":
+        render_cobranza()
+    elif selected == "📦 Productos":
+        render_productos()
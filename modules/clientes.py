@@ -1,16 +1,7 @@
 import streamlit as st
 import pandas as pd
-import io # Importación necesaria para manejar datos en memoria para Excel
-from utils.db import guardar_cliente, leer_clientes, actualizar_cliente
-
-# Helper function to convert DataFrame to Excel
-def to_excel(df):
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Clientes') # Nombre de la hoja en Excel
-    writer.close() # Importante cerrar el escritor para guardar el contenido
-    processed_data = output.getvalue()
-    return processed_data
+from utils.db import guardar_cliente, leer_clientes, actualizar_cliente, fila_por
+from utils.exportar import botones_descarga
 
 def render():
     st.title("👥 Gestión de Clientes")
@@ -61,7 +52,7 @@ def render():
         seleccion = st.selectbox("Selecciona un cliente para editar", st.session_state.clientes["ID-Nombre"].tolist(), key="select_cliente_edit")
         id_seleccionado = seleccion.split(" - ")[0]
 
-        cliente_original = st.session_state.clientes[st.session_state.clientes["ID"].astype(str) == id_seleccionado].iloc[0]
+        cliente_original = fila_por("clientes", "ID", id_seleccionado)
 
         with st.form("form_editar_cliente"):
             # Usar claves únicas para los widgets dentro del formulario de edición
@@ -107,11 +98,7 @@ def render():
 
     # --- Botón para exportar a Excel ---
     if not st.session_state.clientes.empty:
-        st.download_button(
-            label="Exportar lista de clientes a Excel",
-            data=to_excel(df_to_display), # Usar el DataFrame limpio para exportar
-            file_name="lista_clientes.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # Usar el DataFrame limpio para exportar
+        botones_descarga("Exportar lista de clientes", {"Clientes": df_to_display}, "lista_clientes", ["clientes"])
     else:
         st.info("No hay clientes para exportar.")
\ No newline at end of file
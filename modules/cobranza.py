@@ -1,18 +1,17 @@
 import streamlit as st
 import pandas as pd
 import datetime  # Importación necesaria para manejar fechas
-import io  # Importación necesaria para manejar datos en memoria para Excel
-from utils.db import leer_ventas, guardar_transaccion, leer_transacciones, leer_clientes
+from utils.db import (
+    guardar_transaccion, leer_transacciones, leer_ventas_cliente, leer_transacciones_cliente,
+    reconstruir_saldos_clientes, cargar_colecciones, filtrar_por_busqueda, LIMITE_BUSQUEDA,
+)
+from utils.exportar import botones_descarga
+from utils.resumenes import DIARIO_TRANSACCIONES
+from utils.saldos import COLECCION_SALDOS, tabla_cobranza
+from utils.tablas import tabla_paginada
 
-
-# Helper function to convert DataFrame to Excel
-def to_excel(df):
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Datos')  # 'Datos' es el nombre de la hoja en Excel
-    writer.close()  # Importante cerrar el escritor para guardar el contenido
-    processed_data = output.getvalue()
-    return processed_data
+CATEGORIAS_HISTORIAL = ["Cobranza", "Anticipo Cliente", "Anticipo Aplicado"]
+COLUMNAS_HISTORIAL = ["Fecha", "Cliente", "Descripción", "Monto", "Método de pago", "Categoría", "Tipo"]
 
 
 # Función de callback para el selectbox de cliente
@@ -39,94 +38,16 @@ def on_cliente_change():
 def render():
     st.title("💰 Módulo de cobranza")
 
-    # Cargar datos frescos en cada render para asegurar la actualización
-    st.session_state.ventas_data = leer_ventas()
-    st.session_state.transacciones_data = leer_transacciones()
-    st.session_state.clientes = leer_clientes()
+    # Cargar datos frescos en cada render para asegurar la actualización (a la vez).
+    # Del historial solo se necesitan sus fechas: salen del resumen diario
+    datos = cargar_colecciones(DIARIO_TRANSACCIONES, "clientes", COLECCION_SALDOS)
+    fechas_historial = datos[DIARIO_TRANSACCIONES]["Fecha"].dropna()
+    st.session_state.clientes = datos["clientes"]
 
-    ventas_df = st.session_state.ventas_data
-    transacciones_df = st.session_state.transacciones_data
     clientes_df = st.session_state.clientes
 
-    # --- Preprocesamiento y cálculo de saldos ---
-
-    # Asegurar que las columnas numéricas sean float y manejar NaNs
-    numeric_cols_ventas = ["Monto Crédito", "Monto Contado", "Anticipo Aplicado", "Total"]
-    for col in numeric_cols_ventas:
-        if col not in ventas_df.columns:
-            ventas_df[col] = 0.0
-        ventas_df[col] = pd.to_numeric(ventas_df[col], errors='coerce').fillna(0.0)
-
-    numeric_cols_transacciones = ["Monto"]
-    for col in numeric_cols_transacciones:
-        if col not in transacciones_df.columns:
-            transacciones_df[col] = 0.0
-        transacciones_df[col] = pd.to_numeric(transacciones_df[col], errors='coerce').fillna(0.0)
-
-    # 1. Calcular el total de crédito otorgado por cliente
-    # Asegurarse de que 'Tipo de venta' sea string para la comparación
-    ventas_df["Tipo de venta"] = ventas_df["Tipo de venta"].astype(str)
-    credito_otorgado = ventas_df[
-        ventas_df["Tipo de venta"].isin(["Crédito", "Mixta"])
-    ].groupby("Cliente")["Monto Crédito"].sum().reset_index()
-    credito_otorgado.rename(columns={"Monto Crédito": "Crédito Otorgado"}, inplace=True)
-
-    # 2. Calcular el total de pagos de cobranza (efectivos) por cliente
-    pagos_cobranza = transacciones_df[
-        transacciones_df["Categoría"].astype(str) == "Cobranza"
-        ].groupby("Cliente")["Monto"].sum().reset_index()
-    pagos_cobranza.rename(columns={"Monto": "Pagos Cobranza"}, inplace=True)
-
-    # 3. Calcular el total de anticipos DISPONIBLES (saldo a favor del cliente)
-    # Esto es: Anticipos Cliente - Anticipos Aplicados
-    anticipos_cliente_recibidos = transacciones_df[
-        transacciones_df["Categoría"].astype(str) == "Anticipo Cliente"
-        ].groupby("Cliente")["Monto"].sum().reset_index()
-    anticipos_cliente_recibidos.rename(columns={"Monto": "Anticipos Recibidos"}, inplace=True)
-
-    # Necesitamos `anticipos_aplicados` para el cálculo del Saldo Anticipos
-    anticipos_aplicados_para_saldo_anticipos = transacciones_df[
-        transacciones_df["Categoría"].astype(str) == "Anticipo Aplicado"
-        ].groupby("Cliente")["Monto"].sum().reset_index()
-    anticipos_aplicados_para_saldo_anticipos.rename(columns={"Monto": "Anticipos Aplicados"}, inplace=True)
-
-    saldo_anticipos = anticipos_cliente_recibidos.merge(anticipos_aplicados_para_saldo_anticipos, on="Cliente",
-                                                        how="left").fillna(0)
-    saldo_anticipos["Saldo Anticipos"] = saldo_anticipos["Anticipos Recibidos"] - saldo_anticipos["Anticipos Aplicados"]
-    # Nos interesan solo los anticipos disponibles (positivos)
-    saldo_anticipos = saldo_anticipos[saldo_anticipos["Saldo Anticipos"] > 0]
-
-    # Unir solo el crédito otorgado y los pagos de cobranza directos
-    saldos_final = pd.merge(credito_otorgado, pagos_cobranza, on="Cliente", how="left").fillna(0)
-
-    # El "Total Pagos y Aplicaciones" para el calculo de deuda solo debe incluir Cobranza
-    saldos_final["Total Pagos y Aplicaciones"] = saldos_final["Pagos Cobranza"]
-
-    # Calcular el Saldo Pendiente
-    saldos_final["Saldo Pendiente"] = saldos_final["Crédito Otorgado"] - saldos_final["Total Pagos y Aplicaciones"]
-
-    # Añadir clientes que solo tienen anticipos (sin deuda actual)
-    # Identificar clientes que tienen anticipos pero no aparecen en saldos_final (no tienen deuda)
-    clientes_solo_anticipos = saldo_anticipos[~saldo_anticipos['Cliente'].isin(saldos_final['Cliente'])]
-
-    if not clientes_solo_anticipos.empty:
-        # Crear un DataFrame con la estructura de saldos_final para estos clientes
-        df_solo_anticipos = pd.DataFrame({
-            "Cliente": clientes_solo_anticipos["Cliente"],
-            "Crédito Otorgado": 0.0,
-            "Pagos Cobranza": 0.0,
-            "Anticipos Aplicados": 0.0,
-            "Total Pagos y Aplicaciones": 0.0,
-            "Saldo Pendiente": 0.0  # Su saldo pendiente es 0, su "saldo" es el anticipo a favor
-        })
-        saldos_final = pd.concat([saldos_final, df_solo_anticipos], ignore_index=True)
-
-    # Merge final para mostrar el saldo de anticipos junto con el saldo pendiente de deuda
-    saldos_completos = pd.merge(saldos_final, saldo_anticipos[['Cliente', 'Saldo Anticipos']], on="Cliente",
-                                how="left").fillna(0)
-
-    # Asegurarse de que el "Saldo Pendiente" no sea negativo (si es 0 o negativo, significa que se cubrió la deuda)
-    saldos_completos["Saldo Pendiente Display"] = saldos_completos["Saldo Pendiente"].apply(lambda x: max(0, x))
+    # --- Saldos por cliente (resumen materializado, ver utils/saldos.py) ---
+    saldos_completos = tabla_cobranza(datos[COLECCION_SALDOS])
 
     # --- Fin preprocesamiento y cálculo de saldos ---
 
@@ -146,11 +67,7 @@ def render():
         key="filtro_saldos_cliente_tabla"
     )
 
-    saldos_display = saldos_completos.copy()
-    saldos_display["Saldo Pendiente Display"] = saldos_display.apply(
-        lambda row: 0.0 if row["Total Pagos y Aplicaciones"] >= row["Crédito Otorgado"] else row["Saldo Pendiente"],
-        axis=1
-    )
+    saldos_display = saldos_completos
 
     if filtro_cliente_saldos != "Todos los clientes":
         df_to_display_export_saldos = saldos_display[saldos_display["Cliente"] == filtro_cliente_saldos].copy()
@@ -172,36 +89,40 @@ def render():
         file_name_suffix = ""
         if filtro_cliente_saldos != "Todos los clientes":
             file_name_suffix = f"_{filtro_cliente_saldos.replace(' ', '_')}"
-            label_text = f"Exportar Saldo de {filtro_cliente_saldos} a Excel"
+            label_text = f"Exportar Saldo de {filtro_cliente_saldos}"
         else:
-            label_text = "Exportar todos los Saldos a Excel"
+            label_text = "Exportar todos los Saldos"
 
-        st.download_button(
-            label=label_text,
-            data=to_excel(df_to_display_export_saldos),
-            file_name=f"saldos_clientes{file_name_suffix}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        botones_descarga(label_text, {"Datos": df_to_display_export_saldos}, f"saldos_clientes{file_name_suffix}",
+                         [COLECCION_SALDOS, "clientes"], filtro_cliente_saldos)
     else:
         st.info("No hay saldos pendientes para mostrar según el filtro seleccionado.")
 
     st.divider()
     st.subheader("🧾 Registrar nuevo pago")
 
+    # Búsqueda por nombre, empresa, RFC o correo (ver utils/busqueda.py)
+    consulta_cliente = st.text_input("Buscar cliente", placeholder="Nombre, empresa, RFC o correo",
+                                     key="cobranza_buscar_cliente")
+    opciones_pago = filtrar_por_busqueda("clientes", clientes_df, consulta_cliente, LIMITE_BUSQUEDA)["Nombre"].tolist()
+    if not opciones_pago:
+        st.caption("Sin coincidencias; se muestran todos los clientes.")
+        opciones_pago = cliente_opciones
+
     # --- INICIALIZACIÓN ADECUADA DEL SELECTBOX DE CLIENTE PARA REGISTRAR PAGO ---
     # Calculamos el índice por defecto de forma segura.
     default_index_for_cobranza_select = 0 # Valor predeterminado si no se encuentra o no hay opciones
     if "cobranza_cliente_select_form" in st.session_state and \
-       st.session_state.cobranza_cliente_select_form in cliente_opciones:
+       st.session_state.cobranza_cliente_select_form in opciones_pago:
         # Si la clave ya existe en session_state (porque el selectbox ya se renderizó antes)
         # y el valor guardado está en las opciones actuales, usa su índice.
-        default_index_for_cobranza_select = cliente_opciones.index(st.session_state.cobranza_cliente_select_form)
+        default_index_for_cobranza_select = opciones_pago.index(st.session_state.cobranza_cliente_select_form)
     # Si no hay clientes, el `st.stop()` de arriba ya detuvo la ejecución.
     # Si hay clientes pero la clave no está en session_state, default_index_for_cobranza_select será 0 (primer cliente).
 
     cliente_seleccionado = st.selectbox(
         "Cliente",
-        cliente_opciones,
+        opciones_pago,
         index=default_index_for_cobranza_select,
         key="cobranza_cliente_select_form", # Esta key es crucial para Streamlit
         on_change=on_cliente_change
@@ -239,39 +160,30 @@ def render():
     descripcion = st.text_input("Referencia del pago (opcional)", key="cobranza_descripcion")
 
     if st.button("Procesar Pago", key="cobranza_procesar_pago_btn_main"):
-        # Vuelve a cargar datos frescos justo antes de procesar
-        st.session_state.transacciones_data = leer_transacciones()
-        st.session_state.ventas_data = leer_ventas()
-
         monto_f = float(monto)
 
         if monto_f <= 0:
             st.error("❌ El monto a abonar debe ser mayor que cero.")
             st.stop()  # Detener la ejecución si el monto es inválido
 
-        # Recalcular el saldo pendiente y anticipo a favor para el cliente seleccionado
-        # Usamos los DataFrames actualizados de session_state
-        current_ventas_df = st.session_state.ventas_data
-        current_transacciones_df = st.session_state.transacciones_data
+        # Recalcular el saldo pendiente y anticipo a favor con datos frescos,
+        # consultando solo los documentos del cliente seleccionado
+        current_ventas_df = leer_ventas_cliente(cliente_seleccionado, ["Crédito", "Mixta"])
+        current_transacciones_df = leer_transacciones_cliente(
+            cliente_seleccionado, ["Cobranza", "Anticipo Aplicado", "Anticipo Cliente"])
 
-        credito_otorgado_current = current_ventas_df[
-            (current_ventas_df["Tipo de venta"].isin(["Crédito", "Mixta"])) &
-            (current_ventas_df["Cliente"] == cliente_seleccionado)
-            ]["Monto Crédito"].sum()
+        credito_otorgado_current = current_ventas_df["Monto Crédito"].sum()
 
         pagos_cobranza_current = current_transacciones_df[
-            (current_transacciones_df["Categoría"].astype(str) == "Cobranza") &
-            (current_transacciones_df["Cliente"] == cliente_seleccionado)
+            current_transacciones_df["Categoría"] == "Cobranza"
             ]["Monto"].sum()
 
         anticipos_aplicados_current = current_transacciones_df[
-            (current_transacciones_df["Categoría"].astype(str) == "Anticipo Aplicado") &
-            (current_transacciones_df["Cliente"] == cliente_seleccionado)
+            current_transacciones_df["Categoría"] == "Anticipo Aplicado"
             ]["Monto"].sum()
 
         anticipos_recibidos_current = current_transacciones_df[
-            (current_transacciones_df["Categoría"].astype(str) == "Anticipo Cliente") &
-            (current_transacciones_df["Cliente"] == cliente_seleccionado)
+            current_transacciones_df["Categoría"] == "Anticipo Cliente"
             ]["Monto"].sum()
 
         total_pagos_aplicaciones_current = pagos_cobranza_current
@@ -328,10 +240,6 @@ def render():
             }
             st.session_state["mostrar_opciones_anticipo"] = True
 
-        # Una vez que la transacción inicial se procesa o se establecen las banderas
-        st.session_state.transacciones_data = leer_transacciones()  # Recargar datos después de guardar
-        st.session_state.ventas_data = leer_ventas()
-
         # Después de procesar el pago, borra el valor de session_state para que se recalcule
         # en el siguiente render o al cambiar de cliente.
         if "cobranza_monto_input" in st.session_state:
@@ -410,8 +318,6 @@ def render():
             # Limpiar banderas y recargar para refrescar la UI
             st.session_state["mostrar_opciones_excedente"] = False
             st.session_state["pago_excedente_info"] = {}
-            st.session_state.transacciones_data = leer_transacciones()
-            st.session_state.ventas_data = leer_ventas()
             st.rerun()
         elif cancelar_opcion_excedente:
             st.info("Operación de pago cancelada por el usuario.")
@@ -455,8 +361,6 @@ def render():
             # Limpiar banderas y recargar
             st.session_state["mostrar_opciones_anticipo"] = False
             st.session_state["pago_anticipo_info"] = {}
-            st.session_state.transacciones_data = leer_transacciones()
-            st.session_state.ventas_data = leer_ventas()
             st.rerun()
         elif cancelar_opcion_anticipo:
             st.info("Operación de pago cancelada por el usuario.")
@@ -473,68 +377,48 @@ def render():
         # Asegúrate de que las fechas por defecto sean datetime.date.today()
         # y que se maneje el caso de DataFrame vacío.
         default_start_date_hist = datetime.date.today() # Valor por defecto a hoy
-        if not st.session_state.transacciones_data.empty and "Fecha" in st.session_state.transacciones_data.columns:
-            # Convertir a datetime antes de buscar min
-            # Crear una copia para evitar SettingWithCopyWarning
-            temp_df_for_dates = st.session_state.transacciones_data.copy()
-            temp_df_for_dates["Fecha_dt"] = pd.to_datetime(temp_df_for_dates["Fecha"], errors='coerce')
-            # Filtrar NaT antes de encontrar el mínimo, o establecer una fecha predeterminada
-            valid_dates = temp_df_for_dates["Fecha_dt"].dropna()
-            if not valid_dates.empty:
-                default_start_date_hist = valid_dates.min().date()
+        if not fechas_historial.empty:
+            default_start_date_hist = fechas_historial.min().date()
 
         start_date_hist = st.date_input("Fecha de inicio (historial)", value=default_start_date_hist)
 
     with col_hist2:
         default_end_date_hist = datetime.date.today() # Valor por defecto a hoy
-        if not st.session_state.transacciones_data.empty and "Fecha" in st.session_state.transacciones_data.columns:
-            temp_df_for_dates = st.session_state.transacciones_data.copy()
-            temp_df_for_dates["Fecha_dt"] = pd.to_datetime(temp_df_for_dates["Fecha"], errors='coerce')
-            valid_dates = temp_df_for_dates["Fecha_dt"].dropna()
-            if not valid_dates.empty:
-                default_end_date_hist = valid_dates.max().date()
+        if not fechas_historial.empty:
+            default_end_date_hist = fechas_historial.max().date()
 
         end_date_hist = st.date_input("Fecha de fin (historial)", value=default_end_date_hist)
 
 
-    historial_transacciones = st.session_state.transacciones_data[
-        st.session_state.transacciones_data["Categoría"].astype(str).isin(
-            ["Cobranza", "Anticipo Cliente", "Anticipo Aplicado"])
-    ].copy() if not st.session_state.transacciones_data.empty else pd.DataFrame()
-
-    if not historial_transacciones.empty:
-        # Asegurarse de que la columna 'Fecha' sea datetime para el filtrado
-        # Crear una copia para evitar SettingWithCopyWarning
-        historial_transacciones["Fecha_dt"] = pd.to_datetime(historial_transacciones["Fecha"], errors='coerce')
-
-        # Eliminar filas con fechas inválidas (NaT) antes de filtrar
-        historial_transacciones.dropna(subset=['Fecha_dt'], inplace=True)
-
-
-        # Aplicar filtro por fechas
-        if start_date_hist:
-            historial_transacciones = historial_transacciones[historial_transacciones["Fecha_dt"].dt.date >= start_date_hist]
-        if end_date_hist:
-            historial_transacciones = historial_transacciones[historial_transacciones["Fecha_dt"].dt.date <= end_date_hist]
-
-        if all(col in historial_transacciones.columns for col in
-               ["Fecha", "Cliente", "Descripción", "Monto", "Método de pago",
-                "Categoría", "Tipo"]):
-            df_historial_to_display_export = historial_transacciones[
-                ["Fecha", "Cliente", "Descripción", "Monto", "Método de pago", "Categoría", "Tipo"]
-            ].sort_values("Fecha", ascending=False)
-            st.dataframe(df_historial_to_display_export, use_container_width=True)
-
-            if not df_historial_to_display_export.empty:
-                st.download_button(
-                    label="Exportar historial a Excel",
-                    data=to_excel(df_historial_to_display_export),
-                    file_name="historial_pagos_anticipos.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            else:
-                st.info("No hay pagos o anticipos en el rango de fechas seleccionado.")
-        else:
-            st.info("Columnas necesarias para el historial no encontradas. Asegúrese de que los datos sean correctos.")
+    # Solo se lee y se envía la página visible del rango (ver utils/tablas.py)
+    filtro_historial = [("Categoría", "in", CATEGORIAS_HISTORIAL)]
+    pagina_historial = tabla_paginada(
+        "transacciones", "tabla_historial_cobranza", COLUMNAS_HISTORIAL, ["Fecha"],
+        filtros=filtro_historial, filtrables={"Cliente": cliente_opciones},
+        desde=start_date_hist, hasta=end_date_hist,
+    )
+
+    if not pagina_historial.empty:
+        # El rango completo se lee solo al pedir la descarga
+        def historial_rango():
+            transacciones_rango = leer_transacciones(desde=start_date_hist, hasta=end_date_hist)
+            historial = transacciones_rango[transacciones_rango["Categoría"].isin(CATEGORIAS_HISTORIAL)]
+            return {"Datos": historial[COLUMNAS_HISTORIAL].sort_values("Fecha", ascending=False)}
+
+        botones_descarga("Exportar historial", historial_rango,
+                         "historial_pagos_anticipos", ["transacciones"], start_date_hist, end_date_hist,
+                         formatos=("xlsx", "csv", "parquet"))
     else:
-        st.info("Aún no se han registrado pagos o anticipos.")
\ No newline at end of file
+        st.info("No hay pagos o anticipos en el rango de fechas seleccionado.")
+
+    with st.expander("🔧 Mantenimiento"):
+        st.caption(
+            "Los saldos por cliente se actualizan con cada venta o pago. Reconstruirlos recalcula el "
+            "resumen desde todo el historial e informa qué clientes no coincidían."
+        )
+        if st.button("Reconstruir saldos por cliente"):
+            diferencias = reconstruir_saldos_clientes()
+            if diferencias:
+                st.warning(f"⚠️ Se corrigieron {len(diferencias)} clientes: {', '.join(map(str, diferencias))}")
+            else:
+                st.success("✅ Los saldos guardados coinciden con el historial.")
@@ -1,9 +1,12 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import io
 import datetime
-from utils.db import guardar_transaccion, leer_transacciones, calcular_balance_contable
+from utils.db import COLUMNAS, guardar_transaccion, leer_transacciones, calcular_balance_contable, leer_resumen_diario_transacciones, reconstruir_resumenes_diarios
+from utils.exportar import botones_descarga, exportar_historial
+from utils.tablas import tabla_paginada
+
+CATEGORIAS = ["Ventas", "Servicios", "Compras", "Sueldos", "Papeleria",
+              "Transporte", "Otro", "Cobranza", "Anticipo Cliente", "Anticipo Aplicado"]
 
 def render():
     # ✅ 1) Bloquea si no hay sesión
@@ -13,26 +16,16 @@ def render():
 
     st.title("🧾 Contabilidad")
 
-    # ✅ 2) Cargar transacciones desde Firestore
-    transacciones_data = leer_transacciones()
-    st.session_state.transacciones = pd.DataFrame(transacciones_data)
-
-    # Asegurar columna numérica para agrupar/graficar sin fallos
-    if "Monto" in st.session_state.transacciones.columns:
-        st.session_state.transacciones["Monto"] = pd.to_numeric(
-            st.session_state.transacciones["Monto"], errors="coerce"
-        ).fillna(0.0)
+    # ✅ 2) Cargar el resumen diario (unas filas por día) en lugar del historial:
+    # alimenta las métricas y las gráficas; la tabla lee solo su página
+    resumen_diario = leer_resumen_diario_transacciones()
 
     # ✅ 3) Formulario contable
     with st.form("form_registro"):
         st.subheader("Registrar nueva transacción")
         fecha = st.date_input("Fecha", value=datetime.date.today())
         descripcion = st.text_input("Descripción")
-        categoria = st.selectbox(
-            "Categoría",
-            ["Ventas", "Servicios", "Compras", "Sueldos", "Papeleria",
-             "Transporte", "Otro", "Cobranza", "Anticipo Cliente", "Anticipo Aplicado"]
-        )
+        categoria = st.selectbox("Categoría", CATEGORIAS)
         tipo = st.radio("Tipo", ["Ingreso", "Egreso"])
         monto = st.number_input("Monto", min_value=0.0, format="%.2f")
         submitted = st.form_submit_button("Agregar")
@@ -52,29 +45,26 @@ def render():
             }
             guardar_transaccion(transaccion)
 
-            # Recargar
-            st.session_state.transacciones = pd.DataFrame(leer_transacciones())
-            if "Monto" in st.session_state.transacciones.columns:
-                st.session_state.transacciones["Monto"] = pd.to_numeric(
-                    st.session_state.transacciones["Monto"], errors="coerce"
-                ).fillna(0.0)
-
             st.success("✅ Transacción guardada correctamente")
             st.rerun()
 
     st.divider()
     st.subheader("📋 Histórico contable")
 
-    if st.session_state.transacciones.empty:
+    if resumen_diario.empty:
         st.info("Aún no hay transacciones registradas.")
         return
 
-    st.dataframe(st.session_state.transacciones, use_container_width=True)
+    # Solo se lee y se envía la página visible (ver utils/tablas.py)
+    tabla_paginada(
+        "transacciones", "tabla_contable", COLUMNAS["transacciones"], ["Fecha"],
+        filtrables={"Tipo": ["Ingreso", "Egreso"], "Categoría": CATEGORIAS},
+    )
 
     st.divider()
     st.subheader("📉 Balance general")
 
-    ingresos, gastos, balance = calcular_balance_contable()
+    ingresos, gastos, balance = calcular_balance_contable(resumen=resumen_diario)
     col1, col2, col3 = st.columns(3)
     col1.metric("Ingresos", f"${ingresos:,.2f}")
     col2.metric("Egresos", f"${gastos:,.2f}")
@@ -83,16 +73,16 @@ def render():
     st.divider()
     st.subheader("📊 Distribución contable")
 
-    resumen_tipo = st.session_state.transacciones.groupby("Tipo")["Monto"].sum().reset_index()
+    resumen_tipo = resumen_diario.groupby("Tipo", observed=True)["Monto"].sum().reset_index()
     fig = px.pie(resumen_tipo, names="Tipo", values="Monto",
                  title="Ingresos vs Egresos", template="plotly_white")
     st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("📑 Desglose por tipo y categoría")
-    if "Categoría" in st.session_state.transacciones.columns:
+    if not resumen_diario.empty:
         resumen_tipo_categoria = (
-            st.session_state.transacciones
-            .groupby(["Tipo", "Categoría"])["Monto"]
+            resumen_diario
+            .groupby(["Tipo", "Categoría"], observed=True)["Monto"]
             .sum()
             .reset_index()
             .sort_values(by="Monto", ascending=False)
@@ -112,15 +102,20 @@ def render():
         st.plotly_chart(fig_tc, use_container_width=True)
 
     st.subheader("📤 Exportar historial contable")
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        st.session_state.transacciones.to_excel(writer, index=False, sheet_name="Transacciones")
-    output.seek(0)
-
     fecha_actual = datetime.date.today().isoformat()
-    st.download_button(
-        label="📥 Descargar como Excel",
-        data=output,
-        file_name=f"historial_contable_{fecha_actual}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
\ No newline at end of file
+    # El historial se lee hasta que se pide la descarga
+    botones_descarga("📥 Descargar", lambda: {"Transacciones": leer_transacciones()},
+                     f"historial_contable_{fecha_actual}", ["transacciones"], formatos=("xlsx", "csv", "parquet"))
+
+    with st.expander("📦 Exportar historial completo por páginas"):
+        st.caption("Para historiales grandes: se lee por páginas y se escribe directo al archivo.")
+        exportar_historial("transacciones", "historial contable", f"transacciones_completo_{fecha_actual}")
+
+    with st.expander("🔧 Mantenimiento"):
+        st.caption(
+            "Las gráficas y el balance usan resúmenes diarios que se actualizan con cada venta o "
+            "transacción. Reconstruirlos los recalcula desde todo el historial."
+        )
+        if st.button("Reconstruir resúmenes diarios"):
+            totales = reconstruir_resumenes_diarios()
+            st.success(f"✅ Resúmenes reconstruidos: {sum(totales.values())} documentos.")
@@ -1,14 +1,77 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import io
 import datetime
 from PIL import Image
-from utils.db import leer_ventas, leer_transacciones, leer_clientes, leer_productos, calcular_balance_contable # Importar calcular_balance_contable
+from utils.db import (
+    calcular_balance_contable, cargar_colecciones, leer_resumen_diario_transacciones,
+    leer_resumen_diario_ventas, memoizar, estadisticas_memo, tiempos_carga, divergencias,
+)
+from utils.exportar import botones_descarga
+from utils.resumenes import DIARIO_TRANSACCIONES, DIARIO_VENTAS
 
 from dotenv import load_dotenv
 load_dotenv()  # <-- ¡Carga .env antes de importar módulos que dependen de variables de entorno!
 
+# ---------------------------
+# Cálculos del panel
+# ---------------------------
+# Cada uno regresa sus tablas y la especificación (dict) de sus gráficas para
+# que memoizar() las guarde mientras no cambien las colecciones de origen.
+def _composicion(desde):
+    ingresos, egresos, balance = calcular_balance_contable(desde=desde)
+    df_bar = pd.DataFrame({
+        "Categoría": ["Ingresos", "Egresos", "Balance Neto"],
+        "Monto": [ingresos, egresos, balance]
+    })
+    fig = px.bar(df_bar, x="Categoría", y="Monto", color="Categoría",
+                 template="plotly_white", title="Distribución por tipo")
+    return (ingresos, egresos, balance), df_bar, fig.to_dict()
+
+def _desglose(desde):
+    resumen_tipo_categoria = (
+        leer_resumen_diario_transacciones(desde=desde)
+        .groupby(["Tipo", "Categoría"], observed=True)["Monto"]
+        .sum()
+        .reset_index()
+        .sort_values(by="Monto", ascending=False)
+    )
+    if resumen_tipo_categoria.empty:
+        return resumen_tipo_categoria, None
+    fig_tc = px.bar(
+        resumen_tipo_categoria,
+        x="Monto",
+        y="Categoría",
+        color="Tipo",
+        barmode="group",
+        title="Importe por categoría y tipo",
+        template="plotly_white",
+        text_auto=".2s",
+        orientation="h"
+    )
+    return resumen_tipo_categoria, fig_tc.to_dict()
+
+def _flujo(desde):
+    flujo = leer_resumen_diario_ventas(desde=desde)
+    if flujo.empty:
+        return None
+    return px.line(flujo, x="Fecha", y="Total", markers=True,
+                   template="plotly_white", title="Ingresos diarios por ventas").to_dict()
+
+def _clientes_y_productos(ventas_df):
+    resumen_clientes = ventas_df.groupby("Cliente", observed=True)["Total"].sum().reset_index().sort_values(by="Total", ascending=False)
+    resumen_productos = ventas_df.groupby("Producto", observed=True)["Cantidad"].sum().reset_index().sort_values(by="Cantidad", ascending=False)
+    fig_clientes = px.bar(resumen_clientes, x="Cliente", y="Total",
+                          title="Ingresos por cliente", template="plotly_white")
+    fig_productos = px.bar(resumen_productos, x="Producto", y="Cantidad",
+                           title="Ranking de productos", template="plotly_white")
+    return resumen_clientes, fig_clientes.to_dict(), resumen_productos, fig_productos.to_dict()
+
+def _margen(productos_df):
+    margen_df = productos_df[["Nombre", "Precio Unitario", "Costo Unitario"]].copy()
+    margen_df["Margen Unitario"] = margen_df["Precio Unitario"] - margen_df["Costo Unitario"]
+    return margen_df
+
 def render():
     # ✅ Verificar sesión antes de continuar
     if "uid" not in st.session_state:
@@ -34,81 +97,46 @@ def render():
     # 🔄 Cargar datos desde Firestore
     # Siempre recargamos los datos para asegurar que el dashboard esté actualizado
     # Esto también recargará los DataFrames de st.session_state automáticamente.
-    st.session_state.ventas = leer_ventas()
-    st.session_state.transacciones = leer_transacciones()
-    st.session_state.clientes = leer_clientes()
-    st.session_state.productos = leer_productos()
+    # Las métricas y gráficas financieras leen los resúmenes diarios, no el historial completo
+    # Las tres colecciones se leen a la vez (ver cargar_colecciones en utils/db.py)
+    datos = cargar_colecciones("ventas", "clientes", "productos")
+    st.session_state.ventas = datos["ventas"]
+    st.session_state.clientes = datos["clientes"]
+    st.session_state.productos = datos["productos"]
 
     ventas_df = st.session_state.ventas
-    transacciones_df = st.session_state.transacciones
     clientes_df = st.session_state.clientes
     productos_df = st.session_state.productos
 
-    # ✅ Asegurar que 'Monto' en transacciones_df sea numérico
-    if "Monto" not in transacciones_df.columns:
-        transacciones_df["Monto"] = 0.0 # Asegurar que sea float
-    else:
-        transacciones_df["Monto"] = pd.to_numeric(transacciones_df["Monto"], errors="coerce").fillna(0.0)
-
-    # ✅ Asegurar que 'Total' en ventas_df sea numérico
-    if "Total" not in ventas_df.columns:
-        ventas_df["Total"] = 0.0
-    else:
-        ventas_df["Total"] = pd.to_numeric(ventas_df["Total"], errors="coerce").fillna(0.0)
-
-    # 🚀 Cálculo de Ingresos y Egresos
-    # Usaremos la función calcular_balance_contable de utils.db para consistencia
-    ingresos_totales, egresos_totales, balance_neto = calcular_balance_contable()
+    # 📅 Periodo de las métricas y gráficas financieras
+    periodo = st.radio("Periodo", ["Mes actual", "Todo el historial"], horizontal=True, key="dashboard_periodo")
+    desde = datetime.date.today().replace(day=1) if periodo == "Mes actual" else None
+    sufijo = "del mes" if desde else "Totales"
 
-    # Los "ingresos del mes" y "gastos del mes" en las métricas pueden ser filtrados por fecha si quieres.
-    # Por ahora, usaré los totales anuales de calcular_balance_contable para estas métricas,
-    # que es lo que la función ya proporciona (suma de todos los tiempos).
-    # Si quisieras "del mes", necesitarías filtrar por fecha actual en las funciones leer_X o aquí.
+    # 🚀 Tablas y gráficas: se recalculan solo si cambió alguna de sus colecciones
+    # (ver memoizar en utils/db.py); en un rerun sin cambios se reutilizan
+    (ingresos_totales, egresos_totales, balance_neto), df_bar, fig_bar = memoizar(
+        "dashboard:composicion", [DIARIO_TRANSACCIONES], lambda: _composicion(desde), desde)
 
     col1, col2, col3 = st.columns(3)
-    col1.metric("Ingresos Totales", f"${ingresos_totales:,.0f}") # Ajustado a "Totales"
-    col2.metric("Egresos Totales", f"${egresos_totales:,.0f}") # ¡CAMBIO CLAVE AQUÍ: 'Egresos' en lugar de 'Gastos'
-    col3.metric("Balance Neto", f"${balance_neto:,.0f}")
+    col1.metric(f"Ingresos {sufijo}", f"${ingresos_totales:,.0f}")
+    col2.metric(f"Egresos {sufijo}", f"${egresos_totales:,.0f}") # ¡CAMBIO CLAVE AQUÍ: 'Egresos' en lugar de 'Gastos'
+    col3.metric(f"Balance Neto {sufijo}", f"${balance_neto:,.0f}")
 
     st.divider()
     st.markdown("### 📈 Composición financiera")
-    # Para el gráfico de barras, usamos los mismos valores
-    df_bar = pd.DataFrame({
-        "Categoría": ["Ingresos", "Egresos", "Balance Neto"], # ¡CAMBIO CLAVE AQUÍ: 'Egresos'
-        "Monto": [ingresos_totales, egresos_totales, balance_neto]
-    })
-    st.plotly_chart(px.bar(df_bar, x="Categoría", y="Monto", color="Categoría",
-                           template="plotly_white", title="Distribución por tipo"),
-                    use_container_width=True)
+    st.plotly_chart(fig_bar, use_container_width=True)
 
 
     st.divider()
     st.markdown("### 📑 Desglose por tipo y categoría")
 
-    if not transacciones_df.empty and "Categoría" in transacciones_df.columns:
-        resumen_tipo_categoria = (
-            transacciones_df
-            .groupby(["Tipo", "Categoría"])["Monto"]
-            .sum()
-            .reset_index()
-            .sort_values(by="Monto", ascending=False)
-        )
-
+    resumen_tipo_categoria, fig_tc = memoizar(
+        "dashboard:desglose", [DIARIO_TRANSACCIONES], lambda: _desglose(desde), desde)
+    if not resumen_tipo_categoria.empty:
         # 📋 Mostrar tabla
         st.dataframe(resumen_tipo_categoria, use_container_width=True)
-
         # 📊 Gráfico de barras
-        fig_tc = px.bar(
-            resumen_tipo_categoria,
-            x="Monto",
-            y="Categoría",
-            color="Tipo",
-            barmode="group",
-            title="Importe por categoría y tipo",
-            template="plotly_white",
-            text_auto=".2s",
-            orientation="h"
-        )
         st.plotly_chart(fig_tc, use_container_width=True)
     else:
         st.info("No hay datos de transacciones para mostrar el desglose por categoría.")
@@ -121,34 +149,24 @@ def render():
         st.metric("Productos activos", len(productos_df))
     with col5:
         st.write("#### Flujo de ventas por día")
-        if not ventas_df.empty and "Fecha" in ventas_df.columns:
-            # Convertir la columna Fecha a datetime para asegurar un orden correcto
-            ventas_df['Fecha'] = pd.to_datetime(ventas_df['Fecha'])
-            flujo = ventas_df.groupby("Fecha")["Total"].sum().reset_index()
-            # Ordenar por fecha para el gráfico de línea
-            flujo = flujo.sort_values(by="Fecha")
-            st.plotly_chart(px.line(flujo, x="Fecha", y="Total", markers=True,
-                                    template="plotly_white", title="Ingresos diarios por ventas"),
-                            use_container_width=True)
+        fig_flujo = memoizar("dashboard:flujo", [DIARIO_VENTAS], lambda: _flujo(desde), desde)
+        if fig_flujo is not None:
+            st.plotly_chart(fig_flujo, use_container_width=True)
         else:
             st.info("No hay ventas registradas aún para mostrar el flujo diario.")
 
     st.divider()
     st.markdown("### 📊 Análisis por cliente y producto")
     if not ventas_df.empty:
-        resumen_clientes = ventas_df.groupby("Cliente")["Total"].sum().reset_index().sort_values(by="Total", ascending=False)
+        resumen_clientes, fig_clientes, resumen_productos, fig_productos = memoizar(
+            "dashboard:clientes_productos", ["ventas"], lambda: _clientes_y_productos(ventas_df))
         st.subheader("💼 Ventas por cliente")
         st.dataframe(resumen_clientes, use_container_width=True)
-        st.plotly_chart(px.bar(resumen_clientes, x="Cliente", y="Total",
-                               title="Ingresos por cliente", template="plotly_white"),
-                        use_container_width=True)
+        st.plotly_chart(fig_clientes, use_container_width=True)
 
-        resumen_productos = ventas_df.groupby("Producto")["Cantidad"].sum().reset_index().sort_values(by="Cantidad", ascending=False)
         st.subheader("📦 Productos más vendidos (por cantidad)")
         st.dataframe(resumen_productos, use_container_width=True)
-        st.plotly_chart(px.bar(resumen_productos, x="Producto", y="Cantidad",
-                               title="Ranking de productos", template="plotly_white"),
-                        use_container_width=True)
+        st.plotly_chart(fig_productos, use_container_width=True)
     else:
         st.info("No hay datos de ventas para mostrar análisis por cliente y producto.")
         resumen_clientes = pd.DataFrame()
@@ -157,13 +175,11 @@ def render():
     if "Costo Unitario" in productos_df.columns and "Precio Unitario" in productos_df.columns:
         st.divider()
         st.subheader("📊 Margen por producto (Unitario)")
-        margen_df = productos_df[["Nombre", "Precio Unitario", "Costo Unitario"]].copy()
-        margen_df["Margen Unitario"] = margen_df["Precio Unitario"] - margen_df["Costo Unitario"]
+        margen_df = memoizar("dashboard:margen", ["productos"], lambda: _margen(productos_df))
         st.dataframe(margen_df.sort_values(by="Margen Unitario", ascending=False), use_container_width=True)
     else:
         st.info("No hay datos completos de costo unitario o precio unitario para calcular el margen.")
         margen_df = pd.DataFrame()
-
     st.divider()
     st.subheader("📤 Exportar resumen")
 
@@ -174,22 +190,20 @@ def render():
         "Margen por Producto": margen_df
     }
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        for nombre, df in resumen_para_exportar.items():
-            if not df.empty:
-                # Asegurarse de que el nombre de la hoja no exceda 31 caracteres
-                sheet_name = nombre.replace(" ", "_")[:31]
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-    output.seek(0)
-
+    # El libro se arma solo al pedir la descarga (utils/exportar.py)
+    hojas = {nombre.replace(" ", "_"): df for nombre, df in resumen_para_exportar.items() if not df.empty}
     fecha_actual = datetime.date.today().isoformat()
-    st.download_button(
-        label="📥 Descargar resumen Excel",
-        data=output,
-        file_name=f"resumen_financiero_{fecha_actual}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    botones_descarga("📥 Descargar resumen", hojas, f"resumen_financiero_{fecha_actual}",
+                     [DIARIO_TRANSACCIONES, "ventas", "productos"], desde)
+
+    with st.expander("🔧 Mantenimiento"):
+        st.caption("Veces que cada cálculo del panel se reutilizó o se recalculó en este proceso.")
+        st.dataframe(pd.DataFrame(estadisticas_memo()["calculos"]).T, use_container_width=True)
+        st.caption("Segundos de la última carga de cada colección.")
+        st.dataframe(pd.Series(tiempos_carga(), name="Segundos"), use_container_width=True)
+        if divergencias():
+            st.caption("Copias en caché que no coincidieron con la base después de una escritura.")
+            st.dataframe(pd.Series(divergencias(), name="Veces"), use_container_width=True)
 
     # 🎨 Estilo visual
     st.markdown("""
@@ -1,5 +1,4 @@
 import streamlit as st
-import io
 import pandas as pd
 import datetime
 from utils.db import (
@@ -7,17 +6,16 @@ from utils.db import (
     leer_productos,
     actualizar_producto_por_clave,
     eliminar_producto_por_clave,
-    guardar_transaccion
+    guardar_transaccion,
+    migrar_productos_a_clave,
+    filtrar_por_busqueda,
+    fila_por,
+    LIMITE_BUSQUEDA,
+    registrar_entrada_inventario,
+    DocumentoExistente,
 )
+from utils.exportar import botones_descarga
 
-# Helper function to convert DataFrame to Excel
-def to_excel(df):
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Productos')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
 
 def render():
     st.title("📦 Gestión de Productos")
@@ -82,46 +80,45 @@ def render():
                     "Categoría": categoria, "Precio Unitario": precio,
                     "Costo Unitario": costo, "Cantidad": cantidad, "Descripción": descripcion
                 }
-                guardar_producto(nuevo_producto)
-                st.session_state.productos = pd.DataFrame(leer_productos())
-                st.success("✅ Producto guardado en Firestore y agregado al catálogo")
-                if costo * cantidad > 0:
-                    transaccion_costo = {
-                        "Fecha": datetime.date.today().isoformat(),
-                        "Descripción": f"Compra inicial de inventario: {nombre} ({cantidad} unidades)",
-                        "Categoría": "Compras", "Tipo": "Egreso",
-                        "Monto": float(costo * cantidad),
-                        "Cliente": "N/A", "Método de pago": "N/A"
-                    }
-                    guardar_transaccion(transaccion_costo)
-                    st.info(f"🛒 Costo de ${costo * cantidad:.2f} registrado como egreso en contabilidad.")
-                st.rerun()
+                try:
+                    guardar_producto(nuevo_producto)
+                except DocumentoExistente:
+                    # Otra sesión la dio de alta después de que se leyó el catálogo
+                    st.error(f"❌ Ya existe un producto con la clave '{clave}'; no se modificó.")
+                else:
+                    st.success("✅ Producto guardado en Firestore y agregado al catálogo")
+                    if costo * cantidad > 0:
+                        transaccion_costo = {
+                            "Fecha": datetime.date.today().isoformat(),
+                            "Descripción": f"Compra inicial de inventario: {nombre} ({cantidad} unidades)",
+                            "Categoría": "Compras", "Tipo": "Egreso",
+                            "Monto": float(costo * cantidad),
+                            "Cliente": "N/A", "Método de pago": "N/A"
+                        }
+                        guardar_transaccion(transaccion_costo)
+                        st.info(f"🛒 Costo de ${costo * cantidad:.2f} registrado como egreso en contabilidad.")
+                    st.rerun()
 
     st.divider()
     st.subheader("📋 Inventario / Catálogo")
-    filtro = st.text_input("Buscar por clave o nombre", key="filtro_inventario")
-    if filtro:
-        df_filtrado = st.session_state.productos[
-            st.session_state.productos["Clave"].str.contains(filtro, case=False, na=False) |
-            st.session_state.productos["Nombre"].str.contains(filtro, case=False, na=False)
-        ]
+    filtro = st.text_input("Buscar por clave, nombre, marca, modelo, color o talla", key="filtro_inventario")
+    if filtro.strip():
+        # Índice de búsqueda en memoria en lugar de recorrer el catálogo (ver utils/busqueda.py);
+        # se muestran a lo más LIMITE_BUSQUEDA coincidencias y la descarga lleva todas
+        df_filtrado = filtrar_por_busqueda("productos", st.session_state.productos, filtro, LIMITE_BUSQUEDA + 1)
+        if len(df_filtrado) > LIMITE_BUSQUEDA:
+            st.caption(f"Se muestran las primeras {LIMITE_BUSQUEDA} coincidencias; afina la búsqueda o descárgalas todas.")
+            df_filtrado = df_filtrado.iloc[:LIMITE_BUSQUEDA]
         st.dataframe(df_filtrado, use_container_width=True)
         if not df_filtrado.empty:
-            st.download_button(
-                label="Descargar catálogo filtrado a Excel",
-                data=to_excel(df_filtrado),
-                file_name="catalogo_productos_filtrado.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            botones_descarga("Descargar catálogo filtrado",
+                             lambda: {"Productos": filtrar_por_busqueda("productos", leer_productos(), filtro)},
+                             "catalogo_productos_filtrado", ["productos"], filtro)
     else:
         st.dataframe(st.session_state.productos, use_container_width=True)
         if not st.session_state.productos.empty:
-            st.download_button(
-                label="Descargar catálogo completo a Excel",
-                data=to_excel(st.session_state.productos),
-                file_name="catalogo_productos_completo.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            botones_descarga("Descargar catálogo completo", {"Productos": st.session_state.productos},
+                             "catalogo_productos_completo", ["productos"])
 
     st.divider()
     st.subheader("➕ Dar entrada a productos existentes (Reabastecimiento)")
@@ -130,9 +127,7 @@ def render():
         with st.form("form_entrada_existente"):
             producto_a_reabastecer = st.selectbox("Selecciona producto a reabastecer", claves_existentes,
                                                   key="select_reabastecer")
-            datos_producto_reabastecer = st.session_state.productos[
-                st.session_state.productos["Clave"] == producto_a_reabastecer
-            ].iloc[0]
+            datos_producto_reabastecer = fila_por("productos", "Clave", producto_a_reabastecer)
 
             st.write(
                 f"Producto seleccionado: **{datos_producto_reabastecer['Nombre']}** "
@@ -146,27 +141,19 @@ def render():
             submitted_entrada = st.form_submit_button("Registrar entrada")
 
             if submitted_entrada:
-                nueva_cantidad_total = int(datos_producto_reabastecer["Cantidad"]) + cantidad_entrada
-                actualizar_producto_por_clave(producto_a_reabastecer, {
-                    "Cantidad": nueva_cantidad_total,
-                    "Costo Unitario": costo_unitario_entrada
-                })
-                idx = st.session_state.productos.index[
-                    st.session_state.productos["Clave"] == producto_a_reabastecer
-                ][0]
-                st.session_state.productos.at[idx, "Cantidad"] = nueva_cantidad_total
-                st.session_state.productos.at[idx, "Costo Unitario"] = costo_unitario_entrada
-                st.success(
-                    f"✅ Se añadieron {cantidad_entrada} unidades. Nuevo stock: {nueva_cantidad_total}"
-                )
                 costo_total_entrada = float(costo_unitario_entrada * cantidad_entrada)
+                transaccion_costo = None
                 if costo_total_entrada > 0:
-                    guardar_transaccion({
+                    transaccion_costo = {
                         "Fecha": datetime.date.today().isoformat(),
                         "Descripción": f"Reabastecimiento de inventario: {datos_producto_reabastecer['Nombre']} ({cantidad_entrada} unidades)",
                         "Categoría": "Compras", "Tipo": "Egreso",
                         "Monto": costo_total_entrada, "Cliente": "N/A", "Método de pago": "N/A"
-                    })
+                    }
+                # Incremento atómico en la base: no pisa ventas ni entradas simultáneas del producto
+                registrar_entrada_inventario(
+                    producto_a_reabastecer, cantidad_entrada, costo_unitario_entrada, transaccion_costo)
+                st.success(f"✅ Se añadieron {cantidad_entrada} unidades.")
                 st.rerun()
     else:
         st.info("No hay productos registrados para reabastecer.")
@@ -176,9 +163,7 @@ def render():
     if not st.session_state.productos.empty:
         claves_disponibles_editar = st.session_state.productos["Clave"].dropna().unique().tolist()
         seleccionado_editar = st.selectbox("Selecciona un producto para editar", claves_disponibles_editar)
-        datos_editar = st.session_state.productos[
-            st.session_state.productos["Clave"] == seleccionado_editar
-        ].iloc[0]
+        datos_editar = fila_por("productos", "Clave", seleccionado_editar)
 
         nuevo_nombre = st.text_input("Nuevo nombre", value=datos_editar.get("Nombre", ""))
         nuevo_marca = st.text_input("Marca_Tipo", value=datos_editar.get("Marca-Tipo", ""))
@@ -196,9 +181,7 @@ def render():
                 "Precio Unitario": nuevo_precio, "Costo Unitario": nuevo_costo,
                 "Descripción": nueva_descripcion
             })
-            idx = st.session_state.productos.index[
-                st.session_state.productos["Clave"] == seleccionado_editar
-            ][0]
+            idx = datos_editar.name
             st.session_state.productos.at[idx, "Nombre"] = nuevo_nombre
             st.session_state.productos.at[idx, "Marca_Tipo"] = nuevo_marca
             st.session_state.productos.at[idx, "Modelo"] = nuevo_modelo
@@ -219,3 +202,13 @@ def render():
             st.rerun()
     else:
         st.info("No hay productos para editar o eliminar.")
+
+    st.divider()
+    with st.expander("🔧 Mantenimiento"):
+        st.caption(
+            "Los productos creados antes de usar la clave como identificador requieren una consulta "
+            "extra en cada cambio de inventario. Esta migración se ejecuta una sola vez."
+        )
+        if st.button("Migrar productos a identificador por clave"):
+            movidos = migrar_productos_a_clave()
+            st.success(f"✅ {movidos} productos migrados.")
@@ -1,67 +1,63 @@
 import streamlit as st
-from io import BytesIO
 import pandas as pd
 import plotly.express as px
-from utils.db import guardar_venta, leer_ventas, leer_transacciones, guardar_transaccion, leer_clientes, leer_productos, \
-    actualizar_producto_por_clave
+from utils.db import (
+    registrar_venta, leer_ventas, leer_productos,
+    leer_ventas_cliente, leer_transacciones_cliente, saldo_cliente, cargar_colecciones, COLUMNAS,
+    filtrar_por_busqueda, fila_por, ValorInsuficiente, LIMITE_BUSQUEDA,
+)
+from utils.exportar import botones_descarga, exportar_historial
+from utils.resumenes import DIARIO_VENTAS
+from utils.tablas import tabla_paginada
 
 
-# Helper function to convert DataFrame to Excel
-def to_excel(df):
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Ventas')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
-
 def render():
     st.title("💸 Ventas")
 
-    # --- Definir columnas numéricas al principio para asegurar su disponibilidad ---
-    numeric_cols_ventas = ["Cantidad", "Precio Unitario", "Total", "Monto Crédito", "Monto Contado",
-                           "Anticipo Aplicado"]
+    # Cargar el resumen diario de ventas (fechas del histórico y gráfica) y, si faltan
+    # en sesión, clientes y productos, todo a la vez; los saldos del cliente salen del
+    # resumen materializado y la tabla del histórico lee solo su página.
+    # Mantenemos esto fuera del if submitted para que la UI siempre muestre datos frescos
+    faltantes = [
+        nombre for nombre in ("clientes", "productos")
+        if nombre not in st.session_state or st.session_state[nombre].empty
+    ]
+    datos = cargar_colecciones(DIARIO_VENTAS, *faltantes)
+    resumen_ventas = datos.pop(DIARIO_VENTAS)
+    for nombre, df in datos.items():
+        st.session_state[nombre] = df
 
     # Validar clientes y productos cargados en sesión
-    if "clientes" not in st.session_state or st.session_state.clientes.empty:
-        st.session_state.clientes = leer_clientes()
-        if st.session_state.clientes.empty:
-            st.warning("⚠️ No hay clientes registrados. Agrega alguno en 'Clientes'.")
-            st.stop()
-
-    if "productos" not in st.session_state or st.session_state.productos.empty:
-        st.session_state.productos = leer_productos()
-        if st.session_state.productos.empty:
-            st.warning("⚠️ No hay productos registrados. Agrega uno en 'Productos'.")
-            st.stop()
-
-    # Cargar ventas y transacciones si no están o recargarlas para asegurar tipos de datos
-    # Mantenemos esto fuera del if submitted para que la UI siempre muestre datos frescos
-    st.session_state.ventas = leer_ventas()
-    for col in numeric_cols_ventas:
-        if col in st.session_state.ventas.columns:
-            st.session_state.ventas[col] = pd.to_numeric(st.session_state.ventas[col], errors='coerce').fillna(0.0)
+    if st.session_state.clientes.empty:
+        st.warning("⚠️ No hay clientes registrados. Agrega alguno en 'Clientes'.")
+        st.stop()
 
-    st.session_state.transacciones_data = leer_transacciones()
-    if "Monto" in st.session_state.transacciones_data.columns:
-        st.session_state.transacciones_data["Monto"] = pd.to_numeric(st.session_state.transacciones_data["Monto"],
-                                                                     errors='coerce').fillna(0.0)
+    if st.session_state.productos.empty:
+        st.warning("⚠️ No hay productos registrados. Agrega uno en 'Productos'.")
+        st.stop()
 
     st.subheader("Registrar nueva venta")
 
     # --- CAMPOS QUE DEBEN ACTUALIZARSE AL CAMBIAR SU VALOR (FUERA DEL FORM) ---
     fecha = st.date_input("Fecha", key="venta_fecha")
-    cliente = st.selectbox("Cliente", st.session_state.clientes["Nombre"].tolist(), key="venta_cliente")
+    consulta_cliente = st.text_input("Buscar cliente", placeholder="Nombre, empresa, RFC o correo",
+                                     key="venta_buscar_cliente")
+    clientes_encontrados = filtrar_por_busqueda("clientes", st.session_state.clientes, consulta_cliente, LIMITE_BUSQUEDA)
+    if clientes_encontrados.empty:
+        st.caption("Sin coincidencias; se muestran todos los clientes.")
+        clientes_encontrados = st.session_state.clientes
+    cliente = st.selectbox("Cliente", clientes_encontrados["Nombre"].tolist(), key="venta_cliente")
 
     # --- CAMBIOS AQUÍ para mostrar la existencia ---
     producto = st.selectbox("Producto/Servicio", st.session_state.productos["Nombre"].tolist(), key="venta_producto")
 
     existencia_actual = 0
-    producto_info_selected = pd.DataFrame()  # Inicializar como DataFrame vacío
+    producto_info_selected = None
     if producto and not st.session_state.productos.empty:
-        producto_info_selected = st.session_state.productos[st.session_state.productos["Nombre"] == producto]
-        if not producto_info_selected.empty and "Cantidad" in producto_info_selected.columns:
-            existencia_actual = int(producto_info_selected["Cantidad"].values[0])
+        # Búsqueda por clave en lugar de una máscara sobre el catálogo (ver fila_por en utils/db.py)
+        producto_info_selected = fila_por("productos", "Nombre", producto)
+        if producto_info_selected is not None:
+            existencia_actual = int(producto_info_selected["Cantidad"])
         st.info(f"📦 Existencia actual: **{existencia_actual}** unidades.")
     # --- FIN CAMBIOS para mostrar la existencia ---
 
@@ -75,8 +71,8 @@ def render():
 
     # Calcular precio y total EN TIEMPO REAL (para la UI antes del submit)
     precio = 0.0
-    if not producto_info_selected.empty and "Precio Unitario" in producto_info_selected.columns:
-        precio_from_df = producto_info_selected["Precio Unitario"].values[0]
+    if producto_info_selected is not None:
+        precio_from_df = producto_info_selected["Precio Unitario"]
         precio = float(precio_from_df) if pd.notna(precio_from_df) else 0.0
     total_ui_display_original = cantidad * precio  # Use a different variable name for clarity
 
@@ -101,19 +97,9 @@ def render():
     st.markdown(f"**Importe neto (después de descuento):** ${importe_neto:.2f}")
 
     # --- Lógica y UI para Anticipos Disponibles (VISIBLES) ---
-    anticipos_cliente_total = st.session_state.transacciones_data[
-        (st.session_state.transacciones_data["Categoría"] == "Anticipo Cliente") &
-        (st.session_state.transacciones_data["Cliente"] == cliente) &
-        (st.session_state.transacciones_data["Tipo"] == "Ingreso")
-        ]["Monto"].sum()
-
-    anticipos_aplicados_total = st.session_state.transacciones_data[
-        (st.session_state.transacciones_data["Categoría"] == "Anticipo Aplicado") &
-        (st.session_state.transacciones_data["Cliente"] == cliente) &
-        (st.session_state.transacciones_data["Tipo"] == "Gasto")  # Asegúrate que esto sea consistente con tu db.py
-        ]["Monto"].sum()
-
-    saldo_anticipos = float(anticipos_cliente_total) - float(anticipos_aplicados_total)
+    # Saldos del cliente desde el resumen materializado (ver utils/saldos.py)
+    saldos_cliente = saldo_cliente(cliente)
+    saldo_anticipos = float(saldos_cliente["Saldo Anticipos"])
 
     # Initialize or retrieve application amount for this sale
     # This key ensures that the value persists across reruns but can be reset by the user.
@@ -150,7 +136,7 @@ def render():
 
     # --- INICIO DEL FORMULARIO PRINCIPAL DE VENTA ---
     with st.form("form_ventas"):
-        cliente_info = st.session_state.clientes[st.session_state.clientes["Nombre"] == cliente].iloc[0]
+        cliente_info = fila_por("clientes", "Nombre", cliente)
         limite_credito_raw = cliente_info.get("Límite de crédito", 0.0)
         try:
             limite_credito = float(limite_credito_raw) if pd.notna(limite_credito_raw) else 0.0
@@ -158,24 +144,7 @@ def render():
             st.warning("⚠️ El límite de crédito del cliente no es válido. Se asignará 0.")
             limite_credito = 0.0
 
-        # Filtrar pagos de cobranza para el cliente (para crédito)
-        pagos = st.session_state.transacciones_data[  # Usar session_state.transacciones_data
-            (st.session_state.transacciones_data["Categoría"] == "Cobranza") & (
-                    st.session_state.transacciones_data["Cliente"] == cliente)
-            ]
-        pagos_realizados = pagos["Monto"].sum() if not pagos.empty else 0.0
-        pagos_realizados = float(pagos_realizados)
-
-        ventas_cliente = st.session_state.ventas[st.session_state.ventas["Cliente"] == cliente]
-
-        total_credito_otorgado = 0.0
-        if "Tipo de venta" in ventas_cliente.columns and "Monto Crédito" in ventas_cliente.columns:
-            credito_otorgado_series = ventas_cliente[
-                ventas_cliente["Tipo de venta"].isin(["Crédito", "Mixta"])
-            ]["Monto Crédito"]
-            total_credito_otorgado = float(credito_otorgado_series.sum()) if not credito_otorgado_series.empty else 0.0
-
-        credito_usado = float(total_credito_otorgado) - float(pagos_realizados)
+        credito_usado = float(saldos_cliente["Saldo Pendiente"])
         credito_disponible = float(limite_credito) - float(credito_usado)
 
         st.markdown(f"💳 **Crédito autorizado:** ${limite_credito:.2f}")
@@ -196,19 +165,10 @@ def render():
         submitted = st.form_submit_button("Registrar venta")
 
         if submitted:
-            # --- RECARGAR DATOS FRESCOS JUSTO ANTES DE PROCESAR ---
-            st.session_state.ventas = leer_ventas()
-            for col in numeric_cols_ventas:
-                if col in st.session_state.ventas.columns:
-                    st.session_state.ventas[col] = pd.to_numeric(st.session_state.ventas[col], errors='coerce').fillna(
-                        0.0)
-
-            st.session_state.transacciones_data = leer_transacciones()
-            if "Monto" in st.session_state.transacciones_data.columns:
-                st.session_state.transacciones_data["Monto"] = pd.to_numeric(
-                    st.session_state.transacciones_data["Monto"],
-                    errors='coerce').fillna(0.0)
-            st.session_state.productos = leer_productos()  # Recargar productos para existencia y precio
+            # --- DATOS AL MOMENTO DE PROCESAR ---
+            # Ventas y pagos se consultan solo para el cliente de la venta (ver más abajo).
+            # La existencia no se recarga: registrar_venta la descuenta en la base
+            # sin dejarla bajo cero, aunque otra caja venda el mismo producto.
 
             # --- OBTENER VALORES ACTUALES DE LOS INPUTS DEL FORMULARIO ---
             submitted_fecha = fecha
@@ -219,16 +179,13 @@ def render():
             submitted_metodo_pago = metodo_pago
 
             # --- RECALCULAR PRECIO Y EXISTENCIA AL MOMENTO DEL SUBMIT CON DATOS FRESCOS ---
-            current_producto_info = st.session_state.productos[
-                st.session_state.productos["Nombre"] == submitted_producto]
+            current_producto_info = fila_por("productos", "Nombre", submitted_producto)
 
             current_existencia = 0
-            if not current_producto_info.empty and "Cantidad" in current_producto_info.columns:
-                current_existencia = int(current_producto_info["Cantidad"].values[0])
-
             submitted_precio = 0.0
-            if not current_producto_info.empty and "Precio Unitario" in current_producto_info.columns:
-                submitted_precio = float(current_producto_info["Precio Unitario"].values[0])
+            if current_producto_info is not None:
+                current_existencia = int(current_producto_info["Cantidad"])
+                submitted_precio = float(current_producto_info["Precio Unitario"])
 
             # --- RECALCULAR TOTALES Y COMPONENTES CON LOS VALORES DEL SUBMIT ---
             submitted_total_original = submitted_cantidad * submitted_precio
@@ -251,24 +208,15 @@ def render():
             anticipo_final_aplicado = max(0.0, anticipo_final_aplicado)
 
             # --- RECALCULAR CRÉDITO DISPONIBLE AL MOMENTO DEL SUBMIT CON DATOS FRESCOS ---
-            current_cliente_info = \
-                st.session_state.clientes[st.session_state.clientes["Nombre"] == submitted_cliente].iloc[0]
+            current_cliente_info = fila_por("clientes", "Nombre", submitted_cliente)
             current_limite_credito = float(current_cliente_info.get("Límite de crédito", 0.0))
 
-            current_pagos = st.session_state.transacciones_data[
-                (st.session_state.transacciones_data["Categoría"] == "Cobranza") & (
-                        st.session_state.transacciones_data["Cliente"] == submitted_cliente)
-                ]
+            current_pagos = leer_transacciones_cliente(submitted_cliente, ["Cobranza"])
             current_pagos_realizados = current_pagos["Monto"].sum() if not current_pagos.empty else 0.0
 
-            current_ventas_cliente = st.session_state.ventas[st.session_state.ventas["Cliente"] == submitted_cliente]
-            current_total_credito_otorgado = 0.0
-            if "Tipo de venta" in current_ventas_cliente.columns and "Monto Crédito" in current_ventas_cliente.columns:
-                current_credito_otorgado_series = current_ventas_cliente[
-                    current_ventas_cliente["Tipo de venta"].isin(["Crédito", "Mixta"])
-                ]["Monto Crédito"]
-                current_total_credito_otorgado = float(
-                    current_credito_otorgado_series.sum()) if not current_credito_otorgado_series.empty else 0.0
+            current_ventas_cliente = leer_ventas_cliente(submitted_cliente, ["Crédito", "Mixta"])
+            current_total_credito_otorgado = float(
+                current_ventas_cliente["Monto Crédito"].sum()) if not current_ventas_cliente.empty else 0.0
 
             current_credito_usado = float(current_total_credito_otorgado) - float(current_pagos_realizados)
             current_credito_disponible = float(current_limite_credito) - float(current_credito_usado)
@@ -347,10 +295,9 @@ def render():
                     ),
                     "Tipo de venta": tipo_venta
                 }
-                guardar_venta(venta_dict)
-
+                transacciones_venta = []
                 if submitted_monto_contado > 0:
-                    guardar_transaccion({
+                    transacciones_venta.append({
                         "Fecha": submitted_fecha.isoformat(),
                         "Descripción": f"Pago de contado por venta a {submitted_cliente}",
                         "Categoría": "Ventas",
@@ -361,7 +308,7 @@ def render():
                     })
 
                 if anticipo_final_aplicado > 0:
-                    guardar_transaccion({
+                    transacciones_venta.append({
                         "Fecha": submitted_fecha.isoformat(),
                         "Descripción": f"Anticipo aplicado a venta de {submitted_cliente}",
                         "Categoría": "Anticipo Aplicado",
@@ -371,23 +318,24 @@ def render():
                         "Método de pago": "Anticipo"
                     })
 
-                # --- DESCONTAR CANTIDAD DEL INVENTARIO ---
-                producto_clave = st.session_state.productos.loc[
-                    st.session_state.productos["Nombre"] == submitted_producto, "Clave"].iloc[0]
-                nueva_cantidad_inventario = current_existencia - submitted_cantidad
-                actualizar_producto_por_clave(producto_clave, {"Cantidad": nueva_cantidad_inventario})
-                # --- FIN DESCUENTO INVENTARIO ---
+                # --- GUARDAR VENTA, MOVIMIENTOS Y DESCUENTO DE INVENTARIO EN UN SOLO LOTE ---
+                try:
+                    registrar_venta(venta_dict, transacciones_venta, current_producto_info["Clave"], submitted_cantidad)
+                except ValorInsuficiente as error:
+                    st.error(
+                        f"❌ No hay suficiente existencia de {submitted_producto}. "
+                        f"Solo quedan {int(error.actual)} unidades.")
+                else:
+                    # --- FIN REGISTRO ---
 
-                # Update session state after successful operation
-                st.session_state.ventas = leer_ventas()
-                st.session_state.transacciones_data = leer_transacciones()
-                st.session_state.productos = leer_productos()
+                    # Update session state after successful operation (the write already patched the cached frame)
+                    st.session_state.productos = leer_productos()
 
-                # Crucial for the next sale: Reset the anticipo input to 0 after a successful sale
-                st.session_state["input_anticipo_visible"] = 0.0
+                    # Crucial for the next sale: Reset the anticipo input to 0 after a successful sale
+                    st.session_state["input_anticipo_visible"] = 0.0
 
-                st.success("✅ Venta registrada correctamente")
-                st.rerun()
+                    st.success("✅ Venta registrada correctamente")
+                    st.rerun()
 
     st.divider()
     st.subheader("📋 Histórico de ventas")
@@ -395,36 +343,31 @@ def render():
     # --- Date Range Selection for Export ---
     col1, col2 = st.columns(2)
     with col1:
-        start_date = st.date_input("Fecha de inicio", value=pd.to_datetime(st.session_state.ventas["Fecha"]).min() if not st.session_state.ventas.empty else None)
+        start_date = st.date_input("Fecha de inicio", value=resumen_ventas["Fecha"].min() if not resumen_ventas.empty else None)
     with col2:
-        end_date = st.date_input("Fecha de fin", value=pd.to_datetime(st.session_state.ventas["Fecha"]).max() if not st.session_state.ventas.empty else None)
-
-    filtered_ventas_df = st.session_state.ventas.copy()
+        end_date = st.date_input("Fecha de fin", value=resumen_ventas["Fecha"].max() if not resumen_ventas.empty else None)
 
-    if not filtered_ventas_df.empty:
-        filtered_ventas_df["Fecha"] = pd.to_datetime(filtered_ventas_df["Fecha"])
-        if start_date:
-            filtered_ventas_df = filtered_ventas_df[filtered_ventas_df["Fecha"] >= pd.to_datetime(start_date)]
-        if end_date:
-            filtered_ventas_df = filtered_ventas_df[filtered_ventas_df["Fecha"] <= pd.to_datetime(end_date)]
-
-    st.dataframe(filtered_ventas_df, use_container_width=True)
+    # Solo se lee y se envía la página visible del rango (ver utils/tablas.py)
+    pagina_ventas = tabla_paginada(
+        "ventas", "tabla_ventas", COLUMNAS["ventas"], ["Fecha"],
+        filtrables={"Cliente": st.session_state.clientes["Nombre"].tolist()},
+        desde=start_date, hasta=end_date,
+    )
 
-    if not filtered_ventas_df.empty:
-        st.download_button(
-            label="Descargar histórico de ventas a Excel",
-            data=to_excel(filtered_ventas_df),
-            file_name="historico_ventas.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    if not pagina_ventas.empty:
+        # El rango completo se lee solo al pedir la descarga
+        botones_descarga("Descargar histórico de ventas",
+                         lambda: {"Ventas": leer_ventas(desde=start_date, hasta=end_date)}, "historico_ventas",
+                         ["ventas"], start_date, end_date, formatos=("xlsx", "csv", "parquet"))
     else:
         st.info("No hay datos de ventas para el rango de fechas seleccionado o en general.")
 
+    with st.expander("📦 Exportar todas las ventas"):
+        st.caption("Lee el historial completo por páginas y lo escribe directo al archivo, sin cargarlo en pantalla.")
+        exportar_historial("ventas", "historial de ventas", "ventas_completo")
 
-    if not st.session_state.ventas.empty:
+    if not resumen_ventas.empty:
         st.subheader("📊 Ingresos diarios")
-        df_daily = st.session_state.ventas.copy()
-        df_daily["Total"] = pd.to_numeric(df_daily["Total"], errors='coerce').fillna(0.0)
-        df_daily = df_daily.groupby("Fecha")["Total"].sum().reset_index()
-        fig = px.bar(df_daily, x="Fecha", y="Total", title="Ventas por día", template="plotly_white")
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        # El resumen ya trae una fila por día
+        fig = px.bar(resumen_ventas, x="Fecha", y="Total", title="Ventas por día", template="plotly_white")
+        st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,647 @@
+import datetime
+import json
+import os
+import sqlite3
+import string
+import threading
+import uuid
+
+from firebase_admin import firestore
+from google.api_core import exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Cada escritura sella el documento para poder pedir solo lo que cambió
+CAMPO_ACTUALIZADO = "_actualizado"
+
+# Caracteres de los ids automáticos de Firestore, en su orden de comparación
+ALFABETO_IDS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+# Copia tipada de "Fecha" (medianoche UTC) para consultar por rango de fechas;
+# "Fecha" se guarda como texto ISO y no sirve para comparar con Timestamps
+CAMPO_FECHA_DIA = "FechaDia"
+
+
+def fecha_dia(valor):
+    """Convierte date, datetime o texto ISO al datetime de su día en UTC (o None)."""
+    if isinstance(valor, str):
+        try:
+            valor = datetime.date.fromisoformat(valor[:10])
+        except ValueError:
+            return None
+    if isinstance(valor, datetime.datetime):
+        valor = valor.date()
+    if not isinstance(valor, datetime.date):
+        return None
+    return datetime.datetime(valor.year, valor.month, valor.day, tzinfo=datetime.timezone.utc)
+
+
+class DocumentoExistente(ValueError):
+    """crear() encontró el documento ya escrito (otra sesión lo dio de alta antes)."""
+
+    def __init__(self, coleccion, doc_id):
+        super().__init__(f"Ya existe el documento {coleccion}/{doc_id}")
+        self.coleccion = coleccion
+        self.doc_id = doc_id
+
+
+class ValorInsuficiente(ValueError):
+    """Un incremento con mínimo dejaría el campo por debajo de ese mínimo
+    (por ejemplo, vender más existencia de la que hay). No se aplicó nada del lote."""
+
+    def __init__(self, coleccion, doc_id, campo, actual, delta):
+        super().__init__(f"{coleccion}/{doc_id}: {campo} es {actual} y no admite un cambio de {delta}")
+        self.coleccion = coleccion
+        self.doc_id = doc_id
+        self.campo = campo
+        self.actual = actual
+        self.delta = delta
+
+
+def _con_minimo(operacion):
+    tipo, _, *resto = operacion
+    return tipo == "incrementar" and len(resto) > 2
+
+
+def _sumar(actuales, deltas):
+    return {campo: (actuales.get(campo) or 0) + delta for campo, delta in deltas.items()}
+
+
+def _revisar_minimos(coleccion, doc_id, actuales, deltas, minimos):
+    if actuales is None:
+        raise KeyError(f"No existe el documento {coleccion}/{doc_id}")
+    for campo, minimo in minimos.items():
+        actual = actuales.get(campo) or 0
+        if actual + deltas.get(campo, 0) < minimo:
+            raise ValorInsuficiente(coleccion, doc_id, campo, actual, deltas.get(campo, 0))
+
+
+# ---------------------------
+# Interfaz de almacenamiento
+# ---------------------------
+class Backend:
+    """Operaciones que utils/db.py necesita sobre las colecciones de un usuario.
+
+    Las lecturas producen pares (id, datos); con campos=[...] solo se piden
+    esos campos (y el sello). Toda escritura agrega el sello CAMPO_ACTUALIZADO
+    que usa la sincronización incremental.
+    """
+
+    # Distingue las copias locales (instantáneas) de cada almacenamiento
+    identificador = "backend"
+
+    def agregar(self, uid, coleccion, datos):
+        raise NotImplementedError
+
+    def establecer(self, uid, coleccion, doc_id, datos):
+        raise NotImplementedError
+
+    def crear(self, uid, coleccion, doc_id, datos):
+        """Como establecer(), pero lanza DocumentoExistente si el documento ya existe."""
+        raise NotImplementedError
+
+    def actualizar(self, uid, coleccion, doc_id, datos):
+        raise NotImplementedError
+
+    def eliminar(self, uid, coleccion, doc_id):
+        raise NotImplementedError
+
+    def leer_documento(self, uid, coleccion, doc_id):
+        """Datos del documento, o None si no existe."""
+        raise NotImplementedError
+
+    def leer_todo(self, uid, coleccion, campos=None):
+        raise NotImplementedError
+
+    def leer_cambios(self, uid, coleccion, desde, campos=None):
+        raise NotImplementedError
+
+    def leer_rango(self, uid, coleccion, desde=None, hasta=None, campos=None):
+        """Documentos con Fecha entre desde y hasta (días completos, inclusive).
+
+        Un límite en None deja ese lado abierto.
+        """
+        raise NotImplementedError
+
+    def leer_pagina(self, uid, coleccion, despues_de=None, tamano=500, campos=None):
+        """Hasta tamano documentos en orden de id, a partir del siguiente a
+        despues_de (el último id de la página anterior). Regresa una lista;
+        si trae menos de tamano, ya no hay más."""
+        raise NotImplementedError
+
+    def leer_pagina_ordenada(self, uid, coleccion, orden, descendente=False, filtros=(), despues_de=None,
+                             tamano=50, campos=None):
+        """Hasta tamano documentos que cumplen filtros ((campo, operador, valor)),
+        ordenados por orden y, para desempatar, por id en la misma dirección.
+
+        despues_de es (valor de orden, id) del último documento de la página
+        anterior. Los documentos sin el campo orden no aparecen.
+        """
+        raise NotImplementedError
+
+    def contar(self, uid, coleccion, filtros=()):
+        raise NotImplementedError
+
+    def limites_particion(self, uid, coleccion, particiones):
+        """Ids que parten la colección en intervalos para leerlos en paralelo.
+
+        Por defecto reparte el alfabeto de los ids automáticos; los intervalos
+        cubren cualquier id aunque queden desbalanceados con ids propios.
+        """
+        pasos = len(ALFABETO_IDS) / particiones
+        return sorted({ALFABETO_IDS[round(pasos * i)] for i in range(1, particiones)})
+
+    def leer_intervalo(self, uid, coleccion, desde_id=None, hasta_id=None, campos=None):
+        """Documentos con desde_id <= id < hasta_id; None deja ese lado abierto."""
+        raise NotImplementedError
+
+    def buscar(self, uid, coleccion, campo, valor):
+        raise NotImplementedError
+
+    def consultar(self, uid, coleccion, filtros, campos=None):
+        """Documentos que cumplen todos los filtros (campo, "==" o "in", valor)."""
+        raise NotImplementedError
+
+    def ejecutar_lote(self, uid, operaciones):
+        """Aplica todas las operaciones o ninguna, en un solo viaje.
+
+        Cada operación es una tupla:
+            ("agregar", coleccion, datos)
+            ("establecer", coleccion, doc_id, datos)
+            ("actualizar", coleccion, doc_id, datos)
+            ("actualizar", coleccion, doc_id, datos, {campo: delta})
+            ("incrementar", coleccion, doc_id, {campo: delta})
+            ("incrementar", coleccion, doc_id, {campo: delta}, {campo: minimo})
+            ("acumular", coleccion, doc_id, {campo: delta}, {campo: valor})
+            ("eliminar", coleccion, doc_id)
+        Los incrementos de "actualizar" se aplican en la misma escritura que
+        datos. Con mínimos, el incremento se revisa contra el valor guardado en la
+        misma transacción que escribe: si algún campo quedaría por debajo de su
+        mínimo, se lanza ValorInsuficiente y no se aplica ninguna operación.
+        "acumular" es como "incrementar" pero crea el documento si no existe,
+        con los valores fijos del último diccionario.
+        Regresa los ids generados por las operaciones "agregar", en orden.
+        """
+        raise NotImplementedError
+
+    def referencia_en_vivo(self, uid, coleccion):
+        """Referencia con on_snapshot, o None si el backend no lo soporta."""
+        return None
+
+
+# ---------------------------
+# Firestore
+# ---------------------------
+class FirestoreBackend(Backend):
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.identificador = f"firestore-{getattr(cliente, 'project', None) or 'memoria'}"
+
+    def _ref(self, uid, coleccion):
+        return self.cliente.collection("usuarios").document(uid).collection(coleccion)
+
+    @staticmethod
+    def _sellar(datos):
+        sellados = {**datos, CAMPO_ACTUALIZADO: firestore.SERVER_TIMESTAMP}
+        if "Fecha" in datos:
+            sellados[CAMPO_FECHA_DIA] = fecha_dia(datos["Fecha"])
+        return sellados
+
+    def agregar(self, uid, coleccion, datos):
+        _, referencia = self._ref(uid, coleccion).add(self._sellar(datos))
+        return referencia.id
+
+    def establecer(self, uid, coleccion, doc_id, datos):
+        self._ref(uid, coleccion).document(doc_id).set(self._sellar(datos))
+
+    def crear(self, uid, coleccion, doc_id, datos):
+        try:
+            self._ref(uid, coleccion).document(doc_id).create(self._sellar(datos))
+        except exceptions.AlreadyExists as error:
+            raise DocumentoExistente(coleccion, doc_id) from error
+
+    def actualizar(self, uid, coleccion, doc_id, datos):
+        self._ref(uid, coleccion).document(doc_id).update(self._sellar(datos))
+
+    def eliminar(self, uid, coleccion, doc_id):
+        self._ref(uid, coleccion).document(doc_id).delete()
+
+    def leer_documento(self, uid, coleccion, doc_id):
+        snap = self._ref(uid, coleccion).document(doc_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    @staticmethod
+    def _proyectar(consulta, campos):
+        if not campos:
+            return consulta
+        return consulta.select([FieldPath(c).to_api_repr() for c in [*campos, CAMPO_ACTUALIZADO]])
+
+    def leer_todo(self, uid, coleccion, campos=None):
+        consulta = self._proyectar(self._ref(uid, coleccion), campos)
+        return ((doc.id, doc.to_dict()) for doc in consulta.stream())
+
+    def leer_cambios(self, uid, coleccion, desde, campos=None):
+        consulta = self._ref(uid, coleccion).where(CAMPO_ACTUALIZADO, ">=", desde)
+        return ((doc.id, doc.to_dict()) for doc in self._proyectar(consulta, campos).stream())
+
+    def leer_rango(self, uid, coleccion, desde=None, hasta=None, campos=None):
+        # Rango sobre un solo campo: lo cubre el índice automático de Firestore
+        consulta = self._ref(uid, coleccion)
+        if desde is not None:
+            consulta = consulta.where(CAMPO_FECHA_DIA, ">=", fecha_dia(desde))
+        if hasta is not None:
+            consulta = consulta.where(CAMPO_FECHA_DIA, "<", fecha_dia(hasta) + datetime.timedelta(days=1))
+        return ((doc.id, doc.to_dict()) for doc in self._proyectar(consulta, campos).stream())
+
+    def leer_pagina(self, uid, coleccion, despues_de=None, tamano=500, campos=None):
+        # Cursor por id de documento: no requiere índice y no se salta ni repite
+        # documentos aunque se agreguen otros mientras se pagina
+        consulta = self._ref(uid, coleccion).order_by(FieldPath.document_id()).limit(tamano)
+        if despues_de is not None:
+            consulta = consulta.start_after({FieldPath.document_id(): despues_de})
+        return [(doc.id, doc.to_dict()) for doc in self._proyectar(consulta, campos).stream()]
+
+    def _filtrar(self, uid, coleccion, filtros):
+        consulta = self._ref(uid, coleccion)
+        for campo, operador, valor in filtros:
+            consulta = consulta.where(campo, operador, valor)
+        return consulta
+
+    def leer_pagina_ordenada(self, uid, coleccion, orden, descendente=False, filtros=(), despues_de=None,
+                             tamano=50, campos=None):
+        # Filtrar por un campo y ordenar por otro pide índice compuesto (firestore.indexes.json)
+        direccion = firestore.Query.DESCENDING if descendente else firestore.Query.ASCENDING
+        consulta = (
+            self._filtrar(uid, coleccion, filtros)
+            .order_by(orden, direction=direccion)
+            .order_by(FieldPath.document_id(), direction=direccion)
+        )
+        if despues_de is not None:
+            consulta = consulta.start_after({orden: despues_de[0], FieldPath.document_id(): despues_de[1]})
+        return [(doc.id, doc.to_dict()) for doc in self._proyectar(consulta.limit(tamano), campos).stream()]
+
+    def contar(self, uid, coleccion, filtros=()):
+        # Agregación del lado del servidor: no descarga los documentos
+        resultado = self._filtrar(uid, coleccion, filtros).count().get()
+        return int(resultado[0][0].value)
+
+    def leer_intervalo(self, uid, coleccion, desde_id=None, hasta_id=None, campos=None):
+        consulta = self._ref(uid, coleccion).order_by(FieldPath.document_id())
+        if desde_id is not None:
+            consulta = consulta.start_at({FieldPath.document_id(): desde_id})
+        if hasta_id is not None:
+            consulta = consulta.end_before({FieldPath.document_id(): hasta_id})
+        return ((doc.id, doc.to_dict()) for doc in self._proyectar(consulta, campos).stream())
+
+    def buscar(self, uid, coleccion, campo, valor):
+        consulta = self._ref(uid, coleccion).where(campo, "==", valor)
+        return [(doc.id, doc.to_dict()) for doc in consulta.get()]
+
+    def consultar(self, uid, coleccion, filtros, campos=None):
+        # Las combinaciones usadas tienen índice compuesto en firestore.indexes.json
+        consulta = self._ref(uid, coleccion)
+        for campo, operador, valor in filtros:
+            consulta = consulta.where(campo, operador, valor)
+        return ((doc.id, doc.to_dict()) for doc in self._proyectar(consulta, campos).stream())
+
+    def ejecutar_lote(self, uid, operaciones):
+        if any(_con_minimo(operacion) for operacion in operaciones):
+            return self._ejecutar_en_transaccion(uid, operaciones)
+        lote = self.cliente.batch()
+        ids = self._escribir(lote, uid, operaciones)
+        lote.commit()
+        return ids
+
+    def _ejecutar_en_transaccion(self, uid, operaciones):
+        # Los documentos con mínimo se leen dentro de la transacción; si otra
+        # escritura los cambia antes del commit, transactional la reintenta
+        @firestore.transactional
+        def aplicar(transaccion):
+            for operacion in operaciones:
+                if _con_minimo(operacion):
+                    _, coleccion, doc_id, deltas, minimos = operacion
+                    snap = self._ref(uid, coleccion).document(doc_id).get(transaction=transaccion)
+                    _revisar_minimos(coleccion, doc_id, snap.to_dict(), deltas, minimos)
+            return self._escribir(transaccion, uid, operaciones)
+
+        return aplicar(self.cliente.transaction())
+
+    @staticmethod
+    def _incrementos(deltas):
+        return {campo: firestore.Increment(delta) for campo, delta in deltas.items()}
+
+    def _escribir(self, lote, uid, operaciones):
+        """Agrega las operaciones a lote, un WriteBatch o una Transaction."""
+        ids = []
+        for tipo, coleccion, *resto in operaciones:
+            if tipo == "agregar":
+                referencia = self._ref(uid, coleccion).document()
+                lote.set(referencia, self._sellar(resto[0]))
+                ids.append(referencia.id)
+            elif tipo == "establecer":
+                lote.set(self._ref(uid, coleccion).document(resto[0]), self._sellar(resto[1]))
+            elif tipo == "eliminar":
+                lote.delete(self._ref(uid, coleccion).document(resto[0]))
+            elif tipo == "actualizar":
+                incrementos = self._incrementos(resto[2]) if len(resto) > 2 else {}
+                lote.update(self._ref(uid, coleccion).document(resto[0]), self._sellar({**resto[1], **incrementos}))
+            elif tipo == "incrementar":
+                lote.update(self._ref(uid, coleccion).document(resto[0]), self._sellar(self._incrementos(resto[1])))
+            elif tipo == "acumular":
+                lote.set(
+                    self._ref(uid, coleccion).document(resto[0]),
+                    self._sellar({**resto[2], **self._incrementos(resto[1])}),
+                    merge=True,
+                )
+            else:
+                raise ValueError(f"Operación desconocida: {tipo}")
+        return ids
+
+    def referencia_en_vivo(self, uid, coleccion):
+        return self._ref(uid, coleccion)
+
+
+# ---------------------------
+# SQLite
+# ---------------------------
+# Campos del documento copiados a columnas propias para poder indexarlos
+CAMPOS_INDEXADOS = {"Cliente": "cliente", "Categoría": "categoria", "Fecha": "fecha", "Clave": "clave"}
+_OPERADORES_SQL = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _a_json(datos):
+    def convertir(valor):
+        if isinstance(valor, datetime.datetime):
+            return {"__fecha__": valor.isoformat()}
+        raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+    return json.dumps(datos, default=convertir, ensure_ascii=False)
+
+
+def _de_json(texto):
+    def restaurar(objeto):
+        if set(objeto) == {"__fecha__"}:
+            return datetime.datetime.fromisoformat(objeto["__fecha__"])
+        return objeto
+    return json.loads(texto, object_hook=restaurar)
+
+
+def _sello_texto(momento):
+    # Ancho fijo para que el orden de texto coincida con el orden cronológico
+    return momento.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+class SqliteBackend(Backend):
+    """Todas las colecciones en una tabla con índices sobre los campos de filtro.
+
+    Sirve para sucursales sin red y para probar o medir la app localmente.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.identificador = f"sqlite-{os.path.splitext(os.path.basename(ruta))[0]}"
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    uid TEXT NOT NULL,
+                    coleccion TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    cliente TEXT,
+                    categoria TEXT,
+                    fecha TEXT,
+                    clave TEXT,
+                    actualizado TEXT NOT NULL,
+                    PRIMARY KEY (uid, coleccion, id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_cliente ON documentos (uid, coleccion, cliente);
+                CREATE INDEX IF NOT EXISTS idx_categoria ON documentos (uid, coleccion, categoria);
+                CREATE INDEX IF NOT EXISTS idx_fecha ON documentos (uid, coleccion, fecha);
+                CREATE INDEX IF NOT EXISTS idx_clave ON documentos (uid, coleccion, clave);
+                CREATE INDEX IF NOT EXISTS idx_actualizado ON documentos (uid, coleccion, actualizado);
+            """)
+
+    def _conexion(self):
+        # Una conexión por hilo; sqlite3 no permite compartirlas
+        if getattr(self._local, "conexion", None) is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            self._local.conexion = sqlite3.connect(self.ruta, timeout=30)
+            self._local.conexion.execute("PRAGMA journal_mode=WAL")
+        return self._local.conexion
+
+    def _insertar(self, conexion, uid, coleccion, doc_id, datos, reemplazar=True):
+        ahora = datetime.datetime.now(datetime.timezone.utc)
+        datos = {**datos, CAMPO_ACTUALIZADO: ahora}
+        if "Fecha" in datos:
+            datos[CAMPO_FECHA_DIA] = fecha_dia(datos["Fecha"])
+        indexados = [None if datos.get(c) is None else str(datos.get(c)) for c in CAMPOS_INDEXADOS]
+        conexion.execute(
+            f"INSERT {'OR REPLACE ' if reemplazar else ''}INTO documentos "
+            "(uid, coleccion, id, datos, cliente, categoria, fecha, clave, actualizado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [uid, coleccion, doc_id, _a_json(datos), *indexados, _sello_texto(ahora)],
+        )
+
+    def _guardar(self, uid, coleccion, doc_id, datos):
+        with self._conexion() as conexion:
+            self._insertar(conexion, uid, coleccion, doc_id, datos)
+
+    def _leer(self, uid, coleccion, doc_id):
+        fila = self._conexion().execute(
+            "SELECT datos FROM documentos WHERE uid = ? AND coleccion = ? AND id = ?",
+            [uid, coleccion, doc_id],
+        ).fetchone()
+        return _de_json(fila[0]) if fila else None
+
+    def _filas(self, uid, coleccion, condicion="", parametros=()):
+        cursor = self._conexion().execute(
+            f"SELECT id, datos FROM documentos WHERE uid = ? AND coleccion = ? {condicion}",
+            [uid, coleccion, *parametros],
+        )
+        return ((doc_id, _de_json(datos)) for doc_id, datos in cursor)
+
+    def agregar(self, uid, coleccion, datos):
+        doc_id = uuid.uuid4().hex[:20]
+        self._guardar(uid, coleccion, doc_id, datos)
+        return doc_id
+
+    def establecer(self, uid, coleccion, doc_id, datos):
+        self._guardar(uid, coleccion, doc_id, datos)
+
+    def crear(self, uid, coleccion, doc_id, datos):
+        try:
+            with self._conexion() as conexion:
+                self._insertar(conexion, uid, coleccion, doc_id, datos, reemplazar=False)
+        except sqlite3.IntegrityError as error:  # Choca con la llave primaria
+            raise DocumentoExistente(coleccion, doc_id) from error
+
+    def actualizar(self, uid, coleccion, doc_id, datos):
+        # Leer y reescribir dentro del lote (BEGIN IMMEDIATE): otra escritura
+        # al mismo documento no puede colarse entre la lectura y el guardado
+        self.ejecutar_lote(uid, [("actualizar", coleccion, doc_id, datos)])
+
+    def eliminar(self, uid, coleccion, doc_id):
+        with self._conexion() as conexion:
+            conexion.execute(
+                "DELETE FROM documentos WHERE uid = ? AND coleccion = ? AND id = ?",
+                [uid, coleccion, doc_id],
+            )
+
+    def leer_documento(self, uid, coleccion, doc_id):
+        return self._leer(uid, coleccion, doc_id)
+
+    def ejecutar_lote(self, uid, operaciones):
+        conexion = self._conexion()
+        ids = []
+        with conexion:  # Una sola transacción: commit al salir, rollback si algo falla
+            # IMMEDIATE toma el candado de escritura antes de leer: dos lotes que
+            # incrementan el mismo documento no pueden leer ambos el valor viejo
+            conexion.execute("BEGIN IMMEDIATE")
+            for tipo, coleccion, *resto in operaciones:
+                if tipo == "agregar":
+                    doc_id = uuid.uuid4().hex[:20]
+                    self._insertar(conexion, uid, coleccion, doc_id, resto[0])
+                    ids.append(doc_id)
+                    continue
+                doc_id = resto[0]
+                if tipo == "establecer":
+                    self._insertar(conexion, uid, coleccion, doc_id, resto[1])
+                    continue
+                if tipo == "eliminar":
+                    conexion.execute(
+                        "DELETE FROM documentos WHERE uid = ? AND coleccion = ? AND id = ?",
+                        [uid, coleccion, doc_id],
+                    )
+                    continue
+                actuales = self._leer(uid, coleccion, doc_id)
+                if tipo == "acumular":
+                    actuales = {**(actuales or {}), **resto[2]}
+                elif actuales is None:
+                    raise KeyError(f"No existe el documento {coleccion}/{doc_id}")
+                if tipo == "incrementar" and len(resto) > 2:
+                    _revisar_minimos(coleccion, doc_id, actuales, resto[1], resto[2])
+                if tipo == "actualizar":
+                    incrementos = resto[2] if len(resto) > 2 else {}
+                    nuevos = {**resto[1], **_sumar(actuales, incrementos)}
+                elif tipo in ("incrementar", "acumular"):
+                    nuevos = _sumar(actuales, resto[1])
+                else:
+                    raise ValueError(f"Operación desconocida: {tipo}")
+                self._insertar(conexion, uid, coleccion, doc_id, {**actuales, **nuevos})
+        return ids
+
+    # En SQLite el documento completo ya es local; campos se acepta por compatibilidad
+    def leer_todo(self, uid, coleccion, campos=None):
+        return self._filas(uid, coleccion)
+
+    def leer_cambios(self, uid, coleccion, desde, campos=None):
+        return self._filas(uid, coleccion, "AND actualizado >= ?", [_sello_texto(desde)])
+
+    def leer_rango(self, uid, coleccion, desde=None, hasta=None, campos=None):
+        # La columna fecha guarda el texto ISO, que ordena igual que las fechas
+        condicion, parametros = "", []
+        if desde is not None:
+            condicion += " AND fecha >= ?"
+            parametros.append(fecha_dia(desde).date().isoformat())
+        if hasta is not None:
+            condicion += " AND fecha < ?"
+            parametros.append((fecha_dia(hasta) + datetime.timedelta(days=1)).date().isoformat())
+        return self._filas(uid, coleccion, condicion, parametros)
+
+    def leer_pagina(self, uid, coleccion, despues_de=None, tamano=500, campos=None):
+        # La llave primaria (uid, coleccion, id) resuelve el cursor sin ordenar
+        if despues_de is None:
+            return list(self._filas(uid, coleccion, "ORDER BY id LIMIT ?", [tamano]))
+        return list(self._filas(uid, coleccion, "AND id > ? ORDER BY id LIMIT ?", [despues_de, tamano]))
+
+    @staticmethod
+    def _expresion(campo):
+        # Campos indexados por su columna; el resto se extrae del JSON
+        if campo in CAMPOS_INDEXADOS:
+            return CAMPOS_INDEXADOS[campo]
+        ruta = f'$."{campo}"' + ('."__fecha__"' if campo == CAMPO_FECHA_DIA else "")
+        return f"json_extract(datos, '{ruta}')"
+
+    @staticmethod
+    def _parametro(campo, valor):
+        if campo in CAMPOS_INDEXADOS:
+            return str(valor)
+        if isinstance(valor, datetime.datetime):
+            return valor.isoformat()  # Igual que lo guarda _a_json
+        return valor
+
+    def _condiciones(self, filtros):
+        condicion, parametros = "", []
+        for campo, operador, valor in filtros:
+            expresion = self._expresion(campo)
+            if operador == "in":
+                condicion += f" AND {expresion} IN ({', '.join('?' * len(valor))})"
+                parametros += [self._parametro(campo, v) for v in valor]
+            else:
+                condicion += f" AND {expresion} {_OPERADORES_SQL[operador]} ?"
+                parametros.append(self._parametro(campo, valor))
+        return condicion, parametros
+
+    def leer_pagina_ordenada(self, uid, coleccion, orden, descendente=False, filtros=(), despues_de=None,
+                             tamano=50, campos=None):
+        condicion, parametros = self._condiciones(filtros)
+        expresion = self._expresion(orden)
+        comparador, direccion = ("<", "DESC") if descendente else (">", "ASC")
+        condicion += f" AND {expresion} IS NOT NULL"
+        if despues_de is not None:
+            condicion += f" AND ({expresion}, id) {comparador} (?, ?)"
+            parametros += [self._parametro(orden, despues_de[0]), despues_de[1]]
+        condicion += f" ORDER BY {expresion} {direccion}, id {direccion} LIMIT ?"
+        return list(self._filas(uid, coleccion, condicion, [*parametros, tamano]))
+
+    def contar(self, uid, coleccion, filtros=()):
+        condicion, parametros = self._condiciones(filtros)
+        return self._conexion().execute(
+            f"SELECT COUNT(*) FROM documentos WHERE uid = ? AND coleccion = ? {condicion}",
+            [uid, coleccion, *parametros],
+        ).fetchone()[0]
+
+    def limites_particion(self, uid, coleccion, particiones):
+        # Cuantiles exactos de los ids, recorriendo solo la llave primaria
+        total = self.contar(uid, coleccion)
+        limites = []
+        for i in range(1, particiones):
+            fila = self._conexion().execute(
+                "SELECT id FROM documentos WHERE uid = ? AND coleccion = ? ORDER BY id LIMIT 1 OFFSET ?",
+                [uid, coleccion, total * i // particiones],
+            ).fetchone()
+            if fila and (not limites or fila[0] > limites[-1]):
+                limites.append(fila[0])
+        return limites
+
+    def leer_intervalo(self, uid, coleccion, desde_id=None, hasta_id=None, campos=None):
+        condicion, parametros = "", []
+        if desde_id is not None:
+            condicion += " AND id >= ?"
+            parametros.append(desde_id)
+        if hasta_id is not None:
+            condicion += " AND id < ?"
+            parametros.append(hasta_id)
+        return self._filas(uid, coleccion, condicion, parametros)
+
+    def buscar(self, uid, coleccion, campo, valor):
+        if campo in CAMPOS_INDEXADOS:
+            columna = CAMPOS_INDEXADOS[campo]
+            return list(self._filas(uid, coleccion, f"AND {columna} = ?", [str(valor)]))
+        return [(i, d) for i, d in self.leer_todo(uid, coleccion) if d.get(campo) == valor]
+
+    def consultar(self, uid, coleccion, filtros, campos=None):
+        # Los filtros sobre columnas indexadas van a SQL; el resto se aplica aquí
+        condicion, parametros, restantes = "", [], []
+        for campo, operador, valor in filtros:
+            valores = list(valor) if operador == "in" else [valor]
+            if campo not in CAMPOS_INDEXADOS:
+                restantes.append((campo, valores))
+                continue
+            condicion += f" AND {CAMPOS_INDEXADOS[campo]} IN ({', '.join('?' * len(valores))})"
+            parametros += [str(v) for v in valores]
+        return (
+            (doc_id, datos) for doc_id, datos in self._filas(uid, coleccion, condicion, parametros)
+            if all(datos.get(campo) in valores for campo, valores in restantes)
+        )
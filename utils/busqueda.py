@@ -0,0 +1,137 @@
+import itertools
+import threading
+import unicodedata
+
+
+# ---------------------------
+# Índice de búsqueda por n-gramas
+# ---------------------------
+def normalizar(texto):
+    """Minúsculas y sin acentos, para que "Método" y "metodo" coincidan."""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _gramas(texto):
+    """Trigramas del texto y prefijos de 1 y 2 letras de cada palabra ("^ab")."""
+    gramas = {texto[i:i + 3] for i in range(len(texto) - 2)}
+    for palabra in texto.split():
+        gramas.update("^" + palabra[:n] for n in (1, 2) if len(palabra) >= n)
+    return gramas
+
+
+class IndiceBusqueda:
+    """Busca registros cuyo texto contiene todas las palabras de una consulta.
+
+    Cada registro (clave -> valores de los campos buscables) se guarda
+    normalizado en una fila; cada trigrama apunta a las filas que lo contienen.
+    Una palabra de tres letras o más se busca como subcadena y una de una o
+    dos letras como inicio de palabra. Se parte de la lista más corta de
+    la palabra más selectiva y solo se verifican esas filas, así que el costo
+    depende de cuántos registros coinciden y no del tamaño del catálogo.
+
+    version es la versión de la colección con la que se armó; agregar() y
+    quitar() la mantienen al día sin reconstruir. Cada registro reemplazado o
+    quitado deja un hueco; cuando los huecos pasan de fraccion_huecos de las
+    filas, el índice se compacta.
+    """
+
+    def __init__(self, registros, campos, version=0, fraccion_huecos=0.25):
+        self.campos = list(campos)
+        self.version = version
+        self.fraccion_huecos = fraccion_huecos
+        self._claves = []  # fila -> clave
+        self._valores = []  # fila -> valores de los campos, o None si se quitó
+        self._textos = []  # fila -> " " + texto normalizado, o None si se quitó
+        self._filas = {}  # clave -> fila vigente
+        self._gramas = {}  # grama -> [filas], en orden creciente
+        self._lock = threading.Lock()
+        for clave, datos in registros:
+            self._agregar(clave, datos)
+
+    @classmethod
+    def desde_df(cls, df, columna_clave, campos, version=0):
+        valores = df[list(campos)].astype(object).where(df[list(campos)].notna(), "")
+        registros = zip(df[columna_clave].tolist(), valores.itertuples(index=False, name=None))
+        return cls(((clave, dict(zip(campos, fila))) for clave, fila in registros), campos, version)
+
+    def __len__(self):
+        return len(self._filas)
+
+    def _agregar(self, clave, datos):
+        self._quitar(clave)
+        fila = len(self._claves)
+        valores = tuple("" if datos.get(c) is None else str(datos.get(c)) for c in self.campos)
+        texto = normalizar(" ".join(valores))
+        self._claves.append(clave)
+        self._valores.append(valores)
+        self._textos.append(" " + texto)  # Con el espacio, un inicio de palabra es " ab" in texto
+        self._filas[clave] = fila
+        for grama in _gramas(texto):
+            self._gramas.setdefault(grama, []).append(fila)
+
+    def _quitar(self, clave):
+        # La fila queda como hueco; sus gramas se descartan al compactar
+        fila = self._filas.pop(clave, None)
+        if fila is not None:
+            self._valores[fila] = self._textos[fila] = None
+        return fila
+
+    def _compactar_si_conviene(self):
+        huecos = len(self._claves) - len(self._filas)
+        if huecos <= 64 or huecos <= self.fraccion_huecos * len(self._claves):
+            return
+        vigentes = sorted(self._filas.items(), key=lambda par: par[1])  # Conserva el orden
+        registros = [(clave, dict(zip(self.campos, self._valores[fila]))) for clave, fila in vigentes]
+        self._claves, self._valores, self._textos, self._filas, self._gramas = [], [], [], {}, {}
+        for clave, datos in registros:
+            self._agregar(clave, datos)
+
+    def agregar(self, clave, datos, version=None):
+        """Agrega o reemplaza el registro; con datos parciales conserva los
+        demás campos que ya tenía."""
+        with self._lock:
+            fila = self._filas.get(clave)
+            if fila is not None:
+                datos = {**dict(zip(self.campos, self._valores[fila])), **datos}
+            self._agregar(clave, datos)
+            self._compactar_si_conviene()
+            if version is not None:
+                self.version = version
+
+    def quitar(self, clave, version=None):
+        with self._lock:
+            self._quitar(clave)
+            self._compactar_si_conviene()
+            if version is not None:
+                self.version = version
+
+    def buscar(self, consulta, limite=None):
+        """Claves de los registros que contienen todas las palabras de consulta,
+        en el orden en que se agregaron. Sin palabras regresa None (sin filtro)."""
+        palabras = normalizar(consulta).split()
+        if not palabras:
+            return None
+        with self._lock:
+            candidatas = None
+            for palabra in palabras:
+                if len(palabra) < 3:
+                    filas = self._gramas.get("^" + palabra, [])
+                else:
+                    filas = min(
+                        (self._gramas.get(palabra[i:i + 3], []) for i in range(len(palabra) - 2)), key=len)
+                if candidatas is None or len(filas) < len(candidatas):
+                    candidatas = filas
+                if not candidatas:
+                    return []
+
+            # Cada palabra se verifica con un solo "in": subcadena o inicio de palabra
+            textos = self._textos
+            filas = (fila for fila in candidatas if textos[fila] is not None)
+            for palabra in palabras:
+                filas = _con_aguja(filas, textos, palabra if len(palabra) >= 3 else " " + palabra)
+            return [self._claves[fila] for fila in itertools.islice(filas, limite)]
+
+
+def _con_aguja(filas, textos, aguja):
+    return (fila for fila in filas if aguja in textos[fila])
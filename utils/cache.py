@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------------------
+# Caché de lecturas por usuario
+# ---------------------------
+class CacheLecturas:
+    """Caché de proceso para los DataFrames que regresan las funciones leer_*.
+
+    Vive a nivel de módulo, por lo que la comparten todas las sesiones (pestañas)
+    del mismo usuario. Cada entrada se guarda con la versión de su colección;
+    cualquier escritura incrementa esa versión y la entrada deja de ser válida.
+    Lo que se calcula de una lectura completa (índices por clave, de búsqueda)
+    se guarda con ella como derivado: vence y sale por LRU junto con la entrada.
+    """
+
+    def __init__(self, max_entradas=64, ttl_segundos=300):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()  # (uid, coleccion, variante) -> (version, instante, df, derivados)
+        self._versiones = {}  # (uid, coleccion) -> int
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def version(self, uid, coleccion):
+        with self._lock:
+            return self._versiones.get((uid, coleccion), 0)
+
+    def invalidar(self, uid, coleccion):
+        with self._lock:
+            self._versiones[(uid, coleccion)] = self._versiones.get((uid, coleccion), 0) + 1
+            for clave in [c for c in self._entradas if c[0] == uid and c[1] == coleccion]:
+                del self._entradas[clave]
+
+    def obtener(self, uid, coleccion, variante=""):
+        clave = (uid, coleccion, variante)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if self._es_vigente(uid, coleccion, entrada):
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return entrada[2].copy()
+                del self._entradas[clave]
+            self.fallos += 1
+            return None
+
+    def _es_vigente(self, uid, coleccion, entrada):
+        version, instante = entrada[:2]
+        return version == self._versiones.get((uid, coleccion), 0) and time.monotonic() - instante <= self.ttl_segundos
+
+    def guardar(self, uid, coleccion, version, df, variante="", derivados=None):
+        with self._lock:
+            if version != self._versiones.get((uid, coleccion), 0):
+                return  # Hubo una escritura mientras se leía; no guardar datos viejos
+            self._entradas[(uid, coleccion, variante)] = (version, time.monotonic(), df.copy(), dict(derivados or {}))
+            self._entradas.move_to_end((uid, coleccion, variante))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def vigente(self, uid, coleccion, variante=""):
+        """(versión, df) de la entrada vigente sin contarla como acierto, o
+        None. df es el guardado: no debe modificarse."""
+        with self._lock:
+            entrada = self._entradas.get((uid, coleccion, variante))
+            if entrada is None or not self._es_vigente(uid, coleccion, entrada):
+                return None
+            return entrada[0], entrada[2]
+
+    def derivado(self, uid, coleccion, nombre):
+        """(versión, df, valor) de la lectura completa vigente y su derivado
+        nombre (None si aún no se calcula), o None si no hay lectura vigente.
+        Cuenta como uso de la entrada para el LRU."""
+        clave = (uid, coleccion, "")
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or not self._es_vigente(uid, coleccion, entrada):
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[0], entrada[2], entrada[3].get(nombre)
+
+    def adjuntar(self, uid, coleccion, version, nombre, valor):
+        """Guarda valor como derivado de la lectura completa si sigue en version."""
+        with self._lock:
+            entrada = self._entradas.get((uid, coleccion, ""))
+            if entrada is not None and entrada[0] == version:
+                entrada[3][nombre] = valor
+
+    def parchar(self, uid, coleccion, parche, conservar=()):
+        """Como invalidar(), pero si la lectura completa (variante "") seguía
+        vigente se guarda parche(df) con la nueva versión en lugar de perderla.
+
+        parche recibe el DataFrame guardado y debe regresar uno nuevo sin
+        modificarlo. Los derivados nombrados en conservar pasan a la nueva
+        entrada (quien escribe los pone al día); los demás se descartan.
+        Regresa la nueva versión si se parchó, o None.
+        """
+        with self._lock:
+            entrada = self._entradas.get((uid, coleccion, ""))
+            if entrada is None or not self._es_vigente(uid, coleccion, entrada):
+                entrada = None
+        self.invalidar(uid, coleccion)
+        nueva = self.version(uid, coleccion)
+        if entrada is None or entrada[0] != nueva - 1:
+            return None  # Otra escritura se cruzó: la siguiente lectura va a la base
+        derivados = {nombre: valor for nombre, valor in entrada[3].items() if nombre in conservar}
+        self.guardar(uid, coleccion, nueva, parche(entrada[2]), derivados=derivados)
+        return nueva
+
+    def descartar(self, uid, coleccion, version):
+        """Como invalidar(), pero solo si la colección sigue en la versión
+        dada; si entre tanto hubo otra escritura no hace nada. Regresa si
+        descartó."""
+        with self._lock:
+            if self._versiones.get((uid, coleccion), 0) != version:
+                return False
+            self._versiones[(uid, coleccion)] = version + 1
+            for clave in [c for c in self._entradas if c[0] == uid and c[1] == coleccion]:
+                del self._entradas[clave]
+            return True
+
+    def limpiar(self, uid=None):
+        with self._lock:
+            for clave in [c for c in self._entradas if uid is None or c[0] == uid]:
+                del self._entradas[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "entradas": len(self._entradas),
+                "tasa_aciertos": self.aciertos / total if total else 0.0,
+            }
+
+
+# ---------------------------
+# Memoización de cálculos derivados
+# ---------------------------
+class MemoCalculos:
+    """Resultados de cálculos (tablas, especificaciones de gráficas) atados a
+    la versión de las colecciones de las que salen.
+
+    La clave incluye las versiones de CacheLecturas, así que una escritura
+    hace que la siguiente llamada recalcule; las entradas viejas salen por
+    LRU. Como las lecturas, vencen a los ttl_segundos para recoger cambios
+    hechos desde otro proceso. Lo que regresa obtener() se comparte entre
+    llamadas: no debe modificarse.
+    """
+
+    def __init__(self, max_entradas=128, ttl_segundos=300):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._entradas = OrderedDict()  # (uid, nombre, versiones, parametros) -> (instante, valor)
+        self._lock = threading.Lock()
+        self.reutilizados = {}  # nombre -> veces que se regresó un resultado guardado
+        self.recalculados = {}  # nombre -> veces que hubo que calcular
+        self.expulsiones = 0
+
+    def obtener(self, clave, calcular):
+        """Regresa el resultado guardado para clave o lo calcula y lo guarda.
+
+        clave es (uid, nombre, versiones, parametros), todo hasheable.
+        """
+        nombre = clave[1]
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] <= self.ttl_segundos:
+                self._entradas.move_to_end(clave)
+                self.reutilizados[nombre] = self.reutilizados.get(nombre, 0) + 1
+                return entrada[1]
+            self.recalculados[nombre] = self.recalculados.get(nombre, 0) + 1
+
+        valor = calcular()  # Fuera del lock: otras sesiones no esperan este cálculo
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+        return valor
+
+    def limpiar(self, uid=None):
+        with self._lock:
+            for clave in [c for c in self._entradas if uid is None or c[0] == uid]:
+                del self._entradas[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            calculos = {
+                nombre: {
+                    "reutilizados": self.reutilizados.get(nombre, 0),
+                    "recalculados": self.recalculados.get(nombre, 0),
+                }
+                for nombre in sorted(set(self.reutilizados) | set(self.recalculados))
+            }
+            return {"calculos": calculos, "entradas": len(self._entradas), "expulsiones": self.expulsiones}
+
+
+# ---------------------------
+# Unidad de trabajo por ejecución
+# ---------------------------
+class UnidadTrabajo:
+    """Lecturas y escrituras de una sola ejecución del script (un rerun).
+
+    Una colección (con su variante) se pide a CacheLecturas o a la base a lo
+    más una vez por versión; las demás llamadas de la misma ejecución
+    reutilizan ese DataFrame. Una escritura descarta solo lo leído de la
+    colección escrita.
+    """
+
+    def __init__(self):
+        self._lecturas = {}  # (uid, coleccion, variante) -> (version, df)
+        self._lock = threading.Lock()  # Los hilos de carga comparten la unidad
+        self.de_base = 0  # Lecturas que llegaron al backend
+        self.de_cache = 0  # Resueltas por CacheLecturas
+        self.repetidas = 0  # Resueltas por esta unidad
+        self.escrituras = {}  # coleccion -> veces escrita
+        self.inicio = time.perf_counter()
+
+    def obtener(self, uid, coleccion, variante, version):
+        with self._lock:
+            entrada = self._lecturas.get((uid, coleccion, variante))
+            if entrada is None or entrada[0] != version:
+                return None
+            self.repetidas += 1
+            return entrada[1].copy()
+
+    def guardar(self, uid, coleccion, variante, version, df, de_base):
+        with self._lock:
+            self._lecturas[(uid, coleccion, variante)] = (version, df.copy())
+            if de_base:
+                self.de_base += 1
+            else:
+                self.de_cache += 1
+
+    def registrar_escritura(self, uid, coleccion):
+        with self._lock:
+            self.escrituras[coleccion] = self.escrituras.get(coleccion, 0) + 1
+            for clave in [c for c in self._lecturas if c[0] == uid and c[1] == coleccion]:
+                del self._lecturas[clave]
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "de_base": self.de_base,
+                "de_cache": self.de_cache,
+                "repetidas": self.repetidas,
+                "escrituras": dict(self.escrituras),
+                "segundos": time.perf_counter() - self.inicio,
+            }
@@ -8,16 +8,138 @@ import datetime
 import base64
 import pandas as pd
 import logging
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core import exceptions
+from utils.backends import (
+    CAMPO_ACTUALIZADO, CAMPO_FECHA_DIA, DocumentoExistente, FirestoreBackend, SqliteBackend, ValorInsuficiente,
+    fecha_dia,
+)
+from utils.cache import CacheLecturas, MemoCalculos, UnidadTrabajo
+from utils.sincronizacion import SincronizadorDelta
+from utils.en_vivo import RegistroEnVivo
+from utils.snapshots import AlmacenSnapshots
+from utils.saldos import (
+    CAMPOS_SALDO, COLECCION_SALDOS, calcular_saldos, completar_saldos, deltas_saldo, id_saldo,
+)
+from utils.esquema import aplicar_esquema
+from utils.busqueda import IndiceBusqueda
+from utils.resumenes import (
+    COLUMNAS_RESUMEN, DIARIO_TRANSACCIONES, DIARIO_VENTAS, NUMERICAS_RESUMEN, acumulados_diarios,
+    calcular_resumenes,
+)
 
 load_dotenv()
 
 db = None  # Variable global
+backend = None  # Almacenamiento activo (ver utils/backends.py)
+
+# Caché compartida por todas las sesiones del proceso (ver utils/cache.py)
+_cache_lecturas = CacheLecturas(
+    max_entradas=int(os.getenv("ERP_CACHE_MAX_ENTRADAS", "64")),
+    ttl_segundos=float(os.getenv("ERP_CACHE_TTL_SEGUNDOS", "300")),
+)
+
+# Tablas y gráficas derivadas, atadas a la versión de sus colecciones
+_memo_calculos = MemoCalculos(
+    max_entradas=int(os.getenv("ERP_MEMO_MAX_ENTRADAS", "128")),
+    ttl_segundos=float(os.getenv("ERP_CACHE_TTL_SEGUNDOS", "300")),
+)
+
+# Archivos de exportación ya generados (bytes): pocas entradas
+_memo_exportaciones = MemoCalculos(
+    max_entradas=int(os.getenv("ERP_EXPORT_MAX_ENTRADAS", "16")),
+    ttl_segundos=float(os.getenv("ERP_CACHE_TTL_SEGUNDOS", "300")),
+)
+
+_sincronizador = SincronizadorDelta(
+    CAMPO_ACTUALIZADO,
+    margen_segundos=int(os.getenv("ERP_SYNC_MARGEN_SEGUNDOS", "120")),
+    # Lectura completa periódica para notar documentos borrados en otro lado
+    intervalo_completo_segundos=int(os.getenv("ERP_SYNC_COMPLETA_SEGUNDOS", "1800")),
+)
+
+# Instantáneas locales para arrancar en frío sin traer toda la colección
+_snapshots = AlmacenSnapshots(
+    os.getenv("ERP_DIR_SNAPSHOTS", ".snapshots"),
+    intervalo_segundos=int(os.getenv("ERP_SNAPSHOT_INTERVALO_SEGUNDOS", "60")),
+)
+
+# "sincronizacion" (por defecto) consulta cambios al leer; "en_vivo" mantiene
+# una suscripción on_snapshot por colección y usuario.
+MODO_LECTURA = os.getenv("ERP_MODO_LECTURA", "sincronizacion")
+# Las suscripciones de un usuario se cierran tras este tiempo sin lecturas
+_registro_en_vivo = RegistroEnVivo(
+    inactividad_segundos=float(os.getenv("ERP_EN_VIVO_INACTIVIDAD_SEGUNDOS", "900")))
+
+# Clave -> id de documento por usuario, para escribir productos sin consultar
+_indice_claves = {}
+
+# Marcas por usuario de tareas que se hacen una sola vez (armar acumulados
+# desde el historial, migraciones): un documento por tarea en esta colección
+COLECCION_META = "meta"
+
+# (uid, tarea) cuya marca ya se revisó en este proceso
+_tareas_revisadas = set()
+_lock_tareas = threading.RLock()
+
+COLUMNAS = {
+    "ventas": [
+        "Fecha", "Cliente", "Producto", "Cantidad", "Precio Unitario", "Total",
+        "Descuento", "Importe Neto",
+        "Monto Crédito", "Monto Contado", "Anticipo Aplicado",
+        "Método de pago", "Tipo de venta"
+    ],
+    "transacciones": ["Fecha", "Descripción", "Categoría", "Tipo", "Monto", "Cliente", "Método de pago"],
+    "clientes": ["ID", "Nombre", "Correo", "Teléfono", "Empresa", "RFC", "Límite de crédito"],
+    "productos": [
+        "Clave", "Nombre", "Marca_Tipo", "Modelo", "Color", "Talla",
+        "Categoría", "Precio Unitario", "Costo Unitario", "Cantidad", "Descripción"
+    ],
+    COLECCION_SALDOS: ["Cliente", *CAMPOS_SALDO],
+    **COLUMNAS_RESUMEN,
+}
+
+COLUMNAS_NUMERICAS = {
+    "ventas": ["Cantidad", "Precio Unitario", "Total", "Descuento", "Importe Neto",
+               "Monto Crédito", "Monto Contado", "Anticipo Aplicado"],
+    "transacciones": ["Monto"],
+    "clientes": ["Límite de crédito"],
+    "productos": ["Precio Unitario", "Costo Unitario", "Cantidad"],
+    COLECCION_SALDOS: CAMPOS_SALDO,
+    **NUMERICAS_RESUMEN,
+}
+
+# ---------------------------
+# Inicializar almacenamiento
+# ---------------------------
+def inicializar_backend():
+    """ERP_BACKEND=sqlite usa una base local (ERP_SQLITE_RUTA); si no, Firestore."""
+    global backend
+    if os.getenv("ERP_BACKEND", "firestore") == "sqlite":
+        if not isinstance(backend, SqliteBackend):
+            backend = SqliteBackend(os.getenv("ERP_SQLITE_RUTA", "erp.sqlite3"))
+        return
+    inicializar_firebase()
+
+def usar_backend(nuevo_backend):
+    """Cambia el almacenamiento activo (pruebas, mediciones, sucursales)."""
+    global backend
+    backend = nuevo_backend
+    _cache_lecturas.limpiar()
+    _memo_calculos.limpiar()
+    _memo_exportaciones.limpiar()
+    _sincronizador.descartar_todo()
+    _indice_claves.clear()
+    _tareas_revisadas.clear()
 
 # ---------------------------
 # Inicializar Firebase
 # ---------------------------
 def inicializar_firebase():
-    global db
+    global db, backend
 
     if firebase_admin._apps:
         return
@@ -37,56 +159,549 @@ def inicializar_firebase():
 
     firebase_admin.initialize_app(cred)
     db = firestore.client()
+    backend = FirestoreBackend(db)
 
 # ---------------------------
 # Función auxiliar para ruta segura
 # ---------------------------
-def _coleccion_usuario(nombre_coleccion):
-    uid = st.session_state.get("uid")
-    if not uid or db is None:
+# Los hilos de cargar_colecciones() no tienen sesión de Streamlit: reciben el
+# uid (y la unidad de trabajo) de la página que los lanzó
+_hilo = threading.local()
+
+def _uid_sesion():
+    return getattr(_hilo, "uid", None) or st.session_state.get("uid")
+
+def _uid():
+    uid = _uid_sesion()
+    if not uid or backend is None:
         return None  # <- No rompe la ejecución
-    return db.collection("usuarios").document(uid).collection(nombre_coleccion)
+    return uid
+
+# ---------------------------
+# Caché de lecturas
+# ---------------------------
+def _leer_con_cache(nombre_coleccion, lector, variante=""):
+    uid = _uid()
+    if not uid:
+        return lector()
+    unidad = _unidad()
+    version = _cache_lecturas.version(uid, nombre_coleccion)
+    if unidad is not None:
+        df = unidad.obtener(uid, nombre_coleccion, variante, version)
+        if df is not None:
+            return df
+    df = _cache_lecturas.obtener(uid, nombre_coleccion, variante)
+    de_base = df is None
+    if de_base:
+        version = _cache_lecturas.version(uid, nombre_coleccion)
+        df = lector()
+        _cache_lecturas.guardar(uid, nombre_coleccion, version, df, variante)
+    if unidad is not None:
+        unidad.guardar(uid, nombre_coleccion, variante, version, df, de_base)
+    return df
+
+def _invalidar(nombre_coleccion):
+    uid = _uid_sesion()
+    if uid:
+        _cache_lecturas.invalidar(uid, nombre_coleccion)
+        if _unidad() is not None:
+            _unidad().registrar_escritura(uid, nombre_coleccion)
+
+def estadisticas_cache():
+    return _cache_lecturas.estadisticas()
+
+def _clave_memo(uid, nombre, colecciones, parametros):
+    versiones = tuple(_cache_lecturas.version(uid, c) for c in colecciones)
+    return uid, nombre, versiones, parametros
+
+def memoizar(nombre, colecciones, calcular, *parametros):
+    """Regresa calcular() reutilizando el resultado mientras no cambie ninguna
+    de las colecciones de las que sale ni los parámetros. El resultado se
+    comparte entre reruns y sesiones: no debe modificarse."""
+    uid = _uid()
+    if not uid:
+        return calcular()
+    return _memo_calculos.obtener(_clave_memo(uid, nombre, colecciones, parametros), calcular)
+
+def exportacion_diferida(nombre, colecciones, generar, *parametros):
+    """Callable sin argumentos que regresa generar(), guardado como memoizar().
+
+    La clave se arma aquí, en el hilo de la página: st.download_button ejecuta
+    el callable en otro hilo, sin sesión, y solo cuando se pide la descarga.
+    """
+    uid = _uid()
+    if not uid:
+        return generar
+    clave = _clave_memo(uid, nombre, colecciones, parametros)
+
+    def generar_con_uid():
+        # generar() puede leer colecciones (leer_*), que piden el uid de la sesión
+        _hilo.uid = uid
+        try:
+            return generar()
+        finally:
+            _hilo.uid = None
+
+    return lambda: _memo_exportaciones.obtener(clave, generar_con_uid)
+
+def estadisticas_memo():
+    """Por cálculo, cuántas veces se reutilizó y cuántas se recalculó."""
+    return _memo_calculos.estadisticas()
+
+# ---------------------------
+# Unidad de trabajo por ejecución
+# ---------------------------
+def _unidad():
+    return getattr(_hilo, "unidad", None)
+
+@contextlib.contextmanager
+def unidad_de_trabajo():
+    """Agrupa las lecturas de una ejecución del script (ver UnidadTrabajo).
+
+    main.py envuelve cada rerun con ella; al salir, también por st.stop() o
+    st.rerun(), registra en el log cuántas lecturas hizo la ejecución.
+    """
+    anterior = _unidad()
+    unidad = _hilo.unidad = UnidadTrabajo()
+    try:
+        yield unidad
+    finally:
+        _hilo.unidad = anterior
+        resumen = unidad.resumen()
+        logging.info(
+            f"Ejecución en {resumen['segundos']:.2f} s: {resumen['de_base']} lecturas a la base, "
+            f"{resumen['de_cache']} de la caché, {resumen['repetidas']} repetidas evitadas; "
+            f"escrituras: {resumen['escrituras'] or 'ninguna'}."
+        )
+
+# ---------------------------
+# Lectura paralela por particiones
+# ---------------------------
+# Una colección grande se parte por intervalos de id y cada intervalo se lee
+# en su propio stream, en un pool acotado que comparten todas las sesiones.
+PARALELISMO_LECTURAS = int(os.getenv("ERP_PARALELISMO_LECTURAS", "4"))
+UMBRAL_PARTICION = int(os.getenv("ERP_UMBRAL_PARTICION", "20000"))  # Documentos
+_pool_lecturas = None
+_lock_pool = threading.Lock()
+
+def configurar_paralelismo(hilos, umbral=None):
+    """Cambia cuántos intervalos se leen a la vez (1 lo desactiva) y, si se
+    da, desde cuántos documentos se parte una colección."""
+    global PARALELISMO_LECTURAS, UMBRAL_PARTICION, _pool_lecturas
+    with _lock_pool:
+        PARALELISMO_LECTURAS = max(1, int(hilos))
+        if umbral is not None:
+            UMBRAL_PARTICION = int(umbral)
+        if _pool_lecturas is not None:
+            _pool_lecturas.shutdown(wait=False)
+            _pool_lecturas = None
+
+def _pool():
+    global _pool_lecturas
+    with _lock_pool:
+        if _pool_lecturas is None:
+            _pool_lecturas = ThreadPoolExecutor(max_workers=PARALELISMO_LECTURAS, thread_name_prefix="lectura")
+        return _pool_lecturas
+
+def _leer_todo_particionado(uid, nombre_coleccion, campos=None):
+    """Como backend.leer_todo(), pero en paralelo si la colección es grande."""
+    almacen = backend  # Los hilos no deben ver un cambio de backend a media lectura
+    if PARALELISMO_LECTURAS <= 1:
+        return almacen.leer_todo(uid, nombre_coleccion, campos)
+    # El tamaño sale de la copia local si la hay (resincronizaciones, arranque
+    # desde instantánea); contar() cuesta una consulta y solo se paga en frío
+    tamano = _sincronizador.tamano_local(uid, nombre_coleccion) or almacen.contar(uid, nombre_coleccion)
+    if tamano < UMBRAL_PARTICION:
+        return almacen.leer_todo(uid, nombre_coleccion, campos)
+
+    inicio = time.perf_counter()
+    limites = [None, *almacen.limites_particion(uid, nombre_coleccion, PARALELISMO_LECTURAS), None]
+    futuros = [
+        _pool().submit(lambda d, h: list(almacen.leer_intervalo(uid, nombre_coleccion, d, h, campos)), desde, hasta)
+        for desde, hasta in zip(limites[:-1], limites[1:])
+    ]
+    documentos = [par for futuro in futuros for par in futuro.result()]
+    logging.info(
+        f"Lectura particionada de '{nombre_coleccion}': {len(documentos)} documentos en "
+        f"{len(futuros)} intervalos, {time.perf_counter() - inicio:.2f} s."
+    )
+    return documentos
+
+# ---------------------------
+# Sincronización incremental
+# ---------------------------
+def _clave_snapshot(uid):
+    return f"{backend.identificador}-{uid}"
+
+def _documentos_sincronizados(nombre_coleccion, completo=False):
+    uid = _uid()
+    if not uid:
+        return {}
+    columnas = COLUMNAS[nombre_coleccion]
+    documentos, recibidos, completa = _sincronizador.sincronizar(
+        uid,
+        nombre_coleccion,
+        # Solo se piden las columnas que usan los lectores
+        leer_todo=lambda: _leer_todo_particionado(uid, nombre_coleccion, columnas),
+        leer_cambios=lambda desde: backend.leer_cambios(uid, nombre_coleccion, desde, columnas),
+        completo=completo,
+        semilla=lambda: _snapshots.cargar(_clave_snapshot(uid), nombre_coleccion, columnas, CAMPO_ACTUALIZADO),
+    )
+    logging.info(f"Sincronización de '{nombre_coleccion}': {recibidos} documentos recibidos.")
+    # Una lectura completa (pedida o periódica) puede haber quitado borrados: se guarda siempre
+    if recibidos or completa:
+        _snapshots.guardar(
+            _clave_snapshot(uid), nombre_coleccion, columnas, COLUMNAS_NUMERICAS[nombre_coleccion], CAMPO_ACTUALIZADO,
+            documentos, _sincronizador.estado(uid, nombre_coleccion).marca, forzar=completa,
+        )
+    return documentos
+
+def _documentos_en_vivo(nombre_coleccion):
+    uid = _uid()
+    if not uid:
+        return {}
+    ref = backend.referencia_en_vivo(uid, nombre_coleccion)
+    if ref is None:
+        return _documentos_sincronizados(nombre_coleccion)
+    coleccion = _registro_en_vivo.obtener(
+        uid, nombre_coleccion, ref,
+        al_cambiar=lambda: _cache_lecturas.invalidar(uid, nombre_coleccion),
+    )
+    return coleccion.documentos_actuales()
+
+def _documentos(nombre_coleccion):
+    if MODO_LECTURA == "en_vivo":
+        return _documentos_en_vivo(nombre_coleccion)
+    return _documentos_sincronizados(nombre_coleccion)
+
+def detener_en_vivo(uid=None):
+    _registro_en_vivo.cerrar(uid)
+
+def resincronizar(nombre_coleccion=None):
+    """Descarta la copia local y vuelve a traer la colección completa."""
+    for coleccion in [nombre_coleccion] if nombre_coleccion else list(COLUMNAS):
+        _documentos_sincronizados(coleccion, completo=True)
+        _invalidar(coleccion)
+
+def _documentos_en_rango(nombre_coleccion, desde, hasta):
+    """Consulta a la base solo los documentos con Fecha dentro del rango."""
+    uid = _uid()
+    if not uid:
+        return {}
+    documentos = dict(backend.leer_rango(uid, nombre_coleccion, desde, hasta, COLUMNAS[nombre_coleccion]))
+    logging.info(f"Lectura de '{nombre_coleccion}' del {desde} al {hasta}: {len(documentos)} documentos.")
+    return documentos
+
+def _asegurar_fecha_dia(uid, campos):
+    """Si la consulta usa FechaDia, antes la agrega (una vez por usuario) a los
+    documentos guardados sin ella, que de otro modo quedarían fuera."""
+    if CAMPO_FECHA_DIA in campos:
+        _una_vez(uid, "fecha_dia", migrar_fecha_dia)
+
+def _leer_por_rango(nombre_coleccion, desde, hasta):
+    uid = _uid()
+    if uid:
+        _asegurar_fecha_dia(uid, [CAMPO_FECHA_DIA])  # leer_rango consulta por FechaDia
+    return _leer_con_cache(
+        nombre_coleccion,
+        lambda: _construir_df(nombre_coleccion, _documentos_en_rango(nombre_coleccion, desde, hasta)),
+        f"rango:{desde}:{hasta}",
+    )
+
+def _construir_df(nombre_coleccion, documentos, columna_id=None):
+    """Arma el DataFrame de {id: datos} en una sola pasada columnar.
+
+    from_records toma las columnas directo de los dicts (sin crear un dict
+    normalizado por documento) y las numéricas se convierten de una vez. El
+    resultado sale con los tipos de utils/esquema.py.
+    """
+    columnas = COLUMNAS[nombre_coleccion]
+    if not documentos:
+        return aplicar_esquema(nombre_coleccion, pd.DataFrame(columns=columnas))
+
+    df = pd.DataFrame.from_records(list(documentos.values()), columns=columnas)
+    if columna_id:
+        df[columna_id] = list(documentos.keys())
+    numericas = {
+        col: pd.to_numeric(df[col], errors='coerce').fillna(0.0).astype("float64")
+        for col in COLUMNAS_NUMERICAS[nombre_coleccion]
+    }
+    return aplicar_esquema(nombre_coleccion, df.assign(**numericas))
+
+# ---------------------------
+# Acumulados materializados
+# ---------------------------
+# Saldos por cliente (utils/saldos.py) y resúmenes diarios (utils/resumenes.py)
+def _acumulados_de(coleccion, datos):
+    deltas = deltas_saldo(coleccion, datos)
+    if deltas:
+        yield COLECCION_SALDOS, id_saldo(datos["Cliente"]), deltas, {"Cliente": datos["Cliente"]}
+    yield from acumulados_diarios(coleccion, datos)
+
+# Acumulados que se arman desde el historial la primera vez, con la tarea
+# que lo marca en COLECCION_META
+_CONSTRUCCIONES = {
+    COLECCION_SALDOS: ("saldos_clientes", lambda: reconstruir_saldos_clientes()),
+    DIARIO_TRANSACCIONES: ("resumenes_diarios", lambda: reconstruir_resumenes_diarios()),
+    DIARIO_VENTAS: ("resumenes_diarios", lambda: reconstruir_resumenes_diarios()),
+}
+
+def _una_vez(uid, tarea, ejecutar):
+    """Corre ejecutar() si la tarea no tiene marca en COLECCION_META y luego
+    la marca. La marca se consulta una vez por proceso; como se guarda al
+    final, una tarea interrumpida se repite completa."""
+    if (uid, tarea) in _tareas_revisadas:
+        return
+    with _lock_tareas:
+        if (uid, tarea) in _tareas_revisadas:
+            return
+        if backend.leer_documento(uid, COLECCION_META, tarea) is None:
+            ejecutar()
+            completada = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            backend.establecer(uid, COLECCION_META, tarea, {"Completada": completada})
+            logging.info(f"Tarea '{tarea}' completada y marcada.")
+        _tareas_revisadas.add((uid, tarea))
+
+def _asegurar_acumulados(uid, colecciones):
+    """Arma desde el historial los acumulados que nunca se construyeron.
+
+    No basta con que el acumulado tenga documentos: cualquier alta posterior
+    a la actualización ya crea los suyos, sin el historial anterior.
+    """
+    for coleccion in colecciones:
+        if coleccion in _CONSTRUCCIONES:
+            _una_vez(uid, *_CONSTRUCCIONES[coleccion])
+
+def _con_acumulados(operaciones):
+    """Agrega al lote el ajuste de cada acumulado afectado por sus altas.
+
+    Antes arma los acumulados que aún no existen, para que el primer ajuste
+    no quede como todo su contenido.
+    """
+    destinos = {}
+    for tipo, coleccion, *resto in operaciones:
+        if tipo != "agregar":
+            continue
+        for destino, doc_id, deltas, fijos in _acumulados_de(coleccion, resto[0]):
+            sumados = destinos.setdefault((destino, doc_id), ({}, fijos))[0]
+            for campo, delta in deltas.items():
+                sumados[campo] = sumados.get(campo, 0) + delta
+    uid = _uid()
+    if uid:
+        _asegurar_acumulados(uid, {destino for destino, _ in destinos})
+    # Una sola operación por documento: un lote no debe escribir dos veces el mismo
+    return operaciones + [
+        ("acumular", destino, doc_id, deltas, fijos)
+        for (destino, doc_id), (deltas, fijos) in destinos.items()
+    ]
+
+def _invalidar_acumulados(operaciones):
+    for coleccion in {op[1] for op in operaciones if op[0] == "acumular"}:
+        _invalidar(coleccion)
+
+def _agregar_con_acumulados(uid, nombre_coleccion, datos):
+    operaciones = _con_acumulados([("agregar", nombre_coleccion, datos)])
+    doc_id, = backend.ejecutar_lote(uid, operaciones)
+    _invalidar_acumulados(operaciones)
+    return doc_id
+
+def _documentos_materializados(nombre_coleccion):
+    """Como _documentos(), pero si el acumulado nunca se construyó lo arma
+    antes desde el historial."""
+    uid = _uid()
+    if uid:
+        _asegurar_acumulados(uid, [nombre_coleccion])
+    return _documentos(nombre_coleccion)
+
+def _reemplazar_coleccion(uid, nombre_coleccion, documentos, tamano_lote=400):
+    """Deja en la colección exactamente {id: datos}; regresa lo que había antes."""
+    guardados = dict(backend.leer_todo(uid, nombre_coleccion))
+    operaciones = [("establecer", nombre_coleccion, doc_id, datos) for doc_id, datos in documentos.items()]
+    operaciones += [("eliminar", nombre_coleccion, doc_id) for doc_id in guardados if doc_id not in documentos]
+    for inicio in range(0, len(operaciones), tamano_lote):
+        backend.ejecutar_lote(uid, operaciones[inicio:inicio + tamano_lote])
+    _snapshots.borrar(_clave_snapshot(uid), nombre_coleccion)
+    resincronizar(nombre_coleccion)
+    return guardados
+
+def _leer_historial(campos_ventas, campos_transacciones):
+    """Ventas y transacciones completas (solo los campos pedidos) para recalcular acumulados."""
+    uid = _uid()
+    ventas = _construir_df("ventas", dict(_leer_todo_particionado(uid, "ventas", campos_ventas)))
+    transacciones = _construir_df("transacciones", dict(_leer_todo_particionado(uid, "transacciones", campos_transacciones)))
+    return ventas, transacciones
+
+# ---------------------------
+# Saldos por cliente
+# ---------------------------
+def _leer_saldos_clientes_sin_cache():
+    documentos = _documentos_materializados(COLECCION_SALDOS)
+    saldos = _construir_df(COLECCION_SALDOS, documentos)
+    return completar_saldos(saldos, leer_clientes())
+
+def leer_saldos_clientes():
+    """Una fila por cliente: acumulados, saldo pendiente, anticipos a favor y
+    crédito disponible, leídos del resumen materializado."""
+    return _leer_con_cache(COLECCION_SALDOS, _leer_saldos_clientes_sin_cache)
+
+def saldo_cliente(cliente):
+    """Fila de leer_saldos_clientes() para un cliente, en ceros si no tiene movimientos."""
+    fila = fila_por(COLECCION_SALDOS, "Cliente", cliente)
+    if fila is None:
+        fila = completar_saldos(
+            pd.DataFrame([{"Cliente": cliente, **dict.fromkeys(CAMPOS_SALDO, 0.0)}]), leer_clientes()).iloc[0]
+    return fila.to_dict()
+
+def reconstruir_saldos_clientes():
+    """Recalcula saldos_clientes desde todas las ventas y transacciones.
+
+    Regresa los clientes cuyo saldo guardado no coincidía. Conviene ejecutarlo
+    sin ventas en curso: un alta concurrente podría quedar fuera del recálculo.
+    """
+    uid = _uid()
+    if not uid:
+        return []
+    ventas, transacciones = _leer_historial(["Cliente", "Tipo de venta", "Monto Crédito"], ["Cliente", "Categoría", "Monto"])
+    calculados = {
+        id_saldo(fila["Cliente"]): {"Cliente": fila["Cliente"], **{campo: fila[campo] for campo in CAMPOS_SALDO}}
+        for fila in calcular_saldos(ventas, transacciones).to_dict("records")
+    }
+    guardados = _reemplazar_coleccion(uid, COLECCION_SALDOS, calculados)
+
+    diferencias = [
+        datos["Cliente"] for doc_id, datos in calculados.items()
+        if any(abs((guardados.get(doc_id, {}).get(c) or 0.0) - datos[c]) > 0.005 for c in CAMPOS_SALDO)
+    ]
+    diferencias += [datos.get("Cliente", doc_id) for doc_id, datos in guardados.items() if doc_id not in calculados]
+    logging.info(f"Saldos reconstruidos: {len(calculados)} clientes, {len(diferencias)} con diferencias.")
+    return diferencias
+
+# ---------------------------
+# Resúmenes diarios
+# ---------------------------
+def _leer_resumen_sin_cache(nombre_coleccion):
+    documentos = _documentos_materializados(nombre_coleccion)
+    return _construir_df(nombre_coleccion, documentos).sort_values("Fecha", ignore_index=True)
+
+def _filtrar_fechas(df, desde, hasta):
+    # Fecha ya viene como datetime64 a medianoche (ver utils/esquema.py)
+    if desde is not None:
+        df = df[df["Fecha"] >= pd.Timestamp(fecha_dia(desde).date())]
+    if hasta is not None:
+        df = df[df["Fecha"] <= pd.Timestamp(fecha_dia(hasta).date())]
+    return df.reset_index(drop=True)
+
+def leer_resumen_diario_transacciones(desde=None, hasta=None):
+    """Monto y número de movimientos por día, Tipo y Categoría."""
+    df = _leer_con_cache(DIARIO_TRANSACCIONES, lambda: _leer_resumen_sin_cache(DIARIO_TRANSACCIONES))
+    return _filtrar_fechas(df, desde, hasta)
+
+def leer_resumen_diario_ventas(desde=None, hasta=None):
+    """Total vendido y número de ventas por día."""
+    df = _leer_con_cache(DIARIO_VENTAS, lambda: _leer_resumen_sin_cache(DIARIO_VENTAS))
+    return _filtrar_fechas(df, desde, hasta)
+
+def reconstruir_resumenes_diarios():
+    """Recalcula ambos resúmenes diarios desde el historial. Regresa cuántos
+    documentos quedaron en cada uno."""
+    uid = _uid()
+    if not uid:
+        return {}
+    ventas, transacciones = _leer_historial(["Fecha", "Total"], ["Fecha", "Tipo", "Categoría", "Monto"])
+    resumenes = calcular_resumenes(ventas, transacciones)
+    for nombre_coleccion, documentos in resumenes.items():
+        _reemplazar_coleccion(uid, nombre_coleccion, documentos)
+    logging.info(f"Resúmenes diarios reconstruidos: {', '.join(f'{c}={len(d)}' for c, d in resumenes.items())}.")
+    return {nombre_coleccion: len(documentos) for nombre_coleccion, documentos in resumenes.items()}
 
 # ---------------------------
 # Ventas
 # ---------------------------
 def guardar_venta(venta_dict):
-    ref = _coleccion_usuario("ventas")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
-    ref.add(venta_dict)
+    doc_id = _agregar_con_acumulados(uid, "ventas", venta_dict)
+    _parchar("ventas", _anexar("ventas", {doc_id: venta_dict}))
     logging.info("Venta guardada.")
+    return doc_id, venta_dict
+
+def registrar_venta(venta_dict, transacciones=(), clave_producto=None, cantidad=0):
+    """Guarda la venta, sus movimientos contables y el descuento de inventario
+    en un solo lote: se aplican todos o ninguno.
+
+    La existencia se descuenta con un incremento atómico que no la deja bajo
+    cero: si no alcanza (aunque otra caja haya vendido entre tanto), se lanza
+    ValorInsuficiente y la venta no se guarda.
+    """
+    uid = _uid()
+    if not uid:
+        return
+    transacciones = list(transacciones)
+
+    def ejecutar(doc_id):
+        operaciones = [("agregar", "ventas", venta_dict)]
+        operaciones += [("agregar", "transacciones", t) for t in transacciones]
+        if doc_id:
+            operaciones.append(("incrementar", "productos", doc_id, {"Cantidad": -cantidad}, {"Cantidad": 0}))
+        operaciones = _con_acumulados(operaciones)
+        return operaciones, bool(doc_id), backend.ejecutar_lote(uid, operaciones)
+
+    if clave_producto is not None and cantidad:
+        operaciones, descuenta, ids = _escribir_producto(uid, clave_producto, ejecutar)
+    else:
+        operaciones, descuenta, ids = ejecutar(None)
+    id_venta, *ids_transacciones = ids
+    _parchar("ventas", _anexar("ventas", {id_venta: venta_dict}))
+    if transacciones:
+        _parchar("transacciones", _anexar("transacciones", dict(zip(ids_transacciones, transacciones))))
+    if descuenta:
+        _parchar("productos", _fusionar("productos", "Clave", clave_producto, incrementos={"Cantidad": -cantidad}))
+        _indexar(uid, "productos")  # Cambió Cantidad, que no se busca
+    _invalidar_acumulados(operaciones)
+    logging.info("Venta registrada con sus movimientos e inventario.")
+    return id_venta, venta_dict
 
 # ---------------------------
 # Clientes
 # ---------------------------
 def guardar_cliente(id_cliente, cliente_dict):
-    ref = _coleccion_usuario("clientes")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
-    ref.document(id_cliente).set(cliente_dict)
+    backend.establecer(uid, "clientes", id_cliente, cliente_dict)
+    _parchar("clientes", _fusionar("clientes", "ID", id_cliente, cliente_dict, alta={id_cliente: cliente_dict}))
+    _indexar(uid, "clientes", id_cliente, cliente_dict)
+    _invalidar(COLECCION_SALDOS)  # El crédito disponible depende del límite
     logging.info(f"Cliente '{id_cliente}' guardado.")
+    return id_cliente, cliente_dict
 
 def actualizar_cliente(id_cliente, datos_nuevos):
-    ref = _coleccion_usuario("clientes")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
-    ref.document(id_cliente).update(datos_nuevos)
+    backend.actualizar(uid, "clientes", id_cliente, datos_nuevos)
+    _parchar("clientes", _fusionar("clientes", "ID", id_cliente, datos_nuevos))
+    _indexar(uid, "clientes", id_cliente, datos_nuevos)
+    _invalidar(COLECCION_SALDOS)  # El crédito disponible depende del límite
     logging.info(f"Cliente '{id_cliente}' actualizado.")
+    return id_cliente, datos_nuevos
 
 # ---------------------------
 # Transacciones
 # ---------------------------
 def guardar_transaccion(transaccion_dict):
-    ref = _coleccion_usuario("transacciones")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
-    ref.add(transaccion_dict)
+    doc_id = _agregar_con_acumulados(uid, "transacciones", transaccion_dict)
+    _parchar("transacciones", _anexar("transacciones", {doc_id: transaccion_dict}))
     logging.info("Transacción guardada.")
+    return doc_id, transaccion_dict
 
 def registrar_pago_cobranza(cliente, monto, metodo_pago, fecha, descripcion=""):
-    ref = _coleccion_usuario("transacciones")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
     pago_dict = {
         "Fecha": fecha,
@@ -97,192 +712,687 @@ def registrar_pago_cobranza(cliente, monto, metodo_pago, fecha, descripcion=""):
         "Cliente": cliente,
         "Método de pago": metodo_pago
     }
-    ref.add(pago_dict)
+    doc_id = _agregar_con_acumulados(uid, "transacciones", pago_dict)
+    _parchar("transacciones", _anexar("transacciones", {doc_id: pago_dict}))
     logging.info("Pago de cobranza registrado.")
+    return doc_id, pago_dict
 
 # ---------------------------
 # Productos
 # ---------------------------
 def guardar_producto(producto_dict):
-    ref = _coleccion_usuario("productos")
-    if not ref:
+    """Da de alta el producto. Si su clave ya existe en la base (aunque otra
+    sesión lo haya creado después de leer el catálogo) lanza
+    DocumentoExistente y no se escribe nada."""
+    uid = _uid()
+    if not uid:
         return
     for campo in ["Marca_Tipo", "Modelo", "Color", "Talla"]:
         if campo not in producto_dict:
             producto_dict[campo] = ""
-    ref.add(producto_dict)
+    clave = producto_dict.get("Clave")
+    if _clave_es_id_valido(clave):
+        # La clave es el id del documento: actualizar o borrar no requiere consulta,
+        # y crear (no establecer) no pisa un producto existente ni su existencia
+        backend.crear(uid, "productos", clave, producto_dict)
+        doc_id = clave
+    else:
+        # Sin id propio no hay escritura que falle por duplicado: se consulta antes
+        if backend.buscar(uid, "productos", "Clave", clave):
+            raise DocumentoExistente("productos", clave)
+        doc_id = backend.agregar(uid, "productos", producto_dict)
+    _indice_claves.setdefault(uid, {})[clave] = doc_id
+    _parchar("productos", _fusionar("productos", "Clave", clave, producto_dict, alta={doc_id: producto_dict}))
+    _indexar(uid, "productos", clave, producto_dict)
     logging.info("Producto guardado.")
+    return doc_id, producto_dict
+
+def _leer_productos_sin_cache():
+    return _construir_df("productos", _documentos("productos"))
 
 def leer_productos():
-    columnas = [
-        "Clave", "Nombre", "Marca_Tipo", "Modelo", "Color", "Talla",
-        "Categoría", "Precio Unitario", "Costo Unitario", "Cantidad", "Descripción"
-    ]
-    ref = _coleccion_usuario("productos")
-    if not ref:
-        return pd.DataFrame(columns=columnas)
-
-    docs = ref.stream()
-    productos = []
-    for doc in docs:
-        data = doc.to_dict()
-        producto_normalizado = {col: data.get(col, None) for col in columnas}
-        productos.append(producto_normalizado)
-
-    if not productos:
-        return pd.DataFrame(columns=columnas)
-
-    df = pd.DataFrame(productos)
-    for col in columnas:
-        if col not in df.columns:
-            df[col] = None
-    numeric_cols = ["Precio Unitario", "Costo Unitario", "Cantidad"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-
-    return df[columnas]
+    return _leer_con_cache("productos", _leer_productos_sin_cache)
 
 def actualizar_producto_por_clave(clave, campos_actualizados: dict):
-    ref = _coleccion_usuario("productos")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
     for campo in ["Marca_Tipo", "Modelo", "Color", "Talla"]:
         if campo not in campos_actualizados:
             campos_actualizados[campo] = ""
-    query = ref.where("Clave", "==", clave).get()
-    if query:
-        doc_id = query[0].id
-        ref.document(doc_id).update(campos_actualizados)
+    def actualizar(doc_id):
+        if doc_id:
+            backend.actualizar(uid, "productos", doc_id, campos_actualizados)
+        return doc_id
+
+    doc_id = _escribir_producto(uid, clave, actualizar)
+    if doc_id:
+        _parchar("productos", _fusionar("productos", "Clave", clave, campos_actualizados))
+        _indexar(uid, "productos", clave, campos_actualizados)
+        return doc_id, campos_actualizados
+
+def registrar_entrada_inventario(clave, cantidad, costo_unitario, transaccion=None):
+    """Suma cantidad a la existencia con un incremento atómico (sin leer el
+    producto antes), fija el costo de la entrada y guarda su egreso contable,
+    todo en un lote. Regresa (id del producto, campos fijados) o None si la
+    clave no existe; la existencia nueva no se conoce sin volver a leerla."""
+    uid = _uid()
+    if not uid:
+        return
+    def ejecutar(doc_id):
+        if not doc_id:
+            return None
+        operaciones = [("actualizar", "productos", doc_id, {"Costo Unitario": costo_unitario}, {"Cantidad": cantidad})]
+        if transaccion is not None:
+            operaciones.append(("agregar", "transacciones", transaccion))
+        operaciones = _con_acumulados(operaciones)
+        return doc_id, operaciones, backend.ejecutar_lote(uid, operaciones)
+
+    resultado = _escribir_producto(uid, clave, ejecutar)
+    if resultado is None:
+        return
+    doc_id, operaciones, ids = resultado
+    _parchar("productos", _fusionar(
+        "productos", "Clave", clave, {"Costo Unitario": costo_unitario}, {"Cantidad": cantidad}))
+    _indexar(uid, "productos")  # Cambiaron existencia y costo, que no se buscan
+    if transaccion is not None:
+        _parchar("transacciones", _anexar("transacciones", {ids[0]: transaccion}))
+    _invalidar_acumulados(operaciones)
+    logging.info(f"Entrada de {cantidad} unidades de '{clave}' registrada.")
+    return doc_id, {"Costo Unitario": costo_unitario}
 
 def eliminar_producto_por_clave(clave):
-    ref = _coleccion_usuario("productos")
-    if not ref:
+    uid = _uid()
+    if not uid:
         return
-    query = ref.where("Clave", "==", clave).get()
-    if query:
-        doc_id = query[0].id
-        ref.document(doc_id).delete()
+    doc_id = obtener_id_producto(clave)
+    if doc_id:
+        backend.eliminar(uid, "productos", doc_id)
+        _indice_claves.get(uid, {}).pop(clave, None)
+        _sincronizador.quitar_documento(uid, "productos", doc_id)
+        _snapshots.borrar(_clave_snapshot(uid), "productos")
+        _parchar("productos", _quitar_fila("productos", "Clave", clave))
+        _indexar(uid, "productos", clave, None)
+        return doc_id, None
+
+def _clave_es_id_valido(clave):
+    # Reglas de Firestore para ids de documento
+    return (
+        isinstance(clave, str) and clave not in ("", ".", "..") and "/" not in clave
+        and not (clave.startswith("__") and clave.endswith("__"))
+        and len(clave.encode("utf-8")) <= 1500
+    )
 
 def obtener_id_producto(clave):
-    ref = _coleccion_usuario("productos")
-    if not ref:
+    """Busca primero en el índice en memoria, luego en la copia sincronizada y
+    solo al final consulta la base por el campo Clave."""
+    uid = _uid()
+    if not uid:
         return None
-    query = ref.where("Clave", "==", clave).get()
-    if query:
-        return query[0].id
-    return None
+    indice = _indice_claves.setdefault(uid, {})
+    if clave not in indice:
+        for doc_id, data in _sincronizador.documentos_locales(uid, "productos").items():
+            if data.get("Clave") is not None:
+                indice.setdefault(data["Clave"], doc_id)
+    if clave not in indice:
+        query = backend.buscar(uid, "productos", "Clave", clave)
+        if not query:
+            return None
+        indice[clave] = query[0][0]
+    return indice[clave]
+
+# Documento inexistente: SQLite y el Firestore en memoria lanzan KeyError, Firestore NotFound
+_NO_ENCONTRADO = (KeyError, exceptions.NotFound)
+
+def _escribir_producto(uid, clave, escribir):
+    """Regresa escribir(doc_id) con el id del producto de clave (None si no existe).
+
+    El id recordado por obtener_id_producto no se vuelve a revisar: si otro
+    proceso borró el producto o lo migró a otro id, la escritura falla por
+    documento inexistente. Entonces se olvida ese id, se busca de nuevo y se
+    reintenta una vez.
+    """
+    doc_id = obtener_id_producto(clave)
+    try:
+        return escribir(doc_id)
+    except _NO_ENCONTRADO:
+        if doc_id is None:
+            raise
+        logging.info(f"El producto '{clave}' ya no está en {doc_id}; se busca de nuevo.")
+        _indice_claves.get(uid, {}).pop(clave, None)
+        _sincronizador.quitar_documento(uid, "productos", doc_id)
+        return escribir(obtener_id_producto(clave))
+
+def migrar_productos_a_clave(tamano_lote=200):
+    """Mueve los productos con id aleatorio a un documento cuyo id es su Clave.
+
+    Cada producto se copia y se borra en el mismo lote. Se omiten claves que no
+    sirven como id o que ya existen con otro documento. Regresa cuántos se movieron.
+    """
+    uid = _uid()
+    if not uid:
+        return 0
+    documentos = dict(backend.leer_todo(uid, "productos"))
+    movimientos = []
+    destinos = set(documentos)
+    for doc_id, data in documentos.items():
+        clave = data.get("Clave")
+        if clave != doc_id and _clave_es_id_valido(clave) and clave not in destinos:
+            movimientos.append((doc_id, data))
+            destinos.add(clave)
+    for inicio in range(0, len(movimientos), tamano_lote):
+        operaciones = []
+        for doc_id, data in movimientos[inicio:inicio + tamano_lote]:
+            datos = {k: v for k, v in data.items() if k != CAMPO_ACTUALIZADO}
+            operaciones.append(("establecer", "productos", data["Clave"], datos))
+            operaciones.append(("eliminar", "productos", doc_id))
+        backend.ejecutar_lote(uid, operaciones)
+    _indice_claves.pop(uid, None)
+    _snapshots.borrar(_clave_snapshot(uid), "productos")
+    resincronizar("productos")
+    logging.info(f"Migración de productos: {len(movimientos)} documentos ahora usan su Clave como id.")
+    return len(movimientos)
+
+def migrar_fecha_dia(tamano_lote=200):
+    """Agrega el campo FechaDia a ventas y transacciones guardadas antes de
+    que existiera, para que entren en las consultas por rango. Corre sola
+    antes de la primera consulta por FechaDia de cada usuario (ver
+    _asegurar_fecha_dia). Regresa cuántos documentos se actualizaron."""
+    uid = _uid()
+    if not uid:
+        return 0
+    total = 0
+    for coleccion in ["ventas", "transacciones"]:
+        pendientes = [
+            (doc_id, fecha_dia(data.get("Fecha")))
+            for doc_id, data in backend.leer_todo(uid, coleccion)
+            if data.get(CAMPO_FECHA_DIA) is None and fecha_dia(data.get("Fecha")) is not None
+        ]
+        for inicio in range(0, len(pendientes), tamano_lote):
+            backend.ejecutar_lote(uid, [
+                ("actualizar", coleccion, doc_id, {CAMPO_FECHA_DIA: dia})
+                for doc_id, dia in pendientes[inicio:inicio + tamano_lote]
+            ])
+        _invalidar(coleccion)
+        total += len(pendientes)
+    logging.info(f"Migración de FechaDia: {total} documentos actualizados.")
+    return total
+
+# ---------------------------
+# Lectura por páginas
+# ---------------------------
+TAMANO_PAGINA = int(os.getenv("ERP_TAMANO_PAGINA", "1000"))
+
+def contar_documentos(nombre_coleccion, filtros=()):
+    """Documentos de la colección que cumplen filtros, contados en el servidor."""
+    uid = _uid()
+    if not uid:
+        return 0
+    filtros = list(filtros)
+    _asegurar_fecha_dia(uid, [campo for campo, _, _ in filtros])
+    return memoizar(f"contar:{nombre_coleccion}", [nombre_coleccion],
+                    lambda: backend.contar(uid, nombre_coleccion, filtros), _clave_filtros(filtros))
+
+def leer_por_paginas(nombre_coleccion, tamano_pagina=TAMANO_PAGINA):
+    """Genera DataFrames de a lo más tamano_pagina filas, en orden de id.
+
+    Pasa directo de la base al consumidor, sin la copia local ni la caché:
+    sirve para recorrer historiales completos sin tenerlos en memoria.
+    """
+    uid = _uid()
+    if not uid:
+        return
+    despues_de = None
+    while True:
+        pagina = backend.leer_pagina(uid, nombre_coleccion, despues_de, tamano_pagina, COLUMNAS[nombre_coleccion])
+        if pagina:
+            yield _construir_df(nombre_coleccion, dict(pagina))
+            despues_de = pagina[-1][0]
+        if len(pagina) < tamano_pagina:
+            return
+
+# ---------------------------
+# Tablas paginadas
+# ---------------------------
+# Cada página es una consulta ordenada con cursor: cambiar de página cuesta
+# las mismas lecturas sin importar el tamaño del historial.
+TAMANO_TABLA = int(os.getenv("ERP_TAMANO_TABLA", "50"))
+
+def _clave_filtros(filtros):
+    # Los valores de "in" llegan como listas; la clave de memoizar debe ser hasheable
+    return tuple((campo, operador, tuple(valor) if isinstance(valor, list) else valor)
+                 for campo, operador, valor in filtros)
+
+def filtros_fecha(desde=None, hasta=None):
+    """Condiciones sobre FechaDia para desde/hasta (días completos, inclusive)."""
+    filtros = []
+    if desde is not None:
+        filtros.append((CAMPO_FECHA_DIA, ">=", fecha_dia(desde)))
+    if hasta is not None:
+        filtros.append((CAMPO_FECHA_DIA, "<", fecha_dia(hasta) + datetime.timedelta(days=1)))
+    return filtros
+
+def leer_pagina_tabla(nombre_coleccion, orden, descendente=False, filtros=(), despues_de=None, tamano=TAMANO_TABLA):
+    """(DataFrame de la página, cursor de la siguiente página o None).
+
+    Se pide un documento de más para saber si hay otra página. La página se
+    guarda por versión de la colección: volver a una ya vista no lee la base.
+    """
+    uid = _uid()
+    if not uid:
+        return _construir_df(nombre_coleccion, {}), None
+    filtros = list(filtros)
+    _asegurar_fecha_dia(uid, [orden, *(campo for campo, _, _ in filtros)])
+    campos = list(dict.fromkeys([*COLUMNAS[nombre_coleccion], orden]))
+
+    def leer():
+        pagina = backend.leer_pagina_ordenada(
+            uid, nombre_coleccion, orden, descendente, filtros, despues_de, tamano + 1, campos)
+        siguiente = None
+        if len(pagina) > tamano:
+            ultimo_id, ultimo = pagina[tamano - 1]
+            siguiente = (ultimo.get(orden), ultimo_id)
+        logging.info(f"Página de '{nombre_coleccion}' por {orden}: {len(pagina[:tamano])} documentos.")
+        return _construir_df(nombre_coleccion, dict(pagina[:tamano])), siguiente
+
+    df, siguiente = memoizar(
+        f"pagina:{nombre_coleccion}", [nombre_coleccion], leer, orden, descendente, _clave_filtros(filtros),
+        despues_de, tamano)
+    return df.copy(), siguiente
 
 # ---------------------------
 # Reportes y cálculos
 # ---------------------------
-def leer_ventas():
-    columnas = [
-        "Fecha", "Cliente", "Producto", "Cantidad", "Precio Unitario", "Total",
-        "Descuento", "Importe Neto",
-        "Monto Crédito", "Monto Contado", "Anticipo Aplicado",
-        "Método de pago", "Tipo de venta"
-    ]
-    ref = _coleccion_usuario("ventas")
-    if not ref:
-        return pd.DataFrame(columns=columnas)
-
-    docs = ref.stream()
-    ventas = []
-    for doc in docs:
-        data = doc.to_dict()
-        venta_normalizada = {col: data.get(col, None) for col in columnas}
-        ventas.append(venta_normalizada)
-
-    if not ventas:
-        return pd.DataFrame(columns=columnas)
-
-    df = pd.DataFrame(ventas)
-    for col in columnas:
-        if col not in df.columns:
-            df[col] = None
-    numeric_cols = ["Cantidad", "Precio Unitario", "Total", "Descuento", "Importe Neto",
-                    "Monto Crédito", "Monto Contado", "Anticipo Aplicado"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-
-    return df[columnas]
-
-def leer_transacciones():
-    columnas = ["Fecha", "Descripción", "Categoría", "Tipo", "Monto", "Cliente", "Método de pago"]
-    ref = _coleccion_usuario("transacciones")
-    if not ref:
-        return pd.DataFrame(columns=columnas)
-
-    docs = ref.stream()
-    transacciones = []
-    for doc in docs:
-        data = doc.to_dict()
-        transaccion_normalizada = {col: data.get(col, None) for col in columnas}
-        transacciones.append(transaccion_normalizada)
-
-    if not transacciones:
-        return pd.DataFrame(columns=columnas)
-
-    df = pd.DataFrame(transacciones)
-    for col in columnas:
-        if col not in df.columns:
-            df[col] = None
-    if "Monto" in df.columns:
-        df["Monto"] = pd.to_numeric(df["Monto"], errors='coerce').fillna(0.0)
-
-    return df[columnas]
+def _leer_ventas_sin_cache():
+    return _construir_df("ventas", _documentos("ventas"))
 
-def leer_cobranza():
+def leer_ventas(desde=None, hasta=None):
+    """Todas las ventas, o solo las del rango desde/hasta (fechas inclusive)."""
+    if desde is not None or hasta is not None:
+        return _leer_por_rango("ventas", desde, hasta)
+    return _leer_con_cache("ventas", _leer_ventas_sin_cache)
+
+def _leer_transacciones_sin_cache():
+    return _construir_df("transacciones", _documentos("transacciones"))
+
+def leer_transacciones(desde=None, hasta=None):
+    """Todas las transacciones, o solo las del rango desde/hasta (fechas inclusive)."""
+    if desde is not None or hasta is not None:
+        return _leer_por_rango("transacciones", desde, hasta)
+    return _leer_con_cache("transacciones", _leer_transacciones_sin_cache)
+
+def _leer_cobranza_sin_cache():
     columnas = ["Fecha", "Cliente", "Descripción", "Monto", "Método de pago"]
-    ref = _coleccion_usuario("transacciones")
-    if not ref:
-        return pd.DataFrame(columns=columnas)
+    # Se filtra la copia local de transacciones en lugar de hacer otra consulta
+    cobranza = {
+        doc_id: data for doc_id, data in _documentos("transacciones").items()
+        if data.get("Categoría") == "Cobranza"
+    }
+    return _construir_df("transacciones", cobranza)[columnas]
 
-    docs = ref.where("Categoría", "==", "Cobranza").stream()
-    cobranza = []
-    for doc in docs:
-        data = doc.to_dict()
-        registro = {col: data.get(col, None) for col in columnas}
-        cobranza.append(registro)
+def leer_cobranza():
+    return _leer_con_cache("transacciones", _leer_cobranza_sin_cache, "cobranza")
+
+# ---------------------------
+# Consultas por cliente
+# ---------------------------
+def _leer_de_cliente(nombre_coleccion, cliente, campo, valores):
+    uid = _uid()
+    if not uid:
+        return _construir_df(nombre_coleccion, {})
 
-    df = pd.DataFrame(cobranza)
-    if "Monto" in df.columns:
-        df["Monto"] = pd.to_numeric(df["Monto"], errors='coerce').fillna(0.0)
+    def lector():
+        filtros = [("Cliente", "==", cliente)]
+        if valores:
+            filtros.append((campo, "in", list(valores)))
+        documentos = dict(backend.consultar(uid, nombre_coleccion, filtros, COLUMNAS[nombre_coleccion]))
+        logging.info(f"Lectura de '{nombre_coleccion}' del cliente '{cliente}': {len(documentos)} documentos.")
+        return _construir_df(nombre_coleccion, documentos)
 
-    return df
+    return _leer_con_cache(nombre_coleccion, lector, f"cliente:{cliente}:{sorted(valores or [])}")
+
+def leer_ventas_cliente(cliente, tipos=None):
+    """Ventas de un solo cliente; tipos limita por "Tipo de venta"."""
+    return _leer_de_cliente("ventas", cliente, "Tipo de venta", tipos)
 
-def calcular_balance_contable():
-    transacciones = leer_transacciones()
-    if transacciones.empty:
+def leer_transacciones_cliente(cliente, categorias=None):
+    """Transacciones de un solo cliente; categorias limita por "Categoría"."""
+    return _leer_de_cliente("transacciones", cliente, "Categoría", categorias)
+
+def calcular_balance_contable(desde=None, hasta=None, resumen=None):
+    """Ingresos, egresos y balance, del resumen diario (opcionalmente de un rango).
+
+    resumen, si la página ya lo leyó, es ese resumen diario y evita leerlo otra vez.
+    """
+    if resumen is None:
+        resumen = leer_resumen_diario_transacciones(desde, hasta)
+    if resumen.empty:
         return 0, 0, 0
-    transacciones['Monto'] = pd.to_numeric(transacciones['Monto'], errors='coerce').fillna(0)
-    ingresos = transacciones[transacciones['Tipo'] == 'Ingreso']['Monto'].sum()
-    egresos = transacciones[transacciones['Tipo'] == 'Egreso']['Monto'].sum()
+    por_tipo = resumen.groupby("Tipo", observed=True)["Monto"].sum()
+    ingresos = por_tipo.get("Ingreso", 0.0)
+    egresos = por_tipo.get("Egreso", 0.0)
     balance = ingresos - egresos
     return ingresos, egresos, balance
 
+def _leer_clientes_sin_cache():
+    return _construir_df("clientes", _documentos("clientes"), columna_id="ID")
+
 def leer_clientes():
-    columnas = ["ID", "Nombre", "Correo", "Teléfono", "Empresa", "RFC", "Límite de crédito"]
-    ref = _coleccion_usuario("clientes")
-    if not ref:
-        return pd.DataFrame(columns=columnas)
-
-    docs = ref.stream()
-    clientes = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["ID"] = doc.id
-        cliente_normalizado = {col: data.get(col, None) for col in columnas}
-        clientes.append(cliente_normalizado)
-
-    if not clientes:
-        return pd.DataFrame(columns=columnas)
-
-    df = pd.DataFrame(clientes)
-    for col in columnas:
-        if col not in df.columns:
-            df[col] = None
-    if "Límite de crédito" in df.columns:
-        df["Límite de crédito"] = pd.to_numeric(df["Límite de crédito"], errors='coerce').fillna(0.0)
-
-    return df[columnas]
+    return _leer_con_cache("clientes", _leer_clientes_sin_cache)
+
+# ---------------------------
+# Filas por clave
+# ---------------------------
+# Buscar "la fila del producto seleccionado" con una máscara recorre toda la
+# colección en cada rerun. Cada (colección, columna) tiene un diccionario
+# valor -> posición en la lectura completa en caché, armado una vez por
+# entrada y compartido por todos los módulos y sesiones. Se guarda como
+# derivado de esa entrada (ver CacheLecturas): vence con su TTL, sale con ella
+# por LRU y una escritura lo descarta.
+def _derivado(uid, nombre_coleccion, nombre, construir, vigente=None):
+    """(df, construir(df, versión)) de la lectura completa en caché, calculado
+    una vez por entrada. vigente(valor, versión), si se da, decide si un
+    derivado conservado tras una escritura sigue sirviendo."""
+    actual = _cache_lecturas.derivado(uid, nombre_coleccion, nombre)
+    if actual is None:
+        df = LECTORES[nombre_coleccion]()  # Deja la lectura en caché
+        actual = _cache_lecturas.derivado(uid, nombre_coleccion, nombre)
+        if actual is None:  # Caché apagada o lectura servida por la unidad de trabajo
+            return df, construir(df, _cache_lecturas.version(uid, nombre_coleccion))
+    version, df, valor = actual
+    if valor is None or (vigente is not None and not vigente(valor, version)):
+        valor = construir(df, version)
+        _cache_lecturas.adjuntar(uid, nombre_coleccion, version, nombre, valor)
+    return df, valor
+
+def _posiciones(df, columna):
+    posiciones = {}
+    for posicion, valor in enumerate(df[columna].tolist()):
+        posiciones.setdefault(valor, posicion)  # Con repetidos, la primera (como .iloc[0])
+    return posiciones
+
+def _indice_filas(uid, nombre_coleccion, columna):
+    """(df, {valor: posición}) de la lectura completa en caché."""
+    return _derivado(uid, nombre_coleccion, f"filas:{columna}", lambda df, _: _posiciones(df, columna))
+
+def fila_por(nombre_coleccion, columna, valor):
+    """Primera fila (Series) de la colección con columna == valor, o None.
+
+    La fila es de un DataFrame compartido: no debe modificarse.
+    """
+    uid = _uid()
+    if not uid:
+        return None
+    df, posiciones = _indice_filas(uid, nombre_coleccion, columna)
+    posicion = posiciones.get(valor)
+    return None if posicion is None else df.iloc[posicion]
+
+# ---------------------------
+# Búsqueda en catálogo y clientes
+# ---------------------------
+# Colección -> (columna clave, campos buscables); ver utils/busqueda.py
+CAMPOS_BUSQUEDA = {
+    "productos": ("Clave", ["Clave", "Nombre", "Marca_Tipo", "Modelo", "Color", "Talla"]),
+    "clientes": ("ID", ["Nombre", "Empresa", "RFC", "Correo"]),
+}
+# Máximo de coincidencias que muestran las pantallas; la descarga lleva todas
+LIMITE_BUSQUEDA = int(os.getenv("ERP_LIMITE_BUSQUEDA", "200"))
+# El índice es un derivado de la lectura completa en caché, como las filas por
+# clave, pero una escritura lo conserva (ver _parchar) y _indexar lo pone al día
+DERIVADO_BUSQUEDA = "busqueda"
+
+def _armar_indice_busqueda(nombre_coleccion, df, version):
+    inicio = time.perf_counter()
+    columna_clave, campos = CAMPOS_BUSQUEDA[nombre_coleccion]
+    indice = IndiceBusqueda.desde_df(df, columna_clave, campos, version)
+    logging.info(
+        f"Índice de búsqueda de '{nombre_coleccion}': {len(indice)} registros en "
+        f"{time.perf_counter() - inicio:.2f} s."
+    )
+    return indice
+
+def _indice_busqueda(uid, nombre_coleccion):
+    """El índice de la versión vigente de la colección; si no la tiene, se arma."""
+    return _derivado(
+        uid, nombre_coleccion, DERIVADO_BUSQUEDA,
+        lambda df, version: _armar_indice_busqueda(nombre_coleccion, df, version),
+        vigente=lambda indice, version: indice.version == version,
+    )[1]
+
+def _indexar(uid, nombre_coleccion, clave=None, datos=None):
+    """Lleva una escritura ya parchada al índice de búsqueda, sin reconstruirlo.
+
+    datos None con clave quita el registro; sin clave solo se toma la nueva
+    versión (cambió algo que no se busca). Si entre tanto hubo otra escritura,
+    el índice queda viejo y se reconstruye en la siguiente búsqueda.
+    """
+    actual = _cache_lecturas.derivado(uid, nombre_coleccion, DERIVADO_BUSQUEDA)
+    if actual is None or actual[2] is None:
+        return
+    version, _, indice = actual
+    if indice.version != version - 1:
+        return
+    if clave is None:
+        indice.version = version
+    elif datos is None:
+        indice.quitar(clave, version)
+    else:
+        indice.agregar(clave, datos, version)
+
+def buscar(nombre_coleccion, consulta, limite=None):
+    """Claves (Clave de productos, ID de clientes) que contienen todas las
+    palabras de consulta en sus campos buscables; None si la consulta está vacía."""
+    uid = _uid()
+    if not uid or not consulta.strip():
+        return None
+    return _indice_busqueda(uid, nombre_coleccion).buscar(consulta, limite)
+
+def filtrar_por_busqueda(nombre_coleccion, df, consulta, limite=None):
+    """Filas de df (leído de la colección) que coinciden con consulta, a lo
+    más limite; todo df si la consulta está vacía.
+
+    Las claves encontradas se convierten en posiciones con el índice de filas
+    de la lectura en caché; si df no es esa lectura se filtra con isin."""
+    claves = buscar(nombre_coleccion, consulta, limite)
+    if claves is None:
+        return df
+    columna_clave = CAMPOS_BUSQUEDA[nombre_coleccion][0]
+    leido, posiciones = _indice_filas(_uid(), nombre_coleccion, columna_clave)
+    filas = sorted(posiciones[c] for c in claves if c in posiciones)
+    # Revisar solo las filas encontradas basta para saber si df está alineado
+    alineado = len(df) == len(leido) and len(filas) == len(claves) and (
+        df[columna_clave].to_numpy()[filas] == leido[columna_clave].to_numpy()[filas]).all()
+    if alineado:
+        return df.iloc[filas]
+    return df[df[columna_clave].isin(claves)]
+
+# ---------------------------
+# Carga concurrente de colecciones
+# ---------------------------
+# Una página pide de una vez todo lo que necesita; cada colección se lee en su
+# propio hilo y la página espera solo a la más lenta.
+HILOS_CARGA = int(os.getenv("ERP_HILOS_CARGA", "6"))
+_pool_carga = None
+_tiempos_carga = {}  # colección -> segundos de su última carga
+
+LECTORES = {
+    "ventas": leer_ventas,
+    "transacciones": leer_transacciones,
+    "clientes": leer_clientes,
+    "productos": leer_productos,
+    "cobranza": leer_cobranza,
+    COLECCION_SALDOS: leer_saldos_clientes,
+    DIARIO_TRANSACCIONES: leer_resumen_diario_transacciones,
+    DIARIO_VENTAS: leer_resumen_diario_ventas,
+}
+
+def _pool_colecciones():
+    # Aparte del pool de particiones: una carga puede esperar a sus intervalos
+    global _pool_carga
+    with _lock_pool:
+        if _pool_carga is None:
+            _pool_carga = ThreadPoolExecutor(max_workers=HILOS_CARGA, thread_name_prefix="carga")
+        return _pool_carga
+
+def _leer_en_hilo(uid, unidad, nombre):
+    _hilo.uid, _hilo.unidad = uid, unidad
+    inicio = time.perf_counter()
+    try:
+        return LECTORES[nombre](), time.perf_counter() - inicio
+    finally:
+        _hilo.uid = _hilo.unidad = None
+
+def cargar_colecciones(*nombres):
+    """{nombre: DataFrame} de cada lector de LECTORES, leídos a la vez.
+
+    Regresa lo mismo que llamar a cada leer_* por separado (con su caché).
+    """
+    uid = _uid()
+    if not uid or len(nombres) <= 1:
+        return {nombre: LECTORES[nombre]() for nombre in nombres}
+
+    inicio = time.perf_counter()
+    futuros = {nombre: _pool_colecciones().submit(_leer_en_hilo, uid, _unidad(), nombre) for nombre in nombres}
+    resultados = {}
+    for nombre, futuro in futuros.items():
+        resultados[nombre], _tiempos_carga[nombre] = futuro.result()
+    logging.info(
+        f"Carga de {len(nombres)} colecciones en {time.perf_counter() - inicio:.2f} s: "
+        + ", ".join(f"{nombre} {_tiempos_carga[nombre]:.2f} s" for nombre in nombres)
+    )
+    return resultados
+
+def tiempos_carga():
+    """Segundos de la última carga concurrente de cada colección."""
+    return dict(_tiempos_carga)
+
+# ---------------------------
+# Escrituras optimistas
+# ---------------------------
+# Una escritura confirmada se aplica directo a la lectura completa en caché
+# (ver CacheLecturas.parchar) en lugar de descartarla: la siguiente lectura no
+# consulta la base ni reconstruye la colección. Después, en segundo plano, se
+# relee la colección (solo lo que cambió, ver SincronizadorDelta) y si no
+# coincide con la copia parchada (otra instancia escribió, un incremento se
+# cruzó con otra caja) se descarta y se registra la diferencia; la siguiente
+# lectura se arma de la copia local ya sincronizada.
+#
+# Las escrituras (guardar_*, registrar_*, actualizar_*, eliminar_*) regresan
+# (id, datos): el id del documento principal y los campos que la llamada le
+# mandó, o None si no se escribió nada (sin sesión, clave inexistente). datos
+# no es el documento guardado: no trae los campos que pone la base
+# (_actualizado, FechaDia) ni el resultado de los incrementos; un borrado
+# regresa datos None.
+_LECTORES_BASE = {
+    "ventas": _leer_ventas_sin_cache,
+    "transacciones": _leer_transacciones_sin_cache,
+    "clientes": _leer_clientes_sin_cache,
+    "productos": _leer_productos_sin_cache,
+}
+_pool_reconciliacion = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reconciliacion")
+_reconciliaciones_pendientes = set()  # (uid, colección)
+_lock_reconciliacion = threading.Lock()
+_divergencias = {}  # colección -> reconciliaciones que encontraron diferencias
+_COLUMNAS_ID = {"clientes": "ID"}  # Colecciones cuyo DataFrame lleva el id del documento
+
+def _parchar(nombre_coleccion, parche):
+    """Como _invalidar(), pero la lectura completa en caché pasa por parche en
+    lugar de descartarse, y se programa su reconciliación."""
+    uid = _uid_sesion()
+    if not uid:
+        return
+    try:
+        version = _cache_lecturas.parchar(uid, nombre_coleccion, parche, conservar=(DERIVADO_BUSQUEDA,))
+    except Exception:  # La escritura ya se confirmó; sin parche se relee de la base
+        logging.exception(f"No se pudo aplicar la escritura a la copia de '{nombre_coleccion}'.")
+        version = None
+    if _unidad() is not None:
+        _unidad().registrar_escritura(uid, nombre_coleccion)
+    if version is not None:
+        _programar_reconciliacion(uid, nombre_coleccion)
+
+def _anexar(nombre_coleccion, documentos):
+    """Parche que agrega al final las filas de {id: datos}."""
+    def parche(df):
+        nuevas = _construir_df(nombre_coleccion, documentos, _COLUMNAS_ID.get(nombre_coleccion))
+        if df.empty:  # Vacío no trae los tipos del esquema y concat los perdería
+            return nuevas
+        return aplicar_esquema(nombre_coleccion, pd.concat([df, nuevas], ignore_index=True))
+    return parche
+
+def _fusionar(nombre_coleccion, columna, valor, datos=None, incrementos=None, alta=None):
+    """Parche que mezcla datos y suma incrementos en la fila con columna == valor.
+
+    Si la fila no está y se da alta ({id: datos completos}), se agrega.
+    """
+    numericas = COLUMNAS_NUMERICAS[nombre_coleccion]
+
+    def parche(df):
+        filas = df.index[(df[columna] == valor).to_numpy()]
+        if filas.empty:
+            if alta is None:
+                raise KeyError(f"'{valor}' no está en la copia de '{nombre_coleccion}'")
+            return _anexar(nombre_coleccion, alta)(df)
+        df = df.copy()
+        for campo, nuevo in (datos or {}).items():
+            if campo in df.columns:
+                df.at[filas[0], campo] = (
+                    float(nuevo or 0) if campo in numericas else "" if nuevo is None else str(nuevo))
+        for campo, delta in (incrementos or {}).items():
+            df.at[filas[0], campo] = float(df.at[filas[0], campo]) + delta
+        return df
+    return parche
+
+def _quitar_fila(nombre_coleccion, columna, valor):
+    def parche(df):
+        return df[(df[columna] != valor).to_numpy()].reset_index(drop=True)
+    return parche
+
+def _programar_reconciliacion(uid, nombre_coleccion):
+    with _lock_reconciliacion:
+        if (uid, nombre_coleccion) in _reconciliaciones_pendientes:
+            return  # La que ya está en cola verá también esta escritura
+        _reconciliaciones_pendientes.add((uid, nombre_coleccion))
+    _pool_reconciliacion.submit(_reconciliar, uid, nombre_coleccion)
+
+def _mismas_filas(a, b):
+    # La sincronización no garantiza el orden de los documentos nuevos
+    if a.shape != b.shape or list(a.columns) != list(b.columns):
+        return False
+    columnas = list(a.columns)
+    return a.sort_values(columnas, ignore_index=True).equals(b.sort_values(columnas, ignore_index=True))
+
+def _reconciliar(uid, nombre_coleccion):
+    with _lock_reconciliacion:
+        _reconciliaciones_pendientes.discard((uid, nombre_coleccion))
+    _hilo.uid = uid
+    try:
+        # Un segundo intento: la base pudo traer una escritura de esta
+        # instancia cuyo parche se estaba aplicando
+        for _ in range(2):
+            actual = _cache_lecturas.vigente(uid, nombre_coleccion)
+            if actual is None:
+                return  # Ya se descartó: la siguiente lectura va a la base
+            version, parchado = actual
+            if _mismas_filas(_LECTORES_BASE[nombre_coleccion](), parchado):
+                return
+        # Se descarta en lugar de reemplazar: si la base ya trae una escritura
+        # cuyo parche aún no se aplica, el parche caería sobre ella dos veces
+        if _cache_lecturas.descartar(uid, nombre_coleccion, version):
+            _divergencias[nombre_coleccion] = _divergencias.get(nombre_coleccion, 0) + 1
+            logging.warning(
+                f"Reconciliación de '{nombre_coleccion}': la copia en caché no coincidía con la base; "
+                "se descartó."
+            )
+    except Exception:
+        logging.exception(f"Falló la reconciliación de '{nombre_coleccion}'.")
+    finally:
+        _hilo.uid = None
+
+def esperar_reconciliaciones():
+    """Bloquea hasta que terminen las reconciliaciones en cola (mediciones, pruebas)."""
+    _pool_reconciliacion.submit(lambda: None).result()
+
+def divergencias():
+    """Reconciliaciones que encontraron la caché distinta a la base, por colección."""
+    return dict(_divergencias)
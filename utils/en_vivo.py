@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+
+# ---------------------------
+# Colección materializada por on_snapshot
+# ---------------------------
+class ColeccionEnVivo:
+    """Mantiene {id: datos} al día con una sola suscripción on_snapshot.
+
+    Firestore invoca el callback en un hilo propio, sin acceso a
+    st.session_state, por eso todo lo que necesita se recibe al construirla.
+    """
+
+    def __init__(self, ref, al_cambiar=None, espera_segundos=30):
+        self.documentos = {}
+        self.version = 0
+        self.espera_segundos = espera_segundos
+        self._al_cambiar = al_cambiar
+        self._lock = threading.Lock()
+        self._listo = threading.Event()
+        self._suscripcion = ref.on_snapshot(self._recibir)
+
+    def _recibir(self, snapshots, cambios, read_time):
+        with self._lock:
+            for cambio in cambios:
+                if cambio.type.name == "REMOVED":
+                    self.documentos.pop(cambio.document.id, None)
+                else:
+                    self.documentos[cambio.document.id] = cambio.document.to_dict()
+            self.version += 1
+        self._listo.set()
+        if self._al_cambiar:
+            self._al_cambiar()
+
+    def documentos_actuales(self):
+        if not self._listo.wait(self.espera_segundos):
+            logging.warning("La suscripción en vivo no entregó su primera instantánea a tiempo.")
+        with self._lock:
+            return dict(self.documentos)
+
+    def cerrar(self):
+        self._suscripcion.unsubscribe()
+
+
+# ---------------------------
+# Registro de suscripciones del proceso
+# ---------------------------
+class RegistroEnVivo:
+    """Una suscripción por (uid, colección), compartida por todas las pestañas.
+
+    Streamlit no avisa cuando termina la última sesión de un usuario: una
+    suscripción que nadie pide en inactividad_segundos se cierra desde un hilo
+    que revisa periódicamente, y si se vuelve a pedir se abre otra. Las
+    lecturas en caché no la piden, así que inactividad_segundos debe ser mayor
+    que el TTL de CacheLecturas. Con 0 no se cierran solas.
+    """
+
+    def __init__(self, inactividad_segundos=900):
+        self.inactividad_segundos = inactividad_segundos
+        self._colecciones = {}
+        self._ultimo_uso = {}  # (uid, colección) -> time.monotonic() del último obtener()
+        self._lock = threading.Lock()
+        self._revisor = None
+
+    def obtener(self, uid, coleccion, ref, al_cambiar=None):
+        with self._lock:
+            if (uid, coleccion) not in self._colecciones:
+                self._colecciones[(uid, coleccion)] = ColeccionEnVivo(ref, al_cambiar)
+                logging.info(f"Suscripción en vivo a '{coleccion}' iniciada.")
+            self._ultimo_uso[(uid, coleccion)] = time.monotonic()
+            if self._revisor is None and self.inactividad_segundos > 0:
+                self._revisor = threading.Thread(target=self._revisar, name="en_vivo_inactivas", daemon=True)
+                self._revisor.start()
+            return self._colecciones[(uid, coleccion)]
+
+    def _revisar(self):
+        while True:
+            time.sleep(max(self.inactividad_segundos / 4, 1))
+            self.cerrar_inactivas()
+
+    def cerrar_inactivas(self):
+        """Cierra las suscripciones sin uso en inactividad_segundos; regresa cuántas."""
+        limite = time.monotonic() - self.inactividad_segundos
+        with self._lock:
+            claves = [c for c, uso in self._ultimo_uso.items() if uso < limite]
+            inactivas = [(c, self._colecciones.pop(c)) for c in claves]
+            for clave in claves:
+                del self._ultimo_uso[clave]
+        for (_, coleccion), suscripcion in inactivas:
+            suscripcion.cerrar()
+            logging.info(f"Suscripción en vivo a '{coleccion}' cerrada por inactividad.")
+        return len(inactivas)
+
+    def cerrar(self, uid=None):
+        with self._lock:
+            for clave in [c for c in self._colecciones if uid is None or c[0] == uid]:
+                self._colecciones.pop(clave).cerrar()
+                self._ultimo_uso.pop(clave, None)
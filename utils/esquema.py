@@ -0,0 +1,84 @@
+import pandas as pd
+
+from utils.resumenes import DIARIO_TRANSACCIONES, DIARIO_VENTAS
+from utils.saldos import COLECCION_SALDOS
+
+try:
+    import pyarrow  # noqa: F401
+    TEXTO = pd.StringDtype("pyarrow")
+except ImportError:  # Sin pyarrow se usa el string de pandas, igual de tipado
+    TEXTO = pd.StringDtype("python")
+
+
+# ---------------------------
+# Esquema tipado por colección
+# ---------------------------
+# _construir_df() entrega cada colección ya tipada: Fecha se interpreta una
+# sola vez, los campos con pocos valores distintos (clientes, productos,
+# categorías, métodos de pago) van como category y el texto libre como string,
+# con "" en lugar de faltantes (como los guardan los formularios y para que los
+# widgets de edición no reciban pd.NA).
+# Las numéricas se convierten aparte (COLUMNAS_NUMERICAS en utils/db.py).
+#
+# Los campos que las pantallas editan en sitio (.at[...] = nuevo valor) no
+# deben ser category: asignar un valor fuera de sus categorías falla.
+
+ESQUEMAS = {
+    "ventas": {
+        "fechas": ["Fecha"],
+        "categorias": ["Cliente", "Producto", "Método de pago", "Tipo de venta"],
+    },
+    "transacciones": {
+        "fechas": ["Fecha"],
+        "categorias": ["Cliente", "Categoría", "Tipo", "Método de pago"],
+        "texto": ["Descripción"],
+    },
+    "clientes": {
+        "texto": ["ID", "Nombre", "Correo", "Teléfono", "Empresa", "RFC"],
+    },
+    "productos": {
+        "texto": ["Clave", "Nombre", "Marca_Tipo", "Modelo", "Color", "Talla", "Categoría", "Descripción"],
+    },
+    COLECCION_SALDOS: {
+        "texto": ["Cliente"],
+    },
+    DIARIO_TRANSACCIONES: {
+        "fechas": ["Fecha"],
+        "categorias": ["Tipo", "Categoría"],
+    },
+    DIARIO_VENTAS: {
+        "fechas": ["Fecha"],
+    },
+}
+
+
+def convertir_fechas(serie):
+    """Texto ISO (con o sin hora) o datetime -> datetime64 sin zona; lo inválido queda NaT."""
+    if pd.api.types.is_datetime64_any_dtype(serie) and getattr(serie.dt, "tz", None) is None:
+        return serie
+    fechas = pd.to_datetime(serie, format="ISO8601", errors="coerce", utc=True)
+    return fechas.dt.tz_localize(None)
+
+
+def aplicar_esquema(nombre_coleccion, df):
+    """Regresa df con los tipos de ESQUEMAS[nombre_coleccion]; las columnas
+    ausentes se ignoran."""
+    esquema = ESQUEMAS.get(nombre_coleccion)
+    if not esquema:
+        return df
+    tipos = {}
+    for col in esquema.get("fechas", []):
+        if col in df.columns:
+            tipos[col] = convertir_fechas(df[col])
+    for col in esquema.get("categorias", []):
+        if col in df.columns:
+            tipos[col] = df[col].astype("category")
+    for col in esquema.get("texto", []):
+        if col in df.columns:
+            tipos[col] = df[col].astype(TEXTO).fillna("")
+    return df.assign(**tipos)
+
+
+def bytes_en_memoria(df):
+    """Memoria que ocupa df, contando el contenido de las cadenas."""
+    return int(df.memory_usage(deep=True).sum())
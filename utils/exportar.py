@@ -0,0 +1,292 @@
+import functools
+import io
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+import streamlit as st
+import xlsxwriter
+
+from utils.db import COLUMNAS, contar_documentos, exportacion_diferida, leer_por_paginas
+from utils.esquema import TEXTO
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow es opcional; sin él no se ofrece Parquet
+    pyarrow = None
+
+
+# ---------------------------
+# Exportación de tablas
+# ---------------------------
+# Los botones de descarga reciben un callable: el archivo se arma solo cuando
+# alguien lo pide y queda guardado por versión de datos y filtro (ver
+# exportacion_diferida en utils/db.py), en lugar de generarse en cada rerun.
+
+FORMATOS = {
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+EXCEL_MAX_FILAS = 1_048_575  # Filas de datos por hoja (la primera es el encabezado)
+_FILAS_POR_BLOQUE = 10_000
+# constant_memory: xlsxwriter solo mantiene en memoria la fila en curso
+_OPCIONES_EXCEL = {
+    "constant_memory": True,
+    "default_date_format": "yyyy-mm-dd",
+    "remove_timezone": True,
+    "nan_inf_to_errors": True,
+}
+
+
+def _filas(df):
+    """Filas de df como tuplas de valores nativos, con None en los faltantes."""
+    for inicio in range(0, len(df), _FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + _FILAS_POR_BLOQUE].astype(object)
+        yield from bloque.where(bloque.notna(), None).itertuples(index=False, name=None)
+
+
+def a_excel(hojas):
+    """{nombre de hoja: DataFrame} -> bytes de un .xlsx.
+
+    Se escribe fila por fila con constant_memory; por eso no se usa
+    df.to_excel (que escribe por columnas).
+    """
+    salida = io.BytesIO()
+    libro = xlsxwriter.Workbook(salida, _OPCIONES_EXCEL)
+    encabezado = libro.add_format({"bold": True})
+    for nombre, df in hojas.items():
+        hoja = libro.add_worksheet(str(nombre)[:31])
+        hoja.write_row(0, 0, [str(c) for c in df.columns], encabezado)
+        for fila, valores in enumerate(_filas(df), start=1):
+            hoja.write_row(fila, 0, valores)
+    libro.close()
+    return salida.getvalue()
+
+
+def a_csv(df):
+    # utf-8-sig para que Excel reconozca los acentos al abrirlo
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def a_parquet(df):
+    salida = io.BytesIO()
+    df.to_parquet(salida, index=False)
+    return salida.getvalue()
+
+
+def generar(hojas, formato):
+    """Bytes del archivo; CSV y Parquet toman solo la primera hoja."""
+    if formato == "xlsx":
+        return a_excel(hojas)
+    df = next(iter(hojas.values()))
+    if formato == "csv":
+        return a_csv(df)
+    if formato == "parquet":
+        return a_parquet(df)
+    raise ValueError(f"Formato de exportación desconocido: {formato}")
+
+
+def botones_descarga(etiqueta, hojas, nombre_archivo, colecciones, *parametros, formatos=("xlsx",)):
+    """Un botón de descarga por formato; el archivo se genera al hacer clic.
+
+    hojas es {nombre: DataFrame} o una función sin argumentos que lo regresa,
+    para no leer los datos hasta que se pidan. colecciones y parametros (el
+    filtro aplicado) forman la clave con la que se guarda el archivo generado.
+    Excel se omite si alguna hoja rebasa el límite de filas (solo se revisa
+    con DataFrames ya leídos), y Parquet si no está pyarrow.
+    """
+    leer_hojas = hojas if callable(hojas) else lambda: hojas
+    if "xlsx" in formatos and not callable(hojas) and any(len(df) > EXCEL_MAX_FILAS for df in hojas.values()):
+        st.caption("Demasiadas filas para Excel; descarga en CSV o Parquet.")
+        formatos = [f for f in formatos if f != "xlsx"]
+    if pyarrow is None:
+        formatos = [f for f in formatos if f != "parquet"]
+    if not formatos:
+        return
+
+    columnas = st.columns(len(formatos)) if len(formatos) > 1 else [st.container()]
+    for columna, formato in zip(columnas, formatos):
+        nombre_formato, mime = FORMATOS[formato]
+        datos = exportacion_diferida(
+            f"exportar:{nombre_archivo}:{formato}", colecciones, lambda f=formato: generar(leer_hojas(), f), *parametros)
+        columna.download_button(
+            label=f"{etiqueta} ({nombre_formato})",
+            data=datos,
+            file_name=f"{nombre_archivo}.{formato}",
+            mime=mime,
+        )
+
+
+# ---------------------------
+# Exportación por páginas
+# ---------------------------
+# Para historiales completos: las páginas de leer_por_paginas() se escriben al
+# archivo conforme llegan, así que la memoria no crece con el historial.
+class _EscritorExcel:
+    def __init__(self, destino, columnas):
+        self._libro = xlsxwriter.Workbook(destino, _OPCIONES_EXCEL)
+        self._encabezado = self._libro.add_format({"bold": True})
+        self._columnas = [str(c) for c in columnas]
+        self._hojas = 0
+        self._nueva_hoja()
+
+    def _nueva_hoja(self):
+        # Al llegar al límite de filas de Excel se continúa en otra hoja
+        self._hojas += 1
+        nombre = "Datos" if self._hojas == 1 else f"Datos ({self._hojas})"
+        self._hoja = self._libro.add_worksheet(nombre)
+        self._hoja.write_row(0, 0, self._columnas, self._encabezado)
+        self._fila = 1
+
+    def escribir(self, df):
+        for valores in _filas(df):
+            if self._fila > EXCEL_MAX_FILAS:
+                self._nueva_hoja()
+            self._hoja.write_row(self._fila, 0, valores)
+            self._fila += 1
+
+    def cerrar(self):
+        self._libro.close()
+
+
+class _EscritorCsv:
+    def __init__(self, destino, columnas):
+        self._archivo = open(destino, "w", encoding="utf-8-sig", newline="")
+        pd.DataFrame(columns=columnas).to_csv(self._archivo, index=False)
+
+    def escribir(self, df):
+        df.to_csv(self._archivo, index=False, header=False)
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class _EscritorParquet:
+    """Un row group por página. El esquema sale de la primera página: fechas,
+    numéricas y el resto como texto (las categorías de cada página difieren)."""
+
+    def __init__(self, destino, columnas):
+        self._destino = destino
+        self._columnas = columnas
+        self._escritor = None
+
+    @staticmethod
+    def _tipo(serie):
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return pyarrow.timestamp("us")
+        if pd.api.types.is_float_dtype(serie):
+            return pyarrow.float64()
+        return pyarrow.string()
+
+    def _tabla(self, df):
+        esquema = self._escritor.schema
+        columnas = []
+        for campo in esquema:
+            serie = df[campo.name]
+            if campo.type == pyarrow.string():
+                serie = serie.astype(TEXTO)
+            columnas.append(pyarrow.array(serie, type=campo.type, from_pandas=True))
+        return pyarrow.Table.from_arrays(columnas, schema=esquema)
+
+    def escribir(self, df):
+        if self._escritor is None:
+            esquema = pyarrow.schema([(c, self._tipo(serie)) for c, serie in df.items()])
+            self._escritor = pyarrow.parquet.ParquetWriter(self._destino, esquema)
+        self._escritor.write_table(self._tabla(df))
+
+    def cerrar(self):
+        if self._escritor is None:
+            self.escribir(pd.DataFrame({c: pd.Series(dtype=object) for c in self._columnas}))
+        self._escritor.close()
+
+
+_ESCRITORES = {"xlsx": _EscritorExcel, "csv": _EscritorCsv, "parquet": _EscritorParquet}
+
+
+# Archivos del historial completo: se borran al generar otro si pasaron
+# ERP_EXPORTACION_MINUTOS, aunque la sesión que los pidió ya haya terminado
+DIRECTORIO_EXPORTACIONES = os.path.join(tempfile.gettempdir(), "erp_exportaciones")
+MINUTOS_EXPORTACION = float(os.getenv("ERP_EXPORTACION_MINUTOS", "60"))
+
+
+def _barrer_exportaciones():
+    limite = time.time() - MINUTOS_EXPORTACION * 60
+    for entrada in os.scandir(DIRECTORIO_EXPORTACIONES):
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+        except OSError as e:  # Otra sesión lo borró o lo está escribiendo
+            logging.warning(f"No se pudo borrar la exportación '{entrada.path}': {e}")
+
+
+def _leer_archivo(ruta):
+    with open(ruta, "rb") as archivo:
+        return archivo.read()
+
+
+def exportar_por_paginas(paginas, columnas, destino, formato, al_avanzar=None):
+    """Escribe en la ruta destino cada DataFrame de paginas conforme llega.
+
+    al_avanzar(filas), si se da, recibe las filas escritas hasta el momento.
+    Regresa el total de filas.
+    """
+    escritor = _ESCRITORES[formato](destino, columnas)
+    filas = 0
+    try:
+        for pagina in paginas:
+            escritor.escribir(pagina[columnas])
+            filas += len(pagina)
+            if al_avanzar:
+                al_avanzar(filas)
+    finally:
+        escritor.cerrar()
+    return filas
+
+
+def exportar_historial(nombre_coleccion, etiqueta, nombre_archivo):
+    """Sección para descargar la colección completa, leída por páginas.
+
+    El archivo queda en un temporal del servidor (uno por sesión y colección)
+    y se entrega al pedir la descarga; los de más de MINUTOS_EXPORTACION se
+    borran cuando cualquier sesión genera uno nuevo.
+    """
+    formatos = [f for f in FORMATOS if f != "parquet" or pyarrow is not None]
+    formato = st.selectbox("Formato", formatos, format_func=lambda f: FORMATOS[f][0],
+                           key=f"exportar_historial_formato_{nombre_coleccion}")
+    clave = f"exportar_historial_{nombre_coleccion}"
+
+    if st.button(f"Generar {etiqueta}", key=f"{clave}_generar"):
+        anterior = st.session_state.pop(clave, None)
+        if anterior and os.path.exists(anterior[0]):
+            os.remove(anterior[0])
+        total = contar_documentos(nombre_coleccion)
+        progreso = st.progress(0.0, text=f"0 de {total:,} filas")
+
+        def al_avanzar(filas):
+            progreso.progress(min(filas / total, 1.0) if total else 1.0, text=f"{filas:,} de {total:,} filas")
+
+        os.makedirs(DIRECTORIO_EXPORTACIONES, exist_ok=True)
+        _barrer_exportaciones()
+        descriptor, ruta = tempfile.mkstemp(
+            prefix=f"{nombre_archivo}_", suffix=f".{formato}", dir=DIRECTORIO_EXPORTACIONES)
+        os.close(descriptor)
+        filas = exportar_por_paginas(
+            leer_por_paginas(nombre_coleccion), COLUMNAS[nombre_coleccion], ruta, formato, al_avanzar)
+        progreso.progress(1.0, text=f"{filas:,} filas exportadas")
+        st.session_state[clave] = (ruta, formato)
+
+    if clave in st.session_state:
+        ruta, formato_generado = st.session_state[clave]
+        if os.path.exists(ruta):
+            nombre_formato, mime = FORMATOS[formato_generado]
+            st.download_button(
+                label=f"📥 Descargar {etiqueta} ({nombre_formato})",
+                data=functools.partial(_leer_archivo, ruta),
+                file_name=f"{nombre_archivo}.{formato_generado}",
+                mime=mime,
+                key=f"{clave}_descargar",
+            )
@@ -0,0 +1,415 @@
+import copy
+import datetime
+import functools
+import itertools
+import math
+import random
+import string
+import threading
+import time
+from types import SimpleNamespace
+
+from firebase_admin import firestore
+from google.api_core import exceptions
+
+
+# ---------------------------
+# Cliente Firestore en memoria
+# ---------------------------
+# Implementa el subconjunto de la API de firestore.client() que usa utils/db.py,
+# incluyendo on_snapshot y transacciones, para probar y medir la app sin red:
+#
+#     from utils import db
+#     from utils.firestore_memoria import ClienteMemoria
+#     db.usar_backend(FirestoreBackend(ClienteMemoria()))
+#
+# latencia_segundos simula el viaje de red de cada llamada (lectura, consulta,
+# escritura o commit de un lote) para medir cuántos viajes cuesta cada operación.
+# latencia_pagina_segundos se suma por cada tamano_pagina documentos que
+# regresa una consulta, como los lotes sucesivos de un stream de Firestore.
+
+# Ids automáticos como los de Firestore: 20 caracteres alfanuméricos
+_ALFABETO_IDS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+_OPERADORES = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def _resolver_centinelas(datos, actuales=None):
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    resueltos = {}
+    for campo, valor in datos.items():
+        if valor is firestore.SERVER_TIMESTAMP:
+            valor = ahora
+        elif isinstance(valor, firestore.Increment):
+            valor = ((actuales or {}).get(campo) or 0) + valor.value
+        resueltos[campo] = valor
+    return resueltos
+
+
+class DocumentoSnapshot:
+    def __init__(self, referencia, datos):
+        self.reference = referencia
+        self.id = referencia.id
+        self._datos = datos
+
+    @property
+    def exists(self):
+        return self._datos is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._datos) if self._datos is not None else None
+
+    def get(self, campo):
+        return (self._datos or {}).get(campo)
+
+
+class ReferenciaDocumento:
+    def __init__(self, cliente, ruta_coleccion, doc_id):
+        self._cliente = cliente
+        self._ruta_coleccion = ruta_coleccion
+        self.id = doc_id
+
+    def collection(self, nombre):
+        return ReferenciaColeccion(self._cliente, f"{self._ruta_coleccion}/{self.id}/{nombre}")
+
+    def get(self, transaction=None):
+        return self._cliente._leer(self._ruta_coleccion, self.id, self, transaction)
+
+    def set(self, datos, merge=False):
+        self._cliente._escribir(self._ruta_coleccion, self.id, datos, combinar=merge, exigir=False)
+
+    def create(self, datos):
+        self._cliente._crear(self._ruta_coleccion, self.id, datos)
+
+    def update(self, datos):
+        self._cliente._escribir(self._ruta_coleccion, self.id, datos, combinar=True, exigir=True)
+
+    def delete(self):
+        self._cliente._borrar(self._ruta_coleccion, self.id)
+
+
+class Consulta:
+    def __init__(self, coleccion, filtros=(), limite=None, proyeccion=None, orden=(), inicio=None, fin=None):
+        self._coleccion = coleccion
+        self._filtros = list(filtros)
+        self._limite = limite
+        self._proyeccion = proyeccion
+        # [(campo, descendente)]; "__name__" es el id del documento
+        self._orden = list(orden)
+        # Cursores: (valores de los campos de orden, incluye esos valores)
+        self._inicio = inicio
+        self._fin = fin
+
+    def _copiar(self, **cambios):
+        actual = {
+            "filtros": self._filtros, "limite": self._limite, "proyeccion": self._proyeccion,
+            "orden": self._orden, "inicio": self._inicio, "fin": self._fin,
+        }
+        return Consulta(self._coleccion, **{**actual, **cambios})
+
+    def _comparar(self, valores, otros):
+        """-1, 0 o 1 según el orden de la consulta; compara solo los campos que traen ambos."""
+        for valor, otro, (_, descendente) in zip(valores, otros, self._orden):
+            if valor != otro:
+                resultado = -1 if valor < otro else 1
+                return -resultado if descendente else resultado
+        return 0
+
+    def _en_cursores(self, valores):
+        if self._inicio is not None:
+            limite, incluye = self._inicio
+            comparacion = self._comparar(valores, limite)
+            if comparacion < 0 or (comparacion == 0 and not incluye):
+                return False
+        if self._fin is not None:
+            limite, incluye = self._fin
+            comparacion = self._comparar(valores, limite)
+            if comparacion > 0 or (comparacion == 0 and not incluye):
+                return False
+        return True
+
+    def _valores_orden(self, snap):
+        return tuple(snap.id if campo == "__name__" else snap.get(campo) for campo, _ in self._orden)
+
+    def where(self, campo, operador, valor):
+        return self._copiar(filtros=self._filtros + [(campo, operador, valor)])
+
+    def limit(self, n):
+        return self._copiar(limite=n)
+
+    def order_by(self, campo, direction="ASCENDING"):
+        return self._copiar(orden=self._orden + [(campo, direction == "DESCENDING")])
+
+    # Como en Firestore, los cursores reciben {campo de orden: valor} para los
+    # primeros campos de orden; un id se acepta como texto
+    def _cursor(self, valores, incluye):
+        return tuple(valores[campo] for campo, _ in self._orden if campo in valores), incluye
+
+    def start_at(self, valores):
+        return self._copiar(inicio=self._cursor(valores, True))
+
+    def start_after(self, valores):
+        return self._copiar(inicio=self._cursor(valores, False))
+
+    def end_before(self, valores):
+        return self._copiar(fin=self._cursor(valores, False))
+
+    def end_at(self, valores):
+        return self._copiar(fin=self._cursor(valores, True))
+
+    def count(self):
+        # Agregación: un viaje, sin transferir los documentos
+        consulta = self
+        return SimpleNamespace(get=lambda: [[SimpleNamespace(value=len(consulta._resultado()))]])
+
+    def select(self, rutas):
+        # Las rutas llegan como FieldPath.to_api_repr(): `Campo con espacios`
+        return self._copiar(proyeccion=[r.strip("`") for r in rutas])
+
+    def _resultado(self):
+        # Ordenando solo por id, los cursores se aplican antes de copiar los documentos
+        por_id = (lambda i: self._en_cursores((i,))) if [c for c, _ in self._orden] == ["__name__"] else None
+        coincidencias = (
+            snap for snap in self._coleccion._documentos(por_id)
+            if all(_OPERADORES[op](snap.get(campo), valor) for campo, op, valor in self._filtros)
+        )
+        if self._orden:
+            # Como en Firestore, quedan fuera los documentos sin alguno de los campos de orden
+            coincidencias = sorted(
+                (s for s in coincidencias
+                 if None not in self._valores_orden(s) and self._en_cursores(self._valores_orden(s))),
+                key=functools.cmp_to_key(lambda a, b: self._comparar(self._valores_orden(a), self._valores_orden(b))))
+        resultado = list(itertools.islice(coincidencias, self._limite))
+        if self._proyeccion is not None:
+            resultado = [
+                DocumentoSnapshot(s.reference, {c: s._datos[c] for c in self._proyeccion if c in s._datos})
+                for s in resultado
+            ]
+        return resultado
+
+    def stream(self):
+        resultado = self._resultado()
+        self._coleccion._cliente._transferir(len(resultado))
+        return iter(resultado)
+
+    def get(self):
+        return list(self.stream())
+
+
+class ReferenciaColeccion(Consulta):
+    def __init__(self, cliente, ruta):
+        super().__init__(self)
+        self._cliente = cliente
+        self._ruta = ruta
+
+    def document(self, doc_id=None):
+        return ReferenciaDocumento(self._cliente, self._ruta, doc_id or "".join(random.choices(_ALFABETO_IDS, k=20)))
+
+    def _documentos(self, filtro_id=None):
+        return self._cliente._listar(self._ruta, self, filtro_id=filtro_id)
+
+    def add(self, datos):
+        referencia = self.document()
+        referencia.set(datos)
+        return datetime.datetime.now(datetime.timezone.utc), referencia
+
+    def on_snapshot(self, callback):
+        return self._cliente._suscribir(self._ruta, self, callback)
+
+
+class Lote:
+    """Equivalente a WriteBatch: las escrituras se aplican juntas en commit()."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._operaciones = []
+
+    def set(self, referencia, datos, merge=False):
+        self._operaciones.append((referencia, datos, merge, False))
+
+    def update(self, referencia, datos):
+        self._operaciones.append((referencia, datos, True, True))
+
+    def delete(self, referencia):
+        self._operaciones.append((referencia, None, None, False))
+
+    def commit(self):
+        self._cliente._confirmar(self._operaciones)
+        self._operaciones = []
+
+
+class Transaccion(Lote):
+    """Equivalente a Transaction para usarse con @firestore.transactional.
+
+    Como en Firestore con los SDK de servidor, las transacciones no corren a la
+    vez: cada una espera a que termine la anterior. Las lecturas guardan la
+    versión de cada documento; si una escritura fuera de transacción lo cambia
+    antes del commit, este falla con Aborted y transactional lo reintenta.
+    """
+
+    _read_only = False
+
+    def __init__(self, cliente, max_attempts=5):
+        super().__init__(cliente)
+        self._max_attempts = max_attempts
+        self._id = None
+        self._leidos = {}  # (ruta, id) -> versión leída
+
+    def _begin(self, retry_id=None):
+        self._cliente._lock_transacciones.acquire()
+        self._id = next(self._cliente._ids_transaccion)
+
+    def _clean_up(self):
+        self._operaciones = []
+        self._leidos = {}
+        if self._id is not None:
+            self._id = None
+            self._cliente._lock_transacciones.release()
+
+    def _commit(self):
+        try:
+            self._cliente._confirmar(self._operaciones, self._leidos)
+        finally:
+            self._clean_up()
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class Suscripcion:
+    def __init__(self, cliente, ruta, callback):
+        self._cliente = cliente
+        self._ruta = ruta
+        self._callback = callback
+
+    def unsubscribe(self):
+        self._cliente._desuscribir(self._ruta, self)
+
+
+class ClienteMemoria:
+    def __init__(self, latencia_segundos=0.0, latencia_pagina_segundos=0.0, tamano_pagina=300):
+        self.latencia_segundos = latencia_segundos
+        self.latencia_pagina_segundos = latencia_pagina_segundos
+        self.tamano_pagina = tamano_pagina
+        self.llamadas = 0  # Viajes "de red" realizados
+        self._colecciones = {}  # ruta -> {id: datos}
+        self._oyentes = {}  # ruta -> [Suscripcion]
+        self._versiones = {}  # (ruta, id) -> escrituras al documento
+        self._lock = threading.RLock()
+        self._lock_transacciones = threading.Lock()
+        self._ids_transaccion = itertools.count(1)
+
+    def collection(self, nombre):
+        return ReferenciaColeccion(self, nombre)
+
+    def batch(self):
+        return Lote(self)
+
+    def transaction(self, max_attempts=5):
+        return Transaccion(self, max_attempts)
+
+    # --- Operaciones internas ---
+    def _viaje(self):
+        with self._lock:
+            self.llamadas += 1
+        if self.latencia_segundos:
+            time.sleep(self.latencia_segundos)
+
+    def _transferir(self, documentos):
+        if self.latencia_pagina_segundos and documentos:
+            time.sleep(math.ceil(documentos / self.tamano_pagina) * self.latencia_pagina_segundos)
+
+    def _leer(self, ruta, doc_id, referencia, transaccion=None):
+        self._viaje()
+        with self._lock:
+            datos = self._colecciones.get(ruta, {}).get(doc_id)
+            if transaccion is not None:
+                transaccion._leidos[(ruta, doc_id)] = self._versiones.get((ruta, doc_id), 0)
+            return DocumentoSnapshot(referencia, copy.deepcopy(datos))
+
+    def _listar(self, ruta, coleccion, viaje=True, filtro_id=None):
+        if viaje:
+            self._viaje()
+        with self._lock:
+            documentos = sorted(
+                (i, d) for i, d in self._colecciones.get(ruta, {}).items() if filtro_id is None or filtro_id(i))
+            return [DocumentoSnapshot(coleccion.document(i), copy.deepcopy(d)) for i, d in documentos]
+
+    # combinar: mezclar con lo existente (update o set con merge=True);
+    # exigir: fallar si el documento no existe (update)
+    def _escribir(self, ruta, doc_id, datos, combinar, exigir):
+        self._viaje()
+        with self._lock:
+            self._aplicar(ruta, doc_id, datos, combinar, exigir)
+
+    def _crear(self, ruta, doc_id, datos):
+        self._viaje()
+        with self._lock:
+            if doc_id in self._colecciones.get(ruta, {}):
+                raise exceptions.AlreadyExists(f"Ya existe el documento {ruta}/{doc_id}")
+            self._aplicar(ruta, doc_id, datos, combinar=False, exigir=False)
+
+    def _borrar(self, ruta, doc_id):
+        self._viaje()
+        with self._lock:
+            self._aplicar(ruta, doc_id, None, None, False)
+
+    def _confirmar(self, operaciones, leidos=None):
+        self._viaje()
+        with self._lock:
+            for (ruta, doc_id), version in (leidos or {}).items():
+                if self._versiones.get((ruta, doc_id), 0) != version:
+                    raise exceptions.Aborted(f"El documento {ruta}/{doc_id} cambió durante la transacción")
+            for referencia, datos, combinar, exigir in operaciones:
+                if exigir and referencia.id not in self._colecciones.get(referencia._ruta_coleccion, {}):
+                    raise KeyError(f"No existe el documento {referencia._ruta_coleccion}/{referencia.id}")
+            for referencia, datos, combinar, exigir in operaciones:
+                self._aplicar(referencia._ruta_coleccion, referencia.id, datos, combinar, exigir)
+
+    def _aplicar(self, ruta, doc_id, datos, combinar, exigir):
+        documentos = self._colecciones.setdefault(ruta, {})
+        self._versiones[(ruta, doc_id)] = self._versiones.get((ruta, doc_id), 0) + 1
+        if datos is None:
+            if documentos.pop(doc_id, None) is not None:
+                self._notificar(ruta, doc_id, "REMOVED")
+            return
+        existia = doc_id in documentos
+        if exigir and not existia:
+            raise KeyError(f"No existe el documento {ruta}/{doc_id}")
+        nuevos = _resolver_centinelas(datos, documentos.get(doc_id))
+        documentos[doc_id] = {**documentos.get(doc_id, {}), **nuevos} if combinar else nuevos
+        self._notificar(ruta, doc_id, "MODIFIED" if existia else "ADDED")
+
+    def _suscribir(self, ruta, coleccion, callback):
+        with self._lock:
+            suscripcion = Suscripcion(self, ruta, callback)
+            self._oyentes.setdefault(ruta, []).append(suscripcion)
+            iniciales = self._listar(ruta, coleccion, viaje=False)
+            cambios = [SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=s) for s in iniciales]
+            callback(iniciales, cambios, datetime.datetime.now(datetime.timezone.utc))
+            return suscripcion
+
+    def _desuscribir(self, ruta, suscripcion):
+        with self._lock:
+            if suscripcion in self._oyentes.get(ruta, []):
+                self._oyentes[ruta].remove(suscripcion)
+
+    def _notificar(self, ruta, doc_id, tipo):
+        oyentes = self._oyentes.get(ruta)
+        if not oyentes:
+            return
+        coleccion = ReferenciaColeccion(self, ruta)
+        datos = self._colecciones.get(ruta, {}).get(doc_id)
+        snap = DocumentoSnapshot(coleccion.document(doc_id), copy.deepcopy(datos))
+        cambio = SimpleNamespace(type=SimpleNamespace(name=tipo), document=snap)
+        ahora = datetime.datetime.now(datetime.timezone.utc)
+        for suscripcion in list(oyentes):
+            suscripcion._callback(self._listar(ruta, coleccion, viaje=False), [cambio], ahora)
@@ -0,0 +1,97 @@
+import hashlib
+
+import pandas as pd
+
+from utils.backends import fecha_dia
+
+
+# ---------------------------
+# Resúmenes diarios
+# ---------------------------
+# Acumulados por día que se actualizan en el mismo lote que cada alta, para
+# que el panel y Contabilidad grafiquen unos cientos de filas en lugar de
+# agrupar todo el historial en cada rerun.
+
+DIARIO_TRANSACCIONES = "resumen_diario_transacciones"  # Por día, Tipo y Categoría
+DIARIO_VENTAS = "resumen_diario_ventas"  # Por día
+
+COLUMNAS_RESUMEN = {
+    DIARIO_TRANSACCIONES: ["Fecha", "Tipo", "Categoría", "Monto", "Movimientos"],
+    DIARIO_VENTAS: ["Fecha", "Total", "Ventas"],
+}
+NUMERICAS_RESUMEN = {
+    DIARIO_TRANSACCIONES: ["Monto", "Movimientos"],
+    DIARIO_VENTAS: ["Total", "Ventas"],
+}
+
+
+def _id_resumen(*partes):
+    doc_id = "|".join("" if p is None else str(p) for p in partes)
+    if "/" in doc_id or len(doc_id.encode("utf-8")) > 1500:
+        return hashlib.sha1(doc_id.encode("utf-8")).hexdigest()
+    return doc_id
+
+
+def _monto(valor):
+    try:
+        monto = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(monto) else monto
+
+
+def acumulados_diarios(coleccion, datos):
+    """Regresa [(colección, id, {campo: delta}, {campo: valor})] que un documento
+    nuevo suma a los resúmenes diarios."""
+    dia = fecha_dia(datos.get("Fecha"))
+    if dia is None:
+        return []
+    fecha = dia.date().isoformat()
+    if coleccion == "ventas":
+        return [(DIARIO_VENTAS, fecha, {"Total": _monto(datos.get("Total")), "Ventas": 1}, {"Fecha": fecha})]
+    if coleccion == "transacciones":
+        tipo, categoria = datos.get("Tipo"), datos.get("Categoría")
+        return [(
+            DIARIO_TRANSACCIONES,
+            _id_resumen(fecha, tipo, categoria),
+            {"Monto": _monto(datos.get("Monto")), "Movimientos": 1},
+            {"Fecha": fecha, "Tipo": tipo, "Categoría": categoria},
+        )]
+    return []
+
+
+def _dias(fechas):
+    if pd.api.types.is_datetime64_any_dtype(fechas):
+        return fechas.dt.strftime("%Y-%m-%d")
+    # Igual que fecha_dia(): se toman los primeros diez caracteres del texto ISO
+    return pd.to_datetime(fechas.astype(str).str[:10], format="%Y-%m-%d", errors="coerce").dt.strftime("%Y-%m-%d")
+
+
+def calcular_resumenes(ventas_df, transacciones_df):
+    """{colección: {id: datos}} de ambos resúmenes, calculados desde el historial."""
+    ventas = ventas_df.assign(
+        Fecha=_dias(ventas_df["Fecha"]), Total=pd.to_numeric(ventas_df["Total"], errors="coerce").fillna(0.0))
+    por_dia = ventas.dropna(subset=["Fecha"]).groupby("Fecha")["Total"].agg(["sum", "size"])
+    diario_ventas = {
+        fecha: {"Fecha": fecha, "Total": float(fila["sum"]), "Ventas": int(fila["size"])}
+        for fecha, fila in por_dia.iterrows()
+    }
+
+    transacciones = transacciones_df.assign(
+        Fecha=_dias(transacciones_df["Fecha"]),
+        Tipo=transacciones_df["Tipo"].astype(object),
+        Categoría=transacciones_df["Categoría"].astype(object),
+        Monto=pd.to_numeric(transacciones_df["Monto"], errors="coerce").fillna(0.0))
+    por_categoria = (
+        transacciones.dropna(subset=["Fecha"])
+        .groupby(["Fecha", "Tipo", "Categoría"], dropna=False)["Monto"].agg(["sum", "size"])
+        .reset_index()
+    )
+    diario_transacciones = {}
+    for fecha, tipo, categoria, suma, movimientos in por_categoria.itertuples(index=False):
+        tipo = None if pd.isna(tipo) else tipo
+        categoria = None if pd.isna(categoria) else categoria
+        diario_transacciones[_id_resumen(fecha, tipo, categoria)] = {
+            "Fecha": fecha, "Tipo": tipo, "Categoría": categoria, "Monto": float(suma), "Movimientos": int(movimientos),
+        }
+    return {DIARIO_VENTAS: diario_ventas, DIARIO_TRANSACCIONES: diario_transacciones}
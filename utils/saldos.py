@@ -0,0 +1,120 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------
+# Saldos materializados por cliente
+# ---------------------------
+# La colección saldos_clientes guarda una fila por cliente con los acumulados
+# que antes se recalculaban sobre todo el historial. Cada alta de venta o
+# transacción suma sus montos en el mismo lote (Increment), de modo que las
+# pantallas leen el resumen directamente.
+
+COLECCION_SALDOS = "saldos_clientes"
+CAMPOS_SALDO = ["Crédito Otorgado", "Cobranza", "Anticipos Recibidos", "Anticipos Aplicados"]
+TIPOS_CREDITO = ["Crédito", "Mixta"]
+
+# Categoría de transacción -> acumulado que mueve
+_CAMPO_POR_CATEGORIA = {
+    "Cobranza": "Cobranza",
+    "Anticipo Cliente": "Anticipos Recibidos",
+    "Anticipo Aplicado": "Anticipos Aplicados",
+}
+
+
+def id_saldo(cliente):
+    """Id del documento de saldo: el nombre, o un hash si no sirve como id."""
+    nombre = str(cliente)
+    if nombre and "/" not in nombre and not nombre.startswith("__") and len(nombre.encode("utf-8")) <= 1500:
+        return nombre
+    return hashlib.sha1(nombre.encode("utf-8")).hexdigest()
+
+
+def _monto(valor):
+    try:
+        monto = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(monto) else monto
+
+
+def deltas_saldo(coleccion, datos):
+    """Regresa {campo: delta} que un documento nuevo suma al saldo de su cliente."""
+    if not datos.get("Cliente"):
+        return {}
+    if coleccion == "ventas":
+        if datos.get("Tipo de venta") in TIPOS_CREDITO and _monto(datos.get("Monto Crédito")):
+            return {"Crédito Otorgado": _monto(datos.get("Monto Crédito"))}
+        return {}
+    if coleccion == "transacciones":
+        campo = _CAMPO_POR_CATEGORIA.get(datos.get("Categoría"))
+        if campo and _monto(datos.get("Monto")):
+            return {campo: _monto(datos.get("Monto"))}
+    return {}
+
+
+def calcular_saldos(ventas_df, transacciones_df):
+    """Acumulados por cliente desde el historial, en una sola pasada.
+
+    Las transacciones se pivotean Cliente × Categoría una vez y se unen a la
+    suma de ventas a crédito. Regresa Cliente y CAMPOS_SALDO, una fila por
+    cliente con ventas a crédito o movimientos de cobranza o anticipos.
+    """
+    credito = ventas_df.loc[ventas_df["Tipo de venta"].isin(TIPOS_CREDITO), ["Cliente", "Monto Crédito"]]
+    # Cliente y Categoría pueden llegar como category: se agrupa por sus
+    # valores para no arrastrar categorías sin movimientos
+    credito = (
+        pd.to_numeric(credito["Monto Crédito"], errors="coerce")
+        .groupby(credito["Cliente"].astype(object), sort=False).sum()
+        .rename("Crédito Otorgado")
+    )
+
+    movimientos = transacciones_df.loc[
+        transacciones_df["Categoría"].isin(list(_CAMPO_POR_CATEGORIA)), ["Cliente", "Categoría", "Monto"]
+    ]
+    pivote = (
+        pd.to_numeric(movimientos["Monto"], errors="coerce")
+        .groupby([movimientos["Cliente"].astype(object), movimientos["Categoría"].astype(object)], sort=False).sum()
+        .unstack(fill_value=0.0)
+        .rename(columns=_CAMPO_POR_CATEGORIA)
+    )
+
+    saldos = pivote.join(credito, how="outer").reindex(columns=CAMPOS_SALDO).fillna(0.0)
+    saldos.index.name = "Cliente"
+    saldos = saldos.reset_index()
+    return saldos[saldos["Cliente"].astype(bool)].reset_index(drop=True)
+
+
+def tabla_cobranza(saldos_df):
+    """Tabla "Saldos por cliente" de Cobranza a partir de los acumulados.
+
+    Aparecen los clientes con crédito otorgado o con anticipo a favor; a los
+    que solo tienen anticipo se les muestra únicamente ese saldo.
+    """
+    con_credito = saldos_df["Crédito Otorgado"].to_numpy() != 0
+    anticipos = (saldos_df["Anticipos Recibidos"] - saldos_df["Anticipos Aplicados"]).to_numpy()
+    visibles = con_credito | (anticipos > 0)
+    pagos = np.where(con_credito, saldos_df["Cobranza"].to_numpy(), 0.0)
+    pendiente = np.where(con_credito, saldos_df["Crédito Otorgado"].to_numpy() - pagos, 0.0)
+    return pd.DataFrame({
+        "Cliente": saldos_df["Cliente"].to_numpy(),
+        "Crédito Otorgado": saldos_df["Crédito Otorgado"].to_numpy(),
+        "Total Pagos y Aplicaciones": pagos,
+        "Saldo Pendiente": pendiente,
+        "Saldo Pendiente Display": np.maximum(pendiente, 0.0),
+        "Saldo Anticipos": np.maximum(anticipos, 0.0),
+    })[visibles].reset_index(drop=True)
+
+
+def completar_saldos(saldos_df, clientes_df):
+    """Agrega saldo pendiente, saldo de anticipos y crédito disponible."""
+    limites = clientes_df.drop_duplicates("Nombre").set_index("Nombre")["Límite de crédito"]
+    df = saldos_df.assign(**{
+        "Saldo Pendiente": saldos_df["Crédito Otorgado"] - saldos_df["Cobranza"],
+        "Saldo Anticipos": saldos_df["Anticipos Recibidos"] - saldos_df["Anticipos Aplicados"],
+        "Límite de crédito": saldos_df["Cliente"].map(limites).fillna(0.0).astype("float64"),
+    })
+    df["Crédito Disponible"] = df["Límite de crédito"] - df["Saldo Pendiente"]
+    return df
@@ -0,0 +1,108 @@
+import datetime
+import threading
+
+
+# ---------------------------
+# Estado local por colección
+# ---------------------------
+class EstadoColeccion:
+    def __init__(self):
+        self.documentos = {}  # id -> dict tal como viene de la base
+        self.marca = None  # Mayor sello de actualización visto
+        self.completa_en = None  # Cuándo se leyó (o se sembró) la colección completa
+        self.lock = threading.Lock()
+
+
+# ---------------------------
+# Sincronización incremental
+# ---------------------------
+class SincronizadorDelta:
+    """Mantiene una copia local por (uid, colección) y solo trae lo que cambió.
+
+    La primera lectura (o una resincronización explícita) trae la colección
+    completa; las siguientes piden únicamente los documentos cuyo sello de
+    actualización es mayor o igual a la marca guardada, menos un margen que
+    cubre relojes desfasados y sellos que llegan fuera de orden. Como la mezcla
+    es por id, traer de más no altera el resultado.
+
+    Limitación: un documento borrado no deja sello, así que leer_cambios nunca
+    lo reporta. Los borrados hechos por esta app se quitan con quitar_documento;
+    los de otras sesiones o dispositivos se notan hasta la siguiente lectura
+    completa, que se fuerza cada intervalo_completo_segundos (0 la desactiva).
+    Una copia sembrada desde disco cuenta como lectura completa al arrancar.
+    """
+
+    def __init__(self, campo_sello, margen_segundos=120, intervalo_completo_segundos=1800):
+        self.campo_sello = campo_sello
+        self.margen = datetime.timedelta(seconds=margen_segundos)
+        self.intervalo_completo = datetime.timedelta(seconds=intervalo_completo_segundos)
+        self._estados = {}
+        self._lock = threading.Lock()
+
+    def estado(self, uid, coleccion):
+        with self._lock:
+            if (uid, coleccion) not in self._estados:
+                self._estados[(uid, coleccion)] = EstadoColeccion()
+            return self._estados[(uid, coleccion)]
+
+    def sincronizar(self, uid, coleccion, leer_todo, leer_cambios, completo=False, semilla=None):
+        """Regresa una copia de {id: datos}, el número de documentos recibidos y
+        si se leyó la colección completa.
+
+        leer_todo() y leer_cambios(desde) deben producir pares (id, datos).
+        semilla(), si se da, puede regresar ({id: datos}, marca) guardados
+        localmente para arrancar desde ahí en lugar de leer todo.
+        """
+        estado = self.estado(uid, coleccion)
+        with estado.lock:
+            inicio = datetime.datetime.now(datetime.timezone.utc)
+            if estado.marca is None and not completo and semilla is not None:
+                guardado = semilla()
+                if guardado is not None and guardado[1] is not None:
+                    estado.documentos, estado.marca = guardado
+                    estado.completa_en = inicio
+            if self.intervalo_completo and estado.completa_en is not None:
+                # Única forma de enterarse de borrados remotos (ver docstring de la clase)
+                completo = completo or inicio - estado.completa_en >= self.intervalo_completo
+            completo = completo or estado.marca is None
+            if completo:
+                recibidos = dict(leer_todo())
+                estado.documentos = recibidos
+                estado.completa_en = inicio
+            else:
+                recibidos = dict(leer_cambios(estado.marca - self.margen))
+                estado.documentos.update(recibidos)
+
+            sellos = [d.get(self.campo_sello) for d in recibidos.values()]
+            sellos = [s for s in sellos if isinstance(s, datetime.datetime)]
+            if sellos and (estado.marca is None or max(sellos) > estado.marca):
+                estado.marca = max(sellos)
+            elif estado.marca is None:
+                estado.marca = inicio  # Colección sin sellos todavía
+            return dict(estado.documentos), len(recibidos), completo
+
+    def documentos_locales(self, uid, coleccion):
+        """Copia de lo ya sincronizado, sin consultar la base."""
+        estado = self.estado(uid, coleccion)
+        with estado.lock:
+            return dict(estado.documentos)
+
+    def tamano_local(self, uid, coleccion):
+        """Documentos en la copia local, 0 si no hay. No toma candados: se
+        puede llamar desde leer_todo, dentro de sincronizar()."""
+        estado = self._estados.get((uid, coleccion))
+        return len(estado.documentos) if estado is not None else 0
+
+    def quitar_documento(self, uid, coleccion, doc_id):
+        estado = self.estado(uid, coleccion)
+        with estado.lock:
+            estado.documentos.pop(doc_id, None)
+
+    def descartar(self, uid, coleccion=None):
+        with self._lock:
+            for clave in [c for c in self._estados if c[0] == uid and (coleccion is None or c[1] == coleccion)]:
+                del self._estados[clave]
+
+    def descartar_todo(self):
+        with self._lock:
+            self._estados.clear()
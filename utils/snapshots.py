@@ -0,0 +1,128 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow es opcional; sin él no se guardan instantáneas
+    pa = None
+
+# Cambiar si cambia la forma de guardar las columnas; invalida lo existente
+VERSION_ESQUEMA = 1
+
+
+# ---------------------------
+# Instantáneas columnares en disco
+# ---------------------------
+class AlmacenSnapshots:
+    """Guarda por (uid, colección) las columnas que usan los lectores en un
+    archivo Arrow IPC, junto a un .json con versión de esquema, checksum y la
+    marca de sincronización. Al arrancar se abre con memory map y solo se pide
+    a la base lo que cambió después de esa marca.
+    """
+
+    def __init__(self, directorio, intervalo_segundos=60):
+        self.directorio = directorio
+        self.intervalo_segundos = intervalo_segundos
+        self._ultimo_guardado = {}
+        self._lock = threading.Lock()
+
+    @property
+    def disponible(self):
+        return pa is not None and bool(self.directorio)
+
+    def _rutas(self, uid, coleccion):
+        carpeta = os.path.join(self.directorio, "".join(c for c in uid if c.isalnum() or c in "-_"))
+        return os.path.join(carpeta, f"{coleccion}.arrow"), os.path.join(carpeta, f"{coleccion}.json")
+
+    def cargar(self, uid, coleccion, columnas, campo_sello):
+        """Regresa ({id: datos}, marca) o None si no hay instantánea válida."""
+        if not self.disponible:
+            return None
+        ruta_datos, ruta_meta = self._rutas(uid, coleccion)
+        try:
+            with open(ruta_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version_esquema") != VERSION_ESQUEMA or meta.get("columnas") != columnas:
+                logging.info(f"Instantánea de '{coleccion}' con otro esquema; se reconstruirá.")
+                return None
+            with pa.memory_map(ruta_datos, "r") as fuente:
+                if hashlib.sha256(fuente.read_buffer()).hexdigest() != meta.get("checksum"):
+                    logging.warning(f"Instantánea de '{coleccion}' corrupta; se reconstruirá.")
+                    return None
+                fuente.seek(0)
+                tabla = pa.ipc.open_file(fuente).read_all()
+        except (OSError, ValueError, pa.ArrowInvalid):
+            return None
+
+        ids = tabla.column("_id").to_pylist()
+        valores = {col: tabla.column(col).to_pylist() for col in columnas + [campo_sello]}
+        documentos = {
+            doc_id: {col: valores[col][i] for col in valores}
+            for i, doc_id in enumerate(ids)
+        }
+        marca = datetime.datetime.fromisoformat(meta["marca"]) if meta.get("marca") else None
+        logging.info(f"Instantánea de '{coleccion}' cargada: {len(documentos)} documentos.")
+        return documentos, marca
+
+    def guardar(self, uid, coleccion, columnas, numericas, campo_sello, documentos, marca, forzar=False):
+        if not self.disponible:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            if not forzar and ahora - self._ultimo_guardado.get((uid, coleccion), 0) < self.intervalo_segundos:
+                return
+            self._ultimo_guardado[(uid, coleccion)] = ahora
+
+        arreglos = {"_id": pa.array(list(documentos), type=pa.string())}
+        for col in columnas:
+            crudos = [d.get(col) for d in documentos.values()]
+            if col in numericas:
+                arreglos[col] = pa.array([_a_float(v) for v in crudos], type=pa.float64())
+            else:
+                arreglos[col] = pa.array([None if v is None else str(v) for v in crudos], type=pa.string())
+        sellos = [d.get(campo_sello) for d in documentos.values()]
+        arreglos[campo_sello] = pa.array(
+            [s if isinstance(s, datetime.datetime) else None for s in sellos],
+            type=pa.timestamp("us", tz="UTC"),
+        )
+        tabla = pa.table(arreglos)
+
+        ruta_datos, ruta_meta = self._rutas(uid, coleccion)
+        try:
+            os.makedirs(os.path.dirname(ruta_datos), exist_ok=True)
+            with pa.OSFile(ruta_datos + ".tmp", "wb") as destino:
+                with pa.ipc.new_file(destino, tabla.schema) as escritor:
+                    escritor.write_table(tabla)
+            with open(ruta_datos + ".tmp", "rb") as f:
+                checksum = hashlib.sha256(f.read()).hexdigest()
+            meta = {
+                "version_esquema": VERSION_ESQUEMA,
+                "columnas": columnas,
+                "checksum": checksum,
+                "marca": marca.isoformat() if marca else None,
+                "documentos": len(documentos),
+            }
+            with open(ruta_meta + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(ruta_datos + ".tmp", ruta_datos)
+            os.replace(ruta_meta + ".tmp", ruta_meta)
+        except OSError as e:
+            logging.warning(f"No se pudo guardar la instantánea de '{coleccion}': {e}")
+
+    def borrar(self, uid, coleccion):
+        for ruta in self._rutas(uid, coleccion):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def _a_float(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,74 @@
+import datetime
+import math
+
+import streamlit as st
+
+from utils.backends import CAMPO_FECHA_DIA
+from utils.db import TAMANO_TABLA, contar_documentos, filtros_fecha, leer_pagina_tabla
+
+
+# ---------------------------
+# Tablas paginadas
+# ---------------------------
+# En lugar de mandar el historial completo a st.dataframe, se lee y se envía
+# solo la página visible. Los cursores de las páginas ya recorridas quedan en
+# la sesión, así que ir hacia atrás tampoco recorre el historial.
+#
+# En Firestore, cada columna ordenable pide un índice compuesto por cada
+# combinación de filtros de igualdad y rango de fechas que admite la tabla
+# (firestore.indexes.json); las pantallas solo ordenan por Fecha.
+_TODOS = "(Todos)"
+# Fecha se guarda como texto; se ordena por su copia tipada
+_CAMPO_ORDEN = {"Fecha": CAMPO_FECHA_DIA}
+
+
+def _ir_a(clave, cursores):
+    st.session_state[clave]["cursores"] = cursores
+
+
+def tabla_paginada(nombre_coleccion, clave, columnas, ordenables, filtros=(), filtrables=None,
+                   desde=None, hasta=None, tamano=TAMANO_TABLA):
+    """Muestra una página de la colección con controles de orden, filtro y navegación.
+
+    ordenables: columnas por las que se puede ordenar; la primera es la
+    predeterminada. filtros: condiciones fijas (campo, operador, valor).
+    filtrables: {campo: opciones} para filtrar por igualdad desde la pantalla.
+    desde/hasta limitan por fecha. Regresa el DataFrame de la página.
+    """
+    ordenables = list(ordenables)
+    columnas_control = st.columns(1 + (len(ordenables) > 1) + len(filtrables or {}))
+    columna_orden = ordenables[0]
+    if len(ordenables) > 1:
+        columna_orden = columnas_control.pop(0).selectbox("Ordenar por", ordenables, key=f"{clave}_orden")
+    orden = _CAMPO_ORDEN.get(columna_orden, columna_orden)
+    descendente = columnas_control[0].selectbox(
+        "Dirección", [True, False], format_func=lambda d: "Descendente" if d else "Ascendente",
+        key=f"{clave}_direccion")
+    # Sin desde, el día más antiguo: la consulta ordenada no trae documentos
+    # sin FechaDia, y el conteo tampoco debe contarlos
+    condiciones = [*filtros, *filtros_fecha(desde or datetime.date.min, hasta)]
+    for columna, (campo, opciones) in zip(columnas_control[1:], (filtrables or {}).items()):
+        valor = columna.selectbox(campo, [_TODOS, *opciones], key=f"{clave}_filtro_{campo}")
+        if valor != _TODOS:
+            condiciones.append((campo, "==", valor))
+
+    # Otro orden u otros filtros empiezan desde la primera página
+    consulta = (orden, descendente, tuple(condiciones), tamano)
+    estado = st.session_state.get(clave)
+    if estado is None or estado["consulta"] != consulta:
+        estado = st.session_state[clave] = {"consulta": consulta, "cursores": [None]}
+    cursores = estado["cursores"]
+
+    df, siguiente = leer_pagina_tabla(
+        nombre_coleccion, orden, descendente, condiciones, cursores[-1], tamano)
+    total = contar_documentos(nombre_coleccion, condiciones)
+    st.dataframe(df[columnas], use_container_width=True, hide_index=True)
+
+    anterior, posicion, proxima = st.columns([1, 3, 1])
+    anterior.button("◀ Anterior", key=f"{clave}_anterior", disabled=len(cursores) == 1,
+                    on_click=_ir_a, args=(clave, cursores[:-1]))
+    proxima.button("Siguiente ▶", key=f"{clave}_siguiente", disabled=siguiente is None,
+                   on_click=_ir_a, args=(clave, [*cursores, siguiente]))
+    posicion.caption(
+        f"Página {len(cursores)} de {max(1, math.ceil(total / tamano))} · {total:,} registros")
+    return df